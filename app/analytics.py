@@ -0,0 +1,221 @@
+"""Deal stage history and funnel / velocity analytics.
+
+Mapper hooks append a ``deal_stage_events`` row whenever a deal is created or
+changes stage, inside the writing transaction. Analytics are computed from
+that log with window functions: LEAD gives each stay in a stage its end,
+and a running MAX of the funnel rank, compared with its LAG, gives the point
+at which a deal first reached each funnel stage (skipping a stage counts as
+passing through it).
+
+Completed months are rolled up per owner into ``deal_stage_rollups`` the
+first time analytics are requested after the month ends, so a page covers
+any amount of history with one small read plus the current month, which is
+computed live. Time in stage is kept as a histogram over DAY_BUCKETS;
+medians are interpolated within the bucket that holds the middle exit.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timezone
+from typing import Optional
+from sqlalchemy import case, delete, event, func, insert, inspect, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import Deal, DealStageEvent, DealStageRollup
+from app.stats import STAGES, CLOSED_STAGES
+from app.tenancy import current_user_id
+
+# Funnel order; closed_lost is an exit, not a step
+FUNNEL = ["qualified", "proposal", "negotiation", "closed_won"]
+OPEN_STAGES = [stage for stage in STAGES if stage not in CLOSED_STAGES]
+# Upper bounds (days) of the time-in-stage histogram buckets; the last bucket is open-ended
+DAY_BUCKETS = [1, 2, 3, 5, 7, 10, 14, 21, 30, 45, 60, 90, 120, 180, 270, 365]
+TREND_WINDOW = 3
+
+_events = DealStageEvent.__table__
+_rollups = DealStageRollup.__table__
+
+# Stage history
+
+@event.listens_for(Deal, "after_insert")
+def _deal_created(mapper, connection, target):
+    connection.execute(insert(_events).values(user_id=target.user_id, deal_id=target.id, to_stage=target.stage))
+
+@event.listens_for(Deal, "after_update")
+def _deal_moved(mapper, connection, target):
+    history = inspect(target).attrs.stage.history
+    if history.deleted and history.deleted[0] != target.stage:
+        connection.execute(insert(_events).values(
+            user_id=target.user_id, deal_id=target.id, from_stage=history.deleted[0], to_stage=target.stage
+        ))
+
+# Rollups
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def day_bucket(days: float) -> int:
+    for i, bound in enumerate(DAY_BUCKETS):
+        if days < bound:
+            return i
+    return len(DAY_BUCKETS)
+
+def stage_intervals(user_id: str, start: date, end: date):
+    """Every event of the owner's deals active in [start, end), with the window columns analytics need."""
+    start, end = datetime.combine(start, time()), datetime.combine(end, time())
+    rank = case({stage: i + 1 for i, stage in enumerate(FUNNEL)}, value=_events.c.to_stage, else_=0)
+    by_deal = {"partition_by": _events.c.deal_id, "order_by": (_events.c.changed_at, _events.c.id)}
+    active = select(_events.c.deal_id).where(
+        _events.c.user_id == user_id, _events.c.changed_at >= start, _events.c.changed_at < end
+    )
+    history = select(
+        _events.c.id,
+        _events.c.deal_id,
+        _events.c.to_stage,
+        _events.c.changed_at,
+        func.lead(_events.c.changed_at, type_=_events.c.changed_at.type).over(**by_deal).label("left_at"),
+        func.max(rank).over(**by_deal, rows=(None, 0)).label("reached_rank")
+    ).where(
+        _events.c.user_id == user_id, _events.c.changed_at < end, _events.c.deal_id.in_(active)
+    ).subquery()
+    return select(
+        history.c.to_stage,
+        history.c.changed_at,
+        history.c.left_at,
+        history.c.reached_rank,
+        func.coalesce(
+            func.lag(history.c.reached_rank).over(partition_by=history.c.deal_id, order_by=(history.c.changed_at, history.c.id)), 0
+        ).label("previous_rank")
+    )
+
+def compute_rollups(connection, user_id: str, start: date, end: date) -> dict:
+    """{(month, stage): counters} for the months in [start, end), every stage present."""
+    rollups = {
+        (add_months(start, i), stage): {"entered": 0, "reached": 0, "exited": 0, "days_total": 0.0, "days_histogram": [0] * (len(DAY_BUCKETS) + 1)}
+        for i in range((end.year - start.year) * 12 + end.month - start.month)
+        for stage in STAGES
+    }
+    for to_stage, changed_at, left_at, reached_rank, previous_rank in connection.execute(stage_intervals(user_id, start, end)):
+        month = month_start(changed_at)
+        if month >= start and (month, to_stage) in rollups:
+            rollups[month, to_stage]["entered"] += 1
+            for rank in range(previous_rank + 1, reached_rank + 1):
+                rollups[month, FUNNEL[rank - 1]]["reached"] += 1
+        if left_at is not None and (month_start(left_at), to_stage) in rollups:
+            days = max((left_at - changed_at).total_seconds() / 86400, 0.0)
+            counters = rollups[month_start(left_at), to_stage]
+            counters["exited"] += 1
+            counters["days_total"] += days
+            counters["days_histogram"][day_bucket(days)] += 1
+    return rollups
+
+def refresh_rollups(connection, user_id: str, today: date = None) -> int:
+    """Roll up the owner's completed months that are not rolled up yet. Returns the number of months added."""
+    current = month_start(today or datetime.now(timezone.utc))
+    last = connection.execute(select(func.max(_rollups.c.month)).where(_rollups.c.user_id == user_id)).scalar()
+    if last is not None:
+        start = add_months(last, 1)
+    else:
+        first = connection.execute(select(func.min(_events.c.changed_at)).where(_events.c.user_id == user_id)).scalar()
+        if first is None:
+            return 0
+        start = month_start(first)
+    if start >= current:
+        return 0
+    rollups = compute_rollups(connection, user_id, start, current)
+    connection.execute(insert(_rollups), [
+        dict(counters, user_id=user_id, month=month, stage=stage) for (month, stage), counters in rollups.items()
+    ])
+    return len(rollups) // len(STAGES)
+
+def rebuild_rollups(connection) -> int:
+    """Recompute every owner's rollups from the event log."""
+    connection.execute(delete(_rollups))
+    owners = connection.execute(select(_events.c.user_id).distinct()).scalars().all()
+    return sum(refresh_rollups(connection, user_id) for user_id in owners)
+
+# Report
+
+def median_days(histogram: list) -> Optional[float]:
+    exits = sum(histogram)
+    if not exits:
+        return None
+    middle, seen = exits / 2, 0
+    for i, count in enumerate(histogram):
+        if count and seen + count >= middle:
+            low = DAY_BUCKETS[i - 1] if i else 0
+            if i == len(DAY_BUCKETS):
+                return float(low)
+            return round(low + (DAY_BUCKETS[i] - low) * (middle - seen) / count, 1)
+        seen += count
+    return None
+
+def stage_report(connection, user_id: str, months: int = 12, today: date = None) -> dict:
+    """Funnel, time in stage and win-rate trend over the last ``months`` months, current month included."""
+    current = month_start(today or datetime.now(timezone.utc))
+    start = add_months(current, 1 - months)
+    monthly = defaultdict(dict)
+    for row in connection.execute(
+        select(_rollups).where(_rollups.c.user_id == user_id, _rollups.c.month >= start, _rollups.c.month < current)
+    ).mappings():
+        monthly[row["month"]][row["stage"]] = row
+    for (month, stage), counters in compute_rollups(connection, user_id, current, add_months(current, 1)).items():
+        monthly[month][stage] = counters
+
+    def total(stage, field):
+        return sum(stages[stage][field] for stages in monthly.values() if stage in stages)
+
+    reached = [total(stage, "reached") for stage in FUNNEL]
+    funnel = [
+        {
+            "stage": stage,
+            "reached": count,
+            "share": round(count / reached[0], 4) if reached[0] else None,
+            "conversion": round(reached[i + 1] / count, 4) if i + 1 < len(FUNNEL) and count else None
+        }
+        for i, (stage, count) in enumerate(zip(FUNNEL, reached))
+    ]
+
+    velocity = []
+    for stage in OPEN_STAGES:
+        histogram = [0] * (len(DAY_BUCKETS) + 1)
+        for stages in monthly.values():
+            if stage in stages:
+                histogram = [a + b for a, b in zip(histogram, stages[stage]["days_histogram"])]
+        exited = total(stage, "exited")
+        velocity.append({
+            "stage": stage,
+            "exited": exited,
+            "median_days": median_days(histogram),
+            "mean_days": round(total(stage, "days_total") / exited, 1) if exited else None
+        })
+
+    trend = []
+    for i in range(months):
+        month = add_months(start, i)
+        stages = monthly.get(month, {})
+        won = stages["closed_won"]["entered"] if "closed_won" in stages else 0
+        lost = stages["closed_lost"]["entered"] if "closed_lost" in stages else 0
+        trend.append({"month": month.strftime("%Y-%m"), "won": won, "lost": lost})
+    for i, row in enumerate(trend):
+        closed = row["won"] + row["lost"]
+        window = trend[max(0, i + 1 - TREND_WINDOW):i + 1]
+        window_won = sum(r["won"] for r in window)
+        window_closed = sum(r["won"] + r["lost"] for r in window)
+        row["win_rate"] = round(row["won"] / closed, 4) if closed else None
+        row["rolling_win_rate"] = round(window_won / window_closed, 4) if window_closed else None
+
+    return {"months": months, "start_month": start.strftime("%Y-%m"), "funnel": funnel, "velocity": velocity, "win_rate": trend}
+
+def get_report(db: Session, months: int = 12) -> dict:
+    """stage_report for the session's owner, rolling up newly completed months first."""
+    user_id = current_user_id(db)
+    try:
+        if refresh_rollups(db.connection(), user_id):
+            db.commit()
+    except IntegrityError:
+        # Another request rolled the same months up first
+        db.rollback()
+    return stage_report(db.connection(), user_id, months)
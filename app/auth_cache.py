@@ -0,0 +1,164 @@
+"""Short-lived cache of resolved session users and subscription checks.
+
+Every protected page depends on viv-auth's ``require_auth`` (decrypt the
+``viv_session`` cookie, load the user) and viv-pay's ``require_subscription``
+(look up the customer), which costs several queries before the handler runs.
+``cached_user`` and ``cached_subscription`` keep both results per session
+cookie for AUTH_CACHE_TTL_SECONDS in an in-process LRU of AUTH_CACHE_SIZE
+entries. Only successes are cached: a rejected session or a missing
+subscription is checked again on every request, so a user who just paid gets
+in without waiting for an entry to expire.
+
+Billing changes drop entries explicitly: ``/subscribe`` invalidates its user,
+and any request to AUTH_CACHE_CLEAR_PATHS (viv-pay's webhooks and viv-auth's
+logout) clears the cache through the ``clear_on_billing_change`` middleware.
+Entries are per process, so in another worker a change shows up after at most
+the TTL.
+
+Resolution time goes to app.metrics by outcome (the ``auth`` Server-Timing
+entry and ``crm_auth_resolve_duration_seconds``); ``snapshot`` estimates the
+time hits saved from the mean cost of a miss.
+"""
+import hashlib
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import AsyncExitStack
+from typing import Awaitable, Callable, Optional
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.dependencies.utils import get_dependant, solve_dependencies
+from starlette.concurrency import run_in_threadpool
+from app import metrics
+
+AUTH_CACHE_TTL_SECONDS = float(os.environ.get("AUTH_CACHE_TTL_SECONDS", "30"))
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_CLEAR_PATHS = [
+    path for path in os.environ.get("AUTH_CACHE_CLEAR_PATHS", "/webhook,/stripe,/pay/,/billing/,/logout,/auth/logout").split(",")
+    if path
+]
+SESSION_COOKIE = "viv_session"
+
+stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0, "miss_seconds": 0.0}
+
+_MISSING = object()
+
+class Entry:
+    __slots__ = ("user", "subscription", "expires_at")
+
+    def __init__(self, user, expires_at: float):
+        self.user = user
+        self.subscription = _MISSING
+        self.expires_at = expires_at
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+def session_key(request: Request) -> Optional[str]:
+    cookie = request.cookies.get(SESSION_COOKIE)
+    return hashlib.sha256(cookie.encode()).hexdigest() if cookie else None
+
+def _get(key: str) -> Optional[Entry]:
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del _entries[key]
+            return None
+        _entries.move_to_end(key)
+        return entry
+
+def _put(key: str, entry: Entry):
+    with _lock:
+        _entries[key] = entry
+        _entries.move_to_end(key)
+        while len(_entries) > AUTH_CACHE_SIZE:
+            _entries.popitem(last=False)
+            stats["evictions"] += 1
+
+def invalidate_user(user_id):
+    with _lock:
+        keys = [key for key, entry in _entries.items() if getattr(entry.user, "id", None) == user_id]
+        for key in keys:
+            del _entries[key]
+        stats["invalidations"] += 1
+
+def clear():
+    with _lock:
+        _entries.clear()
+        stats["invalidations"] += 1
+
+def _observe(start: float, outcome: str):
+    elapsed = time.perf_counter() - start
+    if outcome == "miss":
+        stats["misses"] += 1
+        stats["miss_seconds"] += elapsed
+    else:
+        stats["hits"] += 1
+    metrics.observe_auth(elapsed, outcome)
+
+async def _resolve(dependency: Callable, request: Request):
+    """Run a FastAPI dependency, with its own sub-dependencies, inside the current request.
+
+    Sub-dependencies that yield (get_db) are closed when the dependency returns.
+    """
+    async with AsyncExitStack() as stack:
+        values, errors, *_ = await solve_dependencies(
+            request=request,
+            dependant=get_dependant(path=request.url.path, call=dependency),
+            dependency_overrides_provider=request.app,
+            async_exit_stack=stack
+        )
+        if errors:
+            raise RequestValidationError(errors)
+        if inspect.iscoroutinefunction(dependency):
+            return await dependency(**values)
+        return await run_in_threadpool(dependency, **values)
+
+async def cached_user(request: Request, require_auth: Callable):
+    start = time.perf_counter()
+    key = session_key(request)
+    entry = _get(key) if key and AUTH_CACHE_TTL_SECONDS > 0 else None
+    if entry is not None:
+        _observe(start, "hit")
+        return entry.user
+    user = await _resolve(require_auth, request)
+    if key and AUTH_CACHE_TTL_SECONDS > 0:
+        _put(key, Entry(user, time.monotonic() + AUTH_CACHE_TTL_SECONDS))
+    _observe(start, "miss")
+    return user
+
+async def cached_subscription(request: Request, check: Callable[[], Awaitable]):
+    """The subscription of the session whose user cached_user just resolved; check() on a miss."""
+    start = time.perf_counter()
+    key = session_key(request)
+    entry = _get(key) if key else None
+    if entry is not None and entry.subscription is not _MISSING:
+        _observe(start, "hit")
+        return entry.subscription
+    subscription = await check()
+    if entry is not None:
+        entry.subscription = subscription
+    _observe(start, "miss")
+    return subscription
+
+def _clears_cache(path: str) -> bool:
+    return any(path.startswith(prefix) for prefix in AUTH_CACHE_CLEAR_PATHS)
+
+async def clear_on_billing_change(request: Request, call_next):
+    response = await call_next(request)
+    if _clears_cache(request.url.path):
+        clear()
+    return response
+
+def snapshot() -> dict:
+    lookups = stats["hits"] + stats["misses"]
+    miss_ms = stats["miss_seconds"] / stats["misses"] * 1000 if stats["misses"] else 0.0
+    return dict(
+        stats, size=len(_entries), ttl_seconds=AUTH_CACHE_TTL_SECONDS,
+        hit_ratio=round(stats["hits"] / lookups, 4) if lookups else 0.0,
+        mean_miss_ms=round(miss_ms, 3), saved_seconds=round(stats["hits"] * miss_ms / 1000, 3)
+    )
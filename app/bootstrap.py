@@ -0,0 +1,86 @@
+"""Database setup, once per deploy instead of once per worker.
+
+Creating tables, applying migrations, backfilling the search index and
+dashboard stats and seeding the demo data used to run in every worker's
+startup hook, costing every autoscaled or restarted worker several queries
+(and a full backfill on a fresh database) before it served /health. That work
+is now ``python -m app.cli init``, run once per deploy as a release step
+before the server containers start (see the Dockerfile), so replicas neither
+pay for it on every start nor race each other on migrations. Workers only
+check, with one query, that the schema is current, and refuse to start
+otherwise.
+
+INIT_ON_STARTUP=1 brings back initialization in the startup hook, for a quick
+local ``uvicorn app.main:app`` against a throwaway database.
+
+viv-auth and viv-pay define their models on Base when they are initialized,
+so ``initialize`` initializes them (on a throwaway app, when app.main has not)
+before creating tables; otherwise ``app.cli init`` would leave the user and
+billing tables out.
+"""
+import os
+from app.database import engine, SessionLocal, Base, get_db
+from app import migrations
+
+INIT_ON_STARTUP = os.environ.get("INIT_ON_STARTUP", "0") == "1"
+APP_NAME = "CRM Pro"
+
+_vendors = None
+
+class NotInitialized(RuntimeError):
+    pass
+
+def init_vendors(app) -> tuple:
+    """Initialize viv-auth and viv-pay on the app, once per process.
+
+    Returns (User, require_auth, create_checkout, get_customer, require_subscription).
+    """
+    global _vendors
+    if _vendors is None:
+        from viv_auth import init_auth
+        from viv_pay import init_pay
+        User, require_auth = init_auth(app, engine, Base, get_db, app_name=APP_NAME)
+        create_checkout, get_customer, require_subscription = init_pay(app, engine, Base, get_db, app_name=APP_NAME)
+        _vendors = (User, require_auth, create_checkout, get_customer, require_subscription)
+    return _vendors
+
+def register_vendor_models():
+    """Make sure the viv-auth/viv-pay models are on Base; returns viv-auth's User model."""
+    if _vendors is None:
+        from fastapi import FastAPI
+        # Only their models are needed here; the routes they add go nowhere
+        init_vendors(FastAPI())
+    return _vendors[0]
+
+def initialize(seed: bool = True) -> list:
+    """Schema, search index, dashboard stats and (optionally) demo data. Returns the migrations applied."""
+    from app.search import init_search_index
+    from app.stats import init_stats
+    from app.seed import seed_crm_data
+    # Registers the duplicate check on contact writes, so demo contacts are keyed too
+    import app.dedup
+    register_vendor_models()
+    applied = migrations.init_schema(engine)
+    init_search_index()
+    init_stats()
+    if seed:
+        db = SessionLocal()
+        try:
+            seed_crm_data(db)
+        finally:
+            db.close()
+    return applied
+
+def check_initialized():
+    pending = migrations.pending_versions(engine)
+    if pending:
+        raise NotInitialized(
+            f"database schema is not current (pending migrations: {pending}); "
+            "run `python -m app.cli init` first, or set INIT_ON_STARTUP=1"
+        )
+
+def on_startup():
+    if INIT_ON_STARTUP:
+        initialize()
+    else:
+        check_initialized()
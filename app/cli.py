@@ -0,0 +1,199 @@
+"""Operational commands.
+
+    python -m app.cli <command> [options]
+"""
+import argparse
+from app.database import engine
+from app.gemini import ANALYSIS_TYPES
+import app.models
+
+def cmd_migrate(args):
+    from app import migrations
+    if args.status:
+        with engine.connect() as connection:
+            migrations._metadata.create_all(bind=connection)
+            done = migrations.applied_versions(connection)
+        for version, description, _ in migrations.MIGRATIONS:
+            print(f"{'applied' if version in done else 'pending'}  {version:>4}  {description}")
+        return
+    applied = migrations.init_schema(engine)
+    print(f"applied migrations: {applied}" if applied else "schema is up to date")
+
+def cmd_init(args):
+    from app.bootstrap import initialize
+    applied = initialize(seed=not args.no_seed)
+    print(f"database initialized (applied migrations: {applied})" if applied else "database initialized")
+
+def cmd_import_contacts(args):
+    from app.importer import import_contacts, detect_format, ImportFormatError
+
+    def progress(report):
+        line = (f"{report.total} rows read, {report.inserted} inserted, {report.duplicates} duplicates, "
+                f"{report.failed} errors ({int(report.total / report.elapsed)} rows/s)")
+        if report.status == "checking":
+            line += ", checking for duplicates..."
+        # Padded so the last line fully covers the longer "checking" one
+        print(f"\r{line:<100}", end="", flush=True)
+
+    try:
+        with open(args.path, "rb") as stream:
+            report = import_contacts(stream, args.format or detect_format(args.path), user_id=args.user_id,
+                                     batch_size=args.batch_size, progress=progress)
+    except ImportFormatError as e:
+        raise SystemExit(f"error: {e}")
+    print()
+    for line, message in report.errors:
+        print(f"line {line}: {message}")
+
+def cmd_export(args):
+    import sys
+    from contextlib import nullcontext
+    from app.exporter import export_rows, ExportError
+    filters = {name: getattr(args, name) for name in ("status", "source", "assigned_to", "q", "stage", "type", "contact_id")}
+    try:
+        chunks = export_rows(args.entity, args.format, gzip=args.gzip, user_id=args.user_id, **filters)
+    except ExportError as e:
+        raise SystemExit(f"error: {e}")
+    # stdout is written to, not closed
+    with (open(args.output, "wb") if args.output else nullcontext(sys.stdout.buffer)) as out:
+        for chunk in chunks:
+            out.write(chunk)
+
+def cmd_generate_data(args):
+    from datetime import date
+    from app.datagen import generate
+
+    def progress(report):
+        print(f"\r{report.contacts} contacts, {report.deals} deals, {report.stage_events} stage events, "
+              f"{report.activities} activities ({int(report.rows / report.elapsed)} rows/s)", end="", flush=True)
+
+    owners = [args.user_id] + [f"{args.user_id}-{n}" for n in range(1, args.owners)]
+    try:
+        report = generate(args.contacts, args.deals, args.activities, owners, seed=args.seed,
+                          as_of=date.fromisoformat(args.as_of) if args.as_of else None,
+                          batch_size=args.batch_size, index_search=not args.no_search, progress=progress)
+    except ValueError as e:
+        raise SystemExit(f"error: {e}")
+    print(f"\ndone in {report.elapsed:.1f}s")
+
+def cmd_intel_batch(args):
+    import asyncio
+    from app import intel_batch
+
+    def on_progress(report):
+        print(f"\rrun {report.run_id}: {report.done + report.skipped + report.failed}/{report.total} "
+              f"({report.done} generated, {report.skipped} fresh, {report.failed} failed, "
+              f"{report.per_minute:.1f}/min)", end="", flush=True)
+
+    if args.resume:
+        run_id = args.resume
+    elif args.user_id and args.analysis_type:
+        run_id = intel_batch.create_run(args.user_id, args.analysis_type, requested_by="cli")
+        print(f"created batch run {run_id}")
+    else:
+        raise SystemExit("error: pass --user-id and --analysis-type, or --resume RUN_ID")
+    limits = {name: getattr(args, name) for name in ("concurrency", "rate", "burst") if getattr(args, name) is not None}
+    try:
+        report = asyncio.run(intel_batch.run_batch(run_id, on_progress=on_progress, **limits))
+    except (intel_batch.RunNotFound, intel_batch.RunBusy) as e:
+        raise SystemExit(f"error: {e}")
+    print(f"\ndone in {report.elapsed:.1f}s")
+
+def cmd_dedup_scan(args):
+    from app.dedup import scan
+
+    def progress(report):
+        print(f"\r{report.contacts} contacts keyed, {report.pairs} pairs compared, "
+              f"{report.duplicates} possible duplicates ({report.elapsed:.1f}s)", end="", flush=True)
+
+    scan(user_id=args.user_id, batch_size=args.batch_size, progress=progress)
+    print()
+
+def cmd_rebuild_stats(args):
+    from app.stats import rebuild_stats
+    with engine.begin() as connection:
+        rebuild_stats(connection)
+    print("dashboard stats rebuilt")
+
+def cmd_rebuild_analytics(args):
+    from app.analytics import rebuild_rollups
+    with engine.begin() as connection:
+        months = rebuild_rollups(connection)
+    print(f"deal stage rollups rebuilt ({months} owner-months)")
+
+def cmd_rebuild_search(args):
+    from app.search import init_search_index, rebuild_search_index
+    init_search_index()
+    with engine.begin() as connection:
+        rebuild_search_index(connection)
+    print("search index rebuilt")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="CRM Pro operational commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="Create missing tables and apply pending schema migrations")
+    migrate.add_argument("--status", action="store_true", help="List migrations and whether they are applied")
+    migrate.set_defaults(func=cmd_migrate)
+
+    init = commands.add_parser("init", help="One-shot setup before the app starts: schema, search index, stats and demo data")
+    init.add_argument("--no-seed", action="store_true", help="Skip the demo data")
+    init.set_defaults(func=cmd_init)
+
+    import_parser = commands.add_parser("import-contacts", help="Bulk import contacts from a CSV or JSON Lines file")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--user-id", required=True, help="Owner of the imported contacts")
+    import_parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension")
+    import_parser.add_argument("--batch-size", type=int, default=5000)
+    import_parser.set_defaults(func=cmd_import_contacts)
+
+    export = commands.add_parser("export", help="Stream contacts, deals or activities to a file or stdout")
+    export.add_argument("entity", choices=["contacts", "deals", "activities"])
+    export.add_argument("--format", choices=["csv", "jsonl", "parquet"], default="csv")
+    export.add_argument("--gzip", action="store_true")
+    export.add_argument("-o", "--output", help="Defaults to stdout")
+    export.add_argument("--user-id", help="Only this owner's rows (default: all owners)")
+    export.add_argument("--status", help="contacts")
+    export.add_argument("--source", help="contacts")
+    export.add_argument("--assigned-to", help="contacts")
+    export.add_argument("--q", help="contacts: name, email or company prefix")
+    export.add_argument("--stage", help="deals")
+    export.add_argument("--type", help="activities")
+    export.add_argument("--contact-id", type=int, help="deals and activities")
+    export.set_defaults(func=cmd_export)
+
+    generate_parser = commands.add_parser("generate-data", help="Bulk insert deterministic synthetic contacts, deals and activities")
+    generate_parser.add_argument("--contacts", type=int, default=100000)
+    generate_parser.add_argument("--deals", type=int, default=300000)
+    generate_parser.add_argument("--activities", type=int, default=1000000)
+    generate_parser.add_argument("--user-id", default="system", help="Owner of the rows (default: the demo owner)")
+    generate_parser.add_argument("--owners", type=int, default=1, help="Spread rows over this many owners: USER_ID, USER_ID-1, ...")
+    generate_parser.add_argument("--seed", type=int, default=1)
+    generate_parser.add_argument("--as-of", help="Date (YYYY-MM-DD) the history ends on (default: today)")
+    generate_parser.add_argument("--batch-size", type=int, default=50000, help="Rows per transaction")
+    generate_parser.add_argument("--no-search", action="store_true", help="Skip indexing; run rebuild-search later")
+    generate_parser.set_defaults(func=cmd_generate_data)
+
+    batch = commands.add_parser("intel-batch", help="Company intel for every distinct company of an owner's contacts")
+    batch.add_argument("--user-id", help="Owner whose contacts to cover")
+    batch.add_argument("--analysis-type", choices=ANALYSIS_TYPES)
+    batch.add_argument("--resume", type=int, metavar="RUN_ID", help="Continue an interrupted run")
+    batch.add_argument("--concurrency", type=int, help="Gemini calls in flight (default: $INTEL_BATCH_CONCURRENCY or 4)")
+    batch.add_argument("--rate", type=float, help="Gemini calls per second (default: $INTEL_BATCH_RATE or 1)")
+    batch.add_argument("--burst", type=int, help="Calls allowed at once after a pause (default: $INTEL_BATCH_BURST or 4)")
+    batch.set_defaults(func=cmd_intel_batch)
+
+    dedup = commands.add_parser("dedup-scan", help="Rebuild duplicate contact candidates from scratch")
+    dedup.add_argument("--user-id", help="Only this owner's contacts (default: all owners)")
+    dedup.add_argument("--batch-size", type=int, default=20000, help="Contacts or pairs per transaction")
+    dedup.set_defaults(func=cmd_dedup_scan)
+
+    commands.add_parser("rebuild-stats", help="Recompute dashboard aggregates from scratch").set_defaults(func=cmd_rebuild_stats)
+    commands.add_parser("rebuild-search", help="Rebuild the full-text search index").set_defaults(func=cmd_rebuild_search)
+    commands.add_parser("rebuild-analytics", help="Recompute monthly deal stage rollups from the stage history").set_defaults(func=cmd_rebuild_analytics)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,83 @@
+"""Engines and sessions.
+
+The engine profile is configured from the environment. SQLite connections
+get WAL journaling and the pragmas below on connect, so readers no longer
+block the writer and a briefly locked database is waited on instead of
+failing with "database is locked". Postgres gets a sized, pre-pinged,
+recycled pool and a per-statement timeout. DB_PROFILE=default keeps
+SQLAlchemy's stock settings, for comparison in bench.concurrency.
+
+When DATABASE_READ_URL points at a read replica, GET handlers read through
+get_read_db. After a client writes, its reads stay on the primary for
+READ_AFTER_WRITE_SECONDS so it always sees its own changes.
+"""
 import os
-from sqlalchemy import create_engine
+import time
+from fastapi import Request
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
 if not DATABASE_URL:
     os.makedirs("/data", exist_ok=True)
     DATABASE_URL = "sqlite:////data/app.db"
+DATABASE_READ_URL = os.environ.get("DATABASE_READ_URL")
+
+DB_PROFILE = os.environ.get("DB_PROFILE", "production")
+
+# SQLite
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Postgres
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+READ_AFTER_WRITE_SECONDS = int(os.environ.get("READ_AFTER_WRITE_SECONDS", "5"))
+READ_PRIMARY_COOKIE = "crm_read_primary_until"
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    finally:
+        cursor.close()
 
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+def create_app_engine(url: str):
+    is_sqlite = url.startswith("sqlite")
+    if DB_PROFILE == "default":
+        return create_engine(url, connect_args={"check_same_thread": False} if is_sqlite else {})
+    if is_sqlite:
+        new_engine = create_engine(url, connect_args={
+            "check_same_thread": False,
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000
+        })
+        event.listen(new_engine, "connect", _sqlite_pragmas)
+        return new_engine
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    )
+
+engine = create_app_engine(DATABASE_URL)
+read_engine = create_app_engine(DATABASE_READ_URL) if DATABASE_READ_URL else engine
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
@@ -22,3 +87,26 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def reads_pinned_to_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+async def pin_reads_after_write(request: Request, call_next):
+    """HTTP middleware: after a successful write, send this client's reads to the primary for a while."""
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD") and response.status_code < 400:
+        response.set_cookie(READ_PRIMARY_COOKIE, str(time.time() + READ_AFTER_WRITE_SECONDS),
+                            max_age=READ_AFTER_WRITE_SECONDS, httponly=True, samesite="lax")
+    return response
+
+def get_read_db(request: Request):
+    """Session for read-only handlers: the replica if configured, unless the client just wrote."""
+    factory = SessionLocal if reads_pinned_to_primary(request) else ReadSessionLocal
+    db = factory()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,318 @@
+"""Deterministic synthetic data at production scale.
+
+``generate`` bulk-inserts contacts, deals (with their stage history) and
+activities through Core executemany, bypassing the ORM write hooks, and then
+brings the derived tables up to date: dashboard stats and stage rollups are
+rebuilt, the search index is filled batch by batch, and each owner's forecast
+version is bumped. Into an empty database the secondary indexes are dropped
+for the load and built once at the end, which is several times faster than
+maintaining them row by row. Duplicate candidates are not computed; run
+``app.cli dedup-scan`` afterwards.
+
+Rows are drawn from NumPy generators seeded with (seed, table, block), so the
+same arguments on an empty database always produce the same data, whatever
+the batch size. Dates are placed relative to ``as_of`` (default: today); pass
+it explicitly to reproduce a dataset exactly on another day.
+
+    python -m app.cli generate-data --contacts 1000000 --deals 3000000 --activities 10000000
+"""
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Callable, List
+import numpy as np
+from sqlalchemy import func, insert, select, text
+from app.database import engine
+from app.models import Contact, Deal, Activity, DealStageEvent
+from app import analytics, search, stats
+from app.migrations import init_schema
+
+# Rows per seeded block; a block is the unit of randomness, not of insertion
+BLOCK_ROWS = 10000
+HISTORY_DAYS = 3 * 365
+
+FIRST_NAMES = [
+    "Alice", "Bob", "Carla", "David", "Elena", "Farid", "Grace", "Hugo", "Ines", "Jamal", "Keiko", "Liam",
+    "Maria", "Noah", "Olga", "Pedro", "Quinn", "Rosa", "Sven", "Tara", "Umar", "Vera", "Wei", "Yusuf", "Zoe"
+]
+LAST_NAMES = [
+    "Anders", "Baker", "Chen", "Dubois", "Evans", "Fischer", "Garcia", "Hansen", "Ito", "Jones", "Kowalski",
+    "Lopez", "Murphy", "Nguyen", "Okafor", "Patel", "Rossi", "Schmidt", "Tanaka", "Usman", "Varga", "Walsh"
+]
+COMPANY_WORDS = [
+    "Acme", "Apex", "Blue", "Bright", "Cedar", "Delta", "Echo", "Falcon", "Global", "Harbor", "Iron", "Juniper",
+    "Keystone", "Lumen", "Metro", "North", "Orbit", "Pioneer", "Quantum", "River", "Summit", "Terra", "Vertex", "Zenith"
+]
+COMPANY_KINDS = ["Labs", "Systems", "Logistics", "Health", "Foods", "Capital", "Energy", "Media", "Works", "Retail"]
+TITLES = ["CEO", "CTO", "CFO", "VP Sales", "VP Engineering", "Head of Procurement", "Operations Director",
+          "Product Manager", "IT Manager", "Founder"]
+PRODUCTS = ["Platform License", "Annual Plan", "Migration", "Support Contract", "Pilot", "Expansion", "Integration"]
+SUBJECTS = {
+    "call": ["Discovery call", "Follow-up call", "Pricing call"],
+    "email": ["Sent proposal", "Follow-up email", "Intro email"],
+    "meeting": ["Demo", "On-site meeting", "Quarterly review"],
+    "note": ["Budget confirmed", "Decision maker identified", "Competitor mentioned"],
+    "task": ["Send contract", "Prepare quote", "Schedule demo"]
+}
+
+STATUSES = (["lead", "contacted", "proposal", "negotiation", "closed_won", "closed_lost"],
+            [0.35, 0.2, 0.15, 0.1, 0.1, 0.1])
+SOURCES = (["website", "referral", "cold_call", "linkedin", "other"], [0.3, 0.25, 0.15, 0.2, 0.1])
+DEAL_STAGES = (stats.STAGES, [0.25, 0.2, 0.15, 0.2, 0.2])
+ACTIVITY_TYPES = (list(SUBJECTS), [0.3, 0.3, 0.15, 0.15, 0.1])
+# Typical close probability (%) per stage; open deals get +-10 around it
+STAGE_PROBABILITY = {"qualified": 20, "proposal": 45, "negotiation": 70, "closed_won": 100, "closed_lost": 0}
+REPS = 25
+
+_TABLE_CODES = {"contacts": 1, "deals": 2, "activities": 3}
+_COMPANIES = np.array([f"{word} {kind}" for word in COMPANY_WORDS for kind in COMPANY_KINDS])
+
+@dataclass
+class GenerateReport:
+    contacts: int = 0
+    deals: int = 0
+    stage_events: int = 0
+    activities: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    @property
+    def rows(self) -> int:
+        return self.contacts + self.deals + self.stage_events + self.activities
+
+class Plan:
+    """Sizes, owners and id offsets shared by the three generators."""
+
+    def __init__(self, connection, contacts: int, deals: int, activities: int, owners: List[str], seed: int, as_of: date):
+        self.contacts, self.deals, self.activities = contacts, deals, activities
+        self.owners = np.array(owners)
+        self.seed = seed
+        self.as_of = np.datetime64(datetime.combine(as_of, datetime.min.time()), "s")
+        self.first_contact_id = _next_id(connection, Contact)
+        self.first_deal_id = _next_id(connection, Deal)
+        self.first_activity_id = _next_id(connection, Activity)
+        # Contact index of every generated deal, so activities can follow their deal's contact
+        self.deal_contact = np.zeros(deals, dtype=np.int64)
+        # SQLite stores dates as text; formatting whole arrays in NumPy beats per-value bind processing
+        self.as_text = connection.dialect.name == "sqlite"
+
+    def rng(self, table: str, block: int) -> np.random.Generator:
+        return np.random.default_rng([self.seed, _TABLE_CODES[table], block])
+
+    def owner_of(self, contact_index: np.ndarray) -> np.ndarray:
+        return self.owners[contact_index % len(self.owners)]
+
+    def days_ago(self, days: np.ndarray) -> np.ndarray:
+        return self.as_of - (days * 86400).astype("timedelta64[s]")
+
+    def values(self, times: np.ndarray) -> list:
+        """datetime64 values as bind parameters: text in SQLAlchemy's SQLite format, else date(time)s."""
+        if not self.as_text:
+            return times.astype("datetime64[us]").tolist() if times.dtype != "datetime64[D]" else times.tolist()
+        if times.dtype == "datetime64[D]":
+            return np.datetime_as_string(times).tolist()
+        return np.char.replace(np.datetime_as_string(times, unit="us"), "T", " ").tolist()
+
+def _next_id(connection, model) -> int:
+    return (connection.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+def _choice(rng, options: tuple, size: int) -> np.ndarray:
+    values, weights = options
+    return np.array(values)[rng.choice(len(values), size=size, p=weights)]
+
+def contact_rows(plan: Plan, block: int) -> list:
+    start, end = block * BLOCK_ROWS, min((block + 1) * BLOCK_ROWS, plan.contacts)
+    size = end - start
+    rng = plan.rng("contacts", block)
+    index = np.arange(start, end)
+    first = np.array(FIRST_NAMES)[rng.integers(len(FIRST_NAMES), size=size)]
+    last = np.array(LAST_NAMES)[rng.integers(len(LAST_NAMES), size=size)]
+    company = company_of(index)
+    phone = rng.integers(10000000, 100000000, size=size)
+    title = np.array(TITLES)[rng.integers(len(TITLES), size=size)]
+    reps = rng.integers(0, REPS + 3, size=size)
+    created = plan.values(plan.days_ago(rng.uniform(0, HISTORY_DAYS, size=size)))
+    return [
+        (plan.first_contact_id + i, owner, f"{f} {l}", f"{f.lower()}.{l.lower()}{plan.first_contact_id + i}@{c.split()[0].lower()}.example.com",
+         f"+1-555-{p // 10000:04d}-{p % 10000:04d}", c, t, status, source, f"Rep {r + 1}" if r < REPS else None, at, at)
+        for i, owner, f, l, c, p, t, status, source, r, at in zip(
+            index.tolist(), plan.owner_of(index).tolist(), first.tolist(), last.tolist(), company.tolist(), phone.tolist(),
+            title.tolist(), _choice(rng, STATUSES, size).tolist(), _choice(rng, SOURCES, size).tolist(), reps.tolist(), created
+        )
+    ]
+
+def company_of(contact_index: np.ndarray) -> np.ndarray:
+    return _COMPANIES[(contact_index * 7919) % len(_COMPANIES)]
+
+def deal_rows(plan: Plan, block: int) -> tuple:
+    """(deal rows, stage event rows) for one block."""
+    start, end = block * BLOCK_ROWS, min((block + 1) * BLOCK_ROWS, plan.deals)
+    size = end - start
+    rng = plan.rng("deals", block)
+    contact = rng.integers(0, plan.contacts, size=size)
+    plan.deal_contact[start:end] = contact
+    stage = _choice(rng, DEAL_STAGES, size)
+    value = np.round(rng.lognormal(10, 1, size=size), 2)
+    closed = np.isin(stage, stats.CLOSED_STAGES)
+    typical = np.array([STAGE_PROBABILITY[s] for s in stage.tolist()])
+    probability = np.where(closed, typical, np.clip(typical + rng.integers(-10, 11, size=size), 5, 95))
+    product = np.array(PRODUCTS)[rng.integers(len(PRODUCTS), size=size)]
+
+    # Funnel steps to the current stage; lost deals drop out after a random open stage
+    lost_after = rng.integers(0, len(analytics.OPEN_STAGES), size=size)
+    steps = np.where(stage == "closed_lost", lost_after + 1,
+                     np.array([analytics.FUNNEL.index(s) if s in analytics.FUNNEL else 0 for s in stage.tolist()]))
+    step_days = rng.exponential(14, size=(size, len(analytics.FUNNEL)))
+    offsets = np.concatenate([np.zeros((size, 1)), np.cumsum(step_days, axis=1)], axis=1)
+    duration = offsets[np.arange(size), steps]
+    created_days = duration + rng.uniform(0, 1, size=size) * np.maximum(HISTORY_DAYS - duration, 0)
+    changed = plan.days_ago(created_days[:, None] - offsets)
+    expected_close = plan.values(np.where(
+        closed,
+        changed[np.arange(size), steps].astype("datetime64[D]"),
+        plan.as_of.astype("datetime64[D]") + rng.integers(-30, 270, size=size).astype("timedelta64[D]")
+    ))
+    changed = np.array(plan.values(changed.ravel()), dtype=object).reshape(changed.shape)
+
+    deals, events = [], []
+    for k, (i, c, company, s, v, p, prod, n, close) in enumerate(zip(
+        range(start, end), contact.tolist(), company_of(contact).tolist(), stage.tolist(), value.tolist(),
+        probability.tolist(), product.tolist(), steps.tolist(), expected_close
+    )):
+        deal_id = plan.first_deal_id + i
+        owner = str(plan.owners[c % len(plan.owners)])
+        times = changed[k, :n + 1]
+        path = analytics.FUNNEL[:n] + [s] if s == "closed_lost" else analytics.FUNNEL[:n + 1]
+        deals.append((deal_id, owner, plan.first_contact_id + c, f"{company} {prod}",
+                      v, "USD", s, int(p), close, times[0], times[-1]))
+        events.extend((owner, deal_id, path[j - 1] if j else None, path[j], times[j]) for j in range(n + 1))
+    return deals, events
+
+def activity_rows(plan: Plan, block: int) -> list:
+    start, end = block * BLOCK_ROWS, min((block + 1) * BLOCK_ROWS, plan.activities)
+    size = end - start
+    rng = plan.rng("activities", block)
+    # Seven in ten activities belong to a deal and its contact
+    on_deal = rng.random(size) < 0.7 if plan.deals else np.zeros(size, dtype=bool)
+    deal = rng.integers(0, max(plan.deals, 1), size=size)
+    contact = np.where(on_deal, plan.deal_contact[deal] if plan.deals else 0, rng.integers(0, plan.contacts, size=size))
+    kind = _choice(rng, ACTIVITY_TYPES, size)
+    subject = rng.integers(0, 3, size=size)
+    days = rng.uniform(-30, 2 * 365, size=size)
+    when = plan.days_ago(days)
+    created = plan.days_ago(np.maximum(days, 0) + rng.uniform(0, 7, size=size))
+    completed = (days > 0) & (rng.random(size) < 0.9)
+    return [
+        (plan.first_activity_id + i, owner, plan.first_contact_id + c, plan.first_deal_id + d if linked else None,
+         k, SUBJECTS[k][sub], None, at, done, created_at)
+        for i, owner, c, d, linked, k, sub, at, done, created_at in zip(
+            range(start, end), plan.owner_of(contact).tolist(), contact.tolist(), deal.tolist(), on_deal.tolist(),
+            kind.tolist(), subject.tolist(), plan.values(when), completed.tolist(), plan.values(created)
+        )
+    ]
+
+_CONTACT_COLUMNS = ["id", "user_id", "name", "email", "phone", "company", "title", "status", "source", "assigned_to",
+                    "created_at", "updated_at"]
+_DEAL_COLUMNS = ["id", "user_id", "contact_id", "title", "value", "currency", "stage", "probability", "expected_close",
+                 "created_at", "updated_at"]
+_EVENT_COLUMNS = ["user_id", "deal_id", "from_stage", "to_stage", "changed_at"]
+_ACTIVITY_COLUMNS = ["id", "user_id", "contact_id", "deal_id", "type", "subject", "description", "date", "completed",
+                     "created_at"]
+
+def _insert(connection, table, columns: list, rows: list):
+    if not rows:
+        return
+    if connection.dialect.name != "sqlite":
+        connection.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+        return
+    # SQLite fast path as in app.importer: a plain DBAPI executemany (dates are already text, see Plan.values)
+    connection.exec_driver_sql(
+        f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows
+    )
+
+@contextmanager
+def _deferred_indexes(tables: list):
+    """Drop the tables' secondary indexes for the duration, then build them again."""
+    indexes = [index for table in tables for index in table.indexes]
+    with engine.begin() as connection:
+        for index in indexes:
+            # Not Index.drop(checkfirst=True): reflection skips expression indexes
+            connection.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    try:
+        yield
+    finally:
+        with engine.begin() as connection:
+            for index in indexes:
+                index.create(connection)
+
+def _blocks(count: int) -> int:
+    return (count + BLOCK_ROWS - 1) // BLOCK_ROWS
+
+def generate(contacts: int, deals: int, activities: int, owners: List[str], seed: int = 1, as_of: date = None,
+             batch_size: int = 50000, index_search: bool = True,
+             progress: Callable[[GenerateReport], None] = None) -> GenerateReport:
+    if (deals or activities) and not contacts:
+        raise ValueError("deals and activities need contacts to belong to")
+    init_schema(engine)
+    search.init_search_index()
+    report = GenerateReport()
+    with engine.connect() as connection:
+        plan = Plan(connection, contacts, deals, activities, owners, seed, as_of or date.today())
+    per_batch = max(1, batch_size // BLOCK_ROWS)
+
+    def run(table: str, count: int, write):
+        blocks = _blocks(count)
+        for first in range(0, blocks, per_batch):
+            with engine.begin() as connection:
+                for block in range(first, min(first + per_batch, blocks)):
+                    write(connection, block)
+            if progress:
+                progress(report)
+
+    def write_contacts(connection, block):
+        rows = contact_rows(plan, block)
+        _insert(connection, Contact.__table__, _CONTACT_COLUMNS, rows)
+        report.contacts += len(rows)
+        if index_search:
+            search.index_entities(connection, "contact", range(rows[0][0], rows[-1][0] + 1), new=True)
+
+    def write_deals(connection, block):
+        rows, events = deal_rows(plan, block)
+        _insert(connection, Deal.__table__, _DEAL_COLUMNS, rows)
+        _insert(connection, DealStageEvent.__table__, _EVENT_COLUMNS, events)
+        report.deals += len(rows)
+        report.stage_events += len(events)
+        if index_search:
+            search.index_entities(connection, "deal", range(rows[0][0], rows[-1][0] + 1), new=True)
+
+    def write_activities(connection, block):
+        rows = activity_rows(plan, block)
+        _insert(connection, Activity.__table__, _ACTIVITY_COLUMNS, rows)
+        report.activities += len(rows)
+        if index_search:
+            search.index_entities(connection, "activity", range(rows[0][0], rows[-1][0] + 1), new=True)
+
+    tables = [Contact.__table__, Deal.__table__, DealStageEvent.__table__, Activity.__table__]
+    with engine.connect() as connection:
+        empty = all(connection.execute(select(table).limit(1)).first() is None for table in tables)
+    with _deferred_indexes(tables) if empty else nullcontext():
+        run("contacts", contacts, write_contacts)
+        run("deals", deals, write_deals)
+        run("activities", activities, write_activities)
+
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            for table in ("contacts", "deals", "activities"):
+                connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+                ))
+        stats.rebuild_stats(connection)
+        analytics.rebuild_rollups(connection)
+        for owner in owners:
+            stats.apply_delta(connection, owner, stats.FORECAST_VERSION, 1)
+        connection.execute(text("ANALYZE"))
+    return report
@@ -0,0 +1,562 @@
+"""Duplicate contact detection and merging.
+
+Comparing every contact with every other is quadratic, so contacts are only
+compared within blocks: each contact gets up to three blocking keys, stored in
+``contact_match_keys`` on an (owner, key) primary key,
+
+- ``e:<email>``: the normalized email (lowercased, ``+tag`` dropped),
+- ``n:<domain>:<code>``: the email domain plus the Soundex of the last name
+  and the first initial, so "Jon Smyth" and "John Smith" at acme.com meet,
+- ``p:<digits>``: the last ten digits of the phone number (seven at least),
+
+and only contacts sharing a key are scored. Blocks larger than
+DEDUP_MAX_BLOCK (a popular free-mail domain with a common surname) are skipped
+rather than compared pairwise. Pairs are scored with fuzzy name and company
+matching (difflib) on top of the exact email and phone matches, and those at
+or above DEDUP_THRESHOLD are stored in ``contact_duplicates`` for review.
+
+Mapper hooks re-key and re-score a contact inside the transaction that writes
+it, and the importer runs ``check_new_contacts`` over everything it inserted
+once the import is done. ``scan`` rebuilds everything: one pass writes the
+keys, one reads them back in key order and scores each block as it arrives,
+so memory stays flat. Each contact is normalized once (``profile``), and the
+fuzzy ratios are skipped once their cheap upper bounds show a pair cannot
+reach the threshold. Time follows the number of pairs, about 30,000 a second
+on one core: on app.datagen contacts (whose names come from small pools, so
+nearly every pair in a block is flagged) 100,000 contacts are 379k pairs and
+take 20s, a million are 37.7M pairs and take 21 minutes in under 400 MB.
+Dismissed pairs are kept and not flagged again.
+
+    python -m app.cli dedup-scan [--user-id <owner>]
+
+``merge_contacts`` folds duplicates into a surviving contact in one
+transaction: their deals and activities move to the survivor, empty fields
+are filled from the duplicates, and the duplicates are deleted.
+"""
+import os
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from functools import lru_cache
+from itertools import groupby, islice
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import delete, event, func, insert, inspect, literal, or_, select, tuple_, update
+from sqlalchemy.orm import Session, aliased
+from app import page_cache, search, stats
+from app.database import engine
+from app.models import Activity, Contact, ContactDuplicate, ContactMatchKey, Deal
+from app.tenancy import current_user_id
+
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.55"))
+DEDUP_MAX_BLOCK = int(os.environ.get("DEDUP_MAX_BLOCK", "100"))
+SCAN_BATCH = 20000
+# Bound parameters per IN (...) list, under SQLite's limit
+IN_BATCH = 900
+
+# Score weights; a shared email or phone number is strong evidence, names and companies add to it
+EMAIL_WEIGHT = 0.5
+PHONE_WEIGHT = 0.35
+NAME_WEIGHT = 0.4
+COMPANY_WEIGHT = 0.1
+DOMAIN_WEIGHT = 0.1
+# Fuzzy ratio from which a name or company counts as a reason
+SIMILAR = 0.85
+REASONS = ("email", "phone", "name", "company", "domain")
+
+# Domains shared by unrelated people: they do not count as a company domain
+FREE_DOMAINS = {
+    "gmail.com", "googlemail.com", "yahoo.com", "hotmail.com", "outlook.com", "live.com", "msn.com",
+    "icloud.com", "me.com", "aol.com", "proton.me", "protonmail.com", "gmx.com", "mail.com", "yandex.com"
+}
+# Contact columns copied from a duplicate when the survivor has none
+FILL_FIELDS = ("phone", "company", "title", "source", "assigned_to")
+# Contact columns the keys and scores are computed from
+MATCH_COLUMNS = ("name", "email", "phone", "company")
+
+_keys = ContactMatchKey.__table__
+_duplicates = ContactDuplicate.__table__
+_contact_columns = (Contact.id, Contact.user_id, Contact.name, Contact.email, Contact.phone, Contact.company)
+
+class MergeError(ValueError):
+    pass
+
+@dataclass
+class ScanReport:
+    contacts: int = 0
+    keys: int = 0
+    pairs: int = 0
+    duplicates: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+# Normalization and keys
+
+_SOUNDEX = {letter: digit for digit, letters in (
+    ("1", "bfpv"), ("2", "cgjkqsxz"), ("3", "dt"), ("4", "l"), ("5", "mn"), ("6", "r")
+) for letter in letters}
+
+def _fold(text: str) -> str:
+    # "Müller" -> "muller"
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+
+@lru_cache(maxsize=1 << 16)
+def soundex(word: str) -> str:
+    letters = [c for c in _fold(word) if "a" <= c <= "z"]
+    if not letters:
+        return ""
+    code, last = letters[0].upper(), _SOUNDEX.get(letters[0], "")
+    for letter in letters[1:]:
+        digit = _SOUNDEX.get(letter, "")
+        if digit and digit != last:
+            code += digit
+            if len(code) == 4:
+                break
+        # h and w do not separate equal codes; vowels do
+        if letter not in "hw":
+            last = digit
+    return code.ljust(4, "0")
+
+def name_tokens(name: str) -> List[str]:
+    name = _fold(name or "")
+    if "," in name:
+        # "Smith, John"
+        last, _, first = name.partition(",")
+        name = f"{first} {last}"
+    return re.findall(r"[a-z0-9]+", name)
+
+def normalize_email(email: str) -> str:
+    local, _, domain = (email or "").strip().lower().rpartition("@")
+    if not local:
+        return domain
+    return f"{local.split('+', 1)[0]}@{domain}"
+
+def email_domain(email: str) -> str:
+    return (email or "").strip().lower().rpartition("@")[2]
+
+def normalize_phone(phone: str) -> Optional[str]:
+    digits = re.sub(r"\D", "", phone or "")
+    return digits[-10:] if len(digits) >= 7 else None
+
+def match_keys(name: str, email: str, phone: str) -> set:
+    keys = set()
+    if email and "@" in email:
+        keys.add("e:" + normalize_email(email))
+    tokens = name_tokens(name)
+    domain = email_domain(email)
+    if domain and tokens and soundex(tokens[-1]):
+        initial = tokens[0][0] if len(tokens) > 1 else ""
+        keys.add(f"n:{domain}:{soundex(tokens[-1])}{initial}")
+    phone = normalize_phone(phone)
+    if phone:
+        keys.add("p:" + phone)
+    return keys
+
+# Scoring
+
+class Profile(NamedTuple):
+    """The normalized fields score() compares, computed once per contact rather than once per pair."""
+    email: str
+    phone: Optional[str]
+    # Sorted name tokens: token order does not matter, "Smith, John" is "John Smith"
+    name: str
+    company: str
+    # Email domain, unless it is a free-mail one
+    domain: str
+
+def profile(contact) -> Profile:
+    domain = email_domain(contact.email)
+    return Profile(
+        normalize_email(contact.email) if contact.email else "",
+        normalize_phone(contact.phone),
+        " ".join(sorted(name_tokens(contact.name))),
+        _fold((contact.company or "").strip()),
+        "" if domain in FREE_DOMAINS else domain
+    )
+
+# Scores are rounded to 4 places before the threshold applies
+_ROUNDING = 0.00005
+
+def _ratio(a: str, b: str, floor: float = 0.0) -> Optional[float]:
+    """difflib's ratio, or None when its cheap upper bounds already fall below floor."""
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    return _bounded_ratio(a, b, floor)
+
+# Common names meet again and again, and a name's floor only takes a few values (one per set of exact matches)
+@lru_cache(maxsize=1 << 16)
+def _bounded_ratio(a: str, b: str, floor: float) -> Optional[float]:
+    matcher = SequenceMatcher(None, a, b)
+    # real_quick_ratio (lengths only) >= quick_ratio (letter counts) >= ratio
+    if floor > 0 and (matcher.real_quick_ratio() < floor or matcher.quick_ratio() < floor):
+        return None
+    return matcher.ratio()
+
+def _score(a: Profile, b: Profile, threshold: float = 0.0) -> Optional[Tuple[float, List[str]]]:
+    """Score and reasons, or None as soon as the pair cannot reach threshold."""
+    total, reasons = 0.0, []
+    if a.email and a.email == b.email:
+        total += EMAIL_WEIGHT
+        reasons.append("email")
+    if a.phone and a.phone == b.phone:
+        total += PHONE_WEIGHT
+        reasons.append("phone")
+    if a.domain and a.domain == b.domain:
+        total += DOMAIN_WEIGHT
+        reasons.append("domain")
+    # The fuzzy parts are the expensive ones: each is skipped once even a perfect match of the rest falls short
+    floor = threshold - _ROUNDING - total
+    name = _ratio(a.name, b.name, (floor - COMPANY_WEIGHT) / NAME_WEIGHT)
+    if name is None:
+        return None
+    total += NAME_WEIGHT * name
+    if name >= SIMILAR:
+        reasons.append("name")
+    company = _ratio(a.company, b.company, (floor - NAME_WEIGHT * name) / COMPANY_WEIGHT)
+    if company is None:
+        return None
+    total += COMPANY_WEIGHT * company
+    if company >= SIMILAR:
+        reasons.append("company")
+    value = min(round(total, 4), 1.0)
+    if value < threshold:
+        return None
+    # Same order of reasons whichever part matched first
+    return value, sorted(reasons, key=REASONS.index)
+
+def score(a, b) -> Tuple[float, List[str]]:
+    """Similarity of two contacts (anything with name, email, phone and company) and why."""
+    return _score(profile(a), profile(b))
+
+# Storage
+
+def _chunks(items: list, size: int = IN_BATCH):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _insert_keys(connection, rows: List[tuple]):
+    if not rows:
+        return
+    if connection.dialect.name == "sqlite":
+        # Same executemany fast path as the importer
+        connection.exec_driver_sql("INSERT INTO contact_match_keys (user_id, key, contact_id) VALUES (?, ?, ?)", rows)
+    else:
+        connection.execute(insert(_keys), [{"user_id": u, "key": k, "contact_id": c} for u, k, c in rows])
+
+def _load_contacts(connection, ids) -> dict:
+    contacts = {}
+    for chunk in _chunks(sorted(ids)):
+        for row in connection.execute(select(*_contact_columns).where(Contact.id.in_(chunk))):
+            contacts[row.id] = row
+    return contacts
+
+def _forget(connection, ids: list, dismissed: bool = False):
+    """Drop the contacts' keys and open pairs (with dismissed=True, their dismissed pairs too)."""
+    for chunk in _chunks(ids):
+        connection.execute(delete(_keys).where(_keys.c.contact_id.in_(chunk)))
+        query = delete(_duplicates).where(or_(_duplicates.c.contact_id.in_(chunk), _duplicates.c.duplicate_id.in_(chunk)))
+        if not dismissed:
+            query = query.where(_duplicates.c.status == "open")
+        connection.execute(query)
+
+def _dismissed_pairs(connection, ids: list = None, user_id: str = None) -> set:
+    query = select(_duplicates.c.contact_id, _duplicates.c.duplicate_id).where(_duplicates.c.status == "dismissed")
+    if user_id is not None:
+        query = query.where(_duplicates.c.user_id == user_id)
+    if ids is None:
+        return set(map(tuple, connection.execute(query)))
+    pairs = set()
+    for chunk in _chunks(ids):
+        pairs.update(map(tuple, connection.execute(query.where(
+            or_(_duplicates.c.contact_id.in_(chunk), _duplicates.c.duplicate_id.in_(chunk))
+        ))))
+    return pairs
+
+def _score_pairs(connection, pairs: Iterable[tuple], contacts: dict, skip: set) -> int:
+    """Score (lower id, higher id) pairs and store those at or above the threshold. Returns how many."""
+    rows = []
+    profiles = {}
+    for low, high in pairs:
+        if (low, high) in skip:
+            continue
+        for contact_id in (low, high):
+            if contact_id not in profiles:
+                profiles[contact_id] = profile(contacts[contact_id])
+        scored = _score(profiles[low], profiles[high], DEDUP_THRESHOLD)
+        if scored:
+            value, reasons = scored
+            rows.append({"contact_id": low, "duplicate_id": high, "user_id": contacts[low].user_id, "score": value,
+                         "reasons": ",".join(reasons), "status": "open"})
+    if rows:
+        connection.execute(insert(_duplicates), rows)
+    return len(rows)
+
+def check_contacts(connection, ids, new: bool = False) -> int:
+    """Re-key contacts and score them against their blocks, in the caller's transaction.
+
+    Pass new=True for rows that were just inserted and have no keys yet.
+    Returns the number of pairs flagged.
+    """
+    ids = sorted(ids)
+    if not ids:
+        return 0
+    if not new:
+        _forget(connection, ids)
+    contacts = _load_contacts(connection, ids)
+    keys = [(row.user_id, key, row.id) for row in contacts.values() for key in match_keys(row.name, row.email, row.phone)]
+    _insert_keys(connection, keys)
+
+    by_owner = defaultdict(set)
+    for user_id, key, _ in keys:
+        by_owner[user_id].add(key)
+    pairs = set()
+    for user_id, owner_keys in by_owner.items():
+        for chunk in _chunks(sorted(owner_keys)):
+            blocks = (
+                select(_keys.c.key).where(_keys.c.user_id == user_id, _keys.c.key.in_(chunk))
+                .group_by(_keys.c.key).having(func.count() <= DEDUP_MAX_BLOCK)
+            )
+            members = defaultdict(list)
+            for key, contact_id in connection.execute(
+                select(_keys.c.key, _keys.c.contact_id).where(_keys.c.user_id == user_id, _keys.c.key.in_(blocks))
+            ):
+                members[key].append(contact_id)
+            for block in members.values():
+                for contact_id in block:
+                    if contact_id in contacts:
+                        pairs.update((min(contact_id, other), max(contact_id, other)) for other in block if other != contact_id)
+    if not pairs:
+        return 0
+    others = {contact_id for pair in pairs for contact_id in pair if contact_id not in contacts}
+    contacts.update(_load_contacts(connection, others))
+    return _score_pairs(connection, sorted(pairs), contacts, _dismissed_pairs(connection, ids))
+
+def check_new_contacts(user_id: str, ids: Iterable[int], batch_size: int = SCAN_BATCH) -> ScanReport:
+    """Key and score contacts just bulk-inserted for one owner, in one pass after the insert.
+
+    The owner's blocks are streamed once, as in scan, and only pairs with a new
+    contact in them are scored: cheaper than check_contacts per inserted batch,
+    which reads each block again for every batch that adds to it.
+    """
+    report = ScanReport()
+    new = set()
+    ids = iter(ids)
+    while True:
+        chunk = list(islice(ids, batch_size))
+        if not chunk:
+            break
+        with engine.begin() as connection:
+            rows = _load_contacts(connection, chunk).values()
+            keys = [(row.user_id, key, row.id) for row in rows for key in match_keys(row.name, row.email, row.phone)]
+            _insert_keys(connection, keys)
+        new.update(chunk)
+        report.contacts += len(rows)
+        report.keys += len(keys)
+    if new:
+        # New contacts have no dismissed pairs yet
+        _score_blocks(report, user_id, batch_size, set(), new=new)
+    return report
+
+def scan(user_id: str = None, batch_size: int = SCAN_BATCH,
+         progress: Callable[[ScanReport], None] = None) -> ScanReport:
+    """Rebuild the keys and open pairs of one owner, or of everyone."""
+    report = ScanReport()
+    owner = [] if user_id is None else [Contact.user_id == user_id]
+    with engine.begin() as connection:
+        connection.execute(delete(_keys).where(*([] if user_id is None else [_keys.c.user_id == user_id])))
+        connection.execute(delete(_duplicates).where(
+            _duplicates.c.status == "open", *([] if user_id is None else [_duplicates.c.user_id == user_id])
+        ))
+        skip = _dismissed_pairs(connection, user_id=user_id)
+
+    # Keys, a batch of contacts per transaction
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(*_contact_columns).where(Contact.id > last_id, *owner).order_by(Contact.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            keys = [(row.user_id, key, row.id) for row in rows for key in match_keys(row.name, row.email, row.phone)]
+            _insert_keys(connection, keys)
+        last_id = rows[-1].id
+        report.contacts += len(rows)
+        report.keys += len(keys)
+        if progress:
+            progress(report)
+
+    _score_blocks(report, user_id, batch_size, skip, progress)
+    if progress:
+        progress(report)
+    return report
+
+def _score_blocks(report: ScanReport, user_id: Optional[str], batch_size: int, skip: set,
+                  progress: Callable[[ScanReport], None] = None, new: set = None):
+    """Score the blocks of one owner (or everyone's), with new, only pairs with a new contact in them.
+
+    Blocks are read back in (owner, key) order straight off the primary key
+    and scored as they arrive, up to about batch_size pairs per transaction.
+    The keys are read a page at a time rather than through one open cursor:
+    on SQLite a reader kept open across the writes stops the WAL from being
+    checkpointed, and it grows by gigabytes.
+    """
+    by_owner = [] if user_id is None else [_keys.c.user_id == user_id]
+    with engine.connect() as connection:
+        oversized = set(map(tuple, connection.execute(
+            select(_keys.c.user_id, _keys.c.key).where(*by_owner)
+            .group_by(_keys.c.user_id, _keys.c.key).having(func.count() > DEDUP_MAX_BLOCK)
+        )))
+    page_size = max(batch_size, DEDUP_MAX_BLOCK + 1)
+    blocks, pending, last = [], 0, None
+    while True:
+        query = select(_keys.c.user_id, _keys.c.key, _keys.c.contact_id).where(*by_owner)
+        if last:
+            query = query.where(tuple_(_keys.c.user_id, _keys.c.key) > tuple_(literal(last[0]), literal(last[1])))
+        with engine.connect() as connection:
+            rows = connection.execute(
+                query.order_by(_keys.c.user_id, _keys.c.key, _keys.c.contact_id).limit(page_size)
+            ).all()
+        page = [(block_key, [row[2] for row in block]) for block_key, block in groupby(rows, key=lambda row: (row[0], row[1]))]
+        if len(rows) == page_size and len(page) > 1:
+            # The last block may go on in the next page (a page that is all one block is oversized anyway)
+            page.pop()
+        for (owner_id, key), ids in page:
+            if 1 < len(ids) <= DEDUP_MAX_BLOCK and (new is None or not new.isdisjoint(ids)):
+                blocks.append((owner_id, key, ids))
+                pending += len(ids) * (len(ids) - 1) // 2
+            if pending >= batch_size:
+                _score_block_pairs(report, blocks, oversized, skip, new)
+                blocks, pending = [], 0
+                if progress:
+                    progress(report)
+        if len(rows) < page_size:
+            break
+        last = page[-1][0]
+    if blocks:
+        _score_block_pairs(report, blocks, oversized, skip, new)
+
+def _score_block_pairs(report: ScanReport, blocks: list, oversized: set, skip: set, new: set = None):
+    """Score the pairs of (owner, key, contact ids) blocks in one transaction.
+
+    Two contacts can share several keys; their pair is scored only in the
+    smallest shared key that is not oversized, so no block needs to know what
+    the others compared.
+    """
+    with engine.begin() as connection:
+        contacts = _load_contacts(connection, {contact_id for _, _, ids in blocks for contact_id in ids})
+        keys = {row.id: match_keys(row.name, row.email, row.phone) for row in contacts.values()}
+        pairs = []
+        for owner_id, key, ids in blocks:
+            ids = [contact_id for contact_id in ids if contact_id in contacts]
+            for i, low in enumerate(ids):
+                for high in ids[i + 1:]:
+                    if new is not None and low not in new and high not in new:
+                        continue
+                    shared = (k for k in keys[low] & keys[high] if (owner_id, k) not in oversized)
+                    if min(shared, default=key) == key:
+                        pairs.append((low, high))
+        report.pairs += len(pairs)
+        report.duplicates += _score_pairs(connection, pairs, contacts, skip)
+
+# Review
+
+def list_duplicates(db: Session, contact_id: int = None, limit: int = 100) -> list:
+    """Open pairs, best first, with both contacts; with contact_id, only that contact's pairs."""
+    first, second = aliased(Contact), aliased(Contact)
+    query = (
+        select(ContactDuplicate.score, ContactDuplicate.reasons, first, second)
+        .join(first, first.id == ContactDuplicate.contact_id)
+        .join(second, second.id == ContactDuplicate.duplicate_id)
+        .where(ContactDuplicate.user_id == current_user_id(db), ContactDuplicate.status == "open")
+    )
+    if contact_id is not None:
+        query = query.where(or_(ContactDuplicate.contact_id == contact_id, ContactDuplicate.duplicate_id == contact_id))
+    return db.execute(query.order_by(ContactDuplicate.score.desc()).limit(limit)).all()
+
+def dismiss(db: Session, contact_id: int, duplicate_id: int) -> bool:
+    """Mark a pair as not a duplicate; it is not flagged again."""
+    low, high = sorted((contact_id, duplicate_id))
+    dismissed = db.execute(
+        update(_duplicates)
+        .where(_duplicates.c.contact_id == low, _duplicates.c.duplicate_id == high,
+               _duplicates.c.user_id == current_user_id(db))
+        .values(status="dismissed")
+    ).rowcount
+    db.commit()
+    return bool(dismissed)
+
+def merge_contacts(db: Session, survivor_id: int, duplicate_ids: Iterable[int]) -> dict:
+    """Fold duplicates into the survivor and commit, all in one transaction.
+
+    ``db`` must be scoped to the owner (app.tenancy), so only the owner's
+    contacts can be merged.
+    """
+    duplicate_ids = sorted(set(duplicate_ids) - {survivor_id})
+    if not duplicate_ids:
+        raise MergeError("Nothing to merge")
+    contacts = {c.id: c for c in db.query(Contact).filter(Contact.id.in_([survivor_id] + duplicate_ids)).all()}
+    if len(contacts) != len(duplicate_ids) + 1:
+        raise MergeError("Contact not found")
+    survivor = contacts[survivor_id]
+    duplicates = [contacts[contact_id] for contact_id in duplicate_ids]
+    user_id = survivor.user_id
+
+    for duplicate in duplicates:
+        for column in FILL_FIELDS:
+            if not getattr(survivor, column) and getattr(duplicate, column):
+                setattr(survivor, column, getattr(duplicate, column))
+    notes = [survivor.notes] + [d.notes for d in duplicates if d.notes and d.notes != survivor.notes]
+    survivor.notes = "\n\n".join(n for n in notes if n) or None
+
+    # Bulk moves skip the mapper hooks, so the search documents (their URL is the
+    # contact's) and the forecast version are updated here
+    deal_ids = db.execute(select(Deal.id).where(Deal.user_id == user_id, Deal.contact_id.in_(duplicate_ids))).scalars().all()
+    activity_ids = db.execute(
+        select(Activity.id).where(Activity.user_id == user_id, Activity.contact_id.in_(duplicate_ids))
+    ).scalars().all()
+    for model in (Deal, Activity):
+        db.execute(
+            update(model).where(model.user_id == user_id, model.contact_id.in_(duplicate_ids)).values(contact_id=survivor_id),
+            execution_options={"synchronize_session": False}
+        )
+    for duplicate in duplicates:
+        # Reload the now-empty collections so the delete cascade does not take the moved rows along
+        db.expire(duplicate, ["deals", "activities"])
+        db.delete(duplicate)
+    db.flush()
+    connection = db.connection()
+    search.index_entities(connection, "deal", deal_ids)
+    search.index_entities(connection, "activity", activity_ids)
+    if deal_ids:
+        stats.apply_delta(connection, user_id, stats.FORECAST_VERSION, 1)
+    db.commit()
+    if deal_ids or activity_ids:
+        page_cache.invalidate(user_id, "deals", "activities")
+    return {"survivor_id": survivor_id, "merged": duplicate_ids, "deals": len(deal_ids), "activities": len(activity_ids)}
+
+# Incremental checks on ORM writes
+
+def _changed(target, attributes) -> bool:
+    state = inspect(target)
+    return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+@event.listens_for(Contact, "after_insert")
+def _contact_inserted(mapper, connection, target):
+    check_contacts(connection, [target.id], new=True)
+
+@event.listens_for(Contact, "after_update")
+def _contact_updated(mapper, connection, target):
+    if _changed(target, MATCH_COLUMNS):
+        check_contacts(connection, [target.id])
+
+@event.listens_for(Contact, "after_delete")
+def _contact_deleted(mapper, connection, target):
+    _forget(connection, [target.id], dismissed=True)
@@ -0,0 +1,204 @@
+"""Push channel for live pipeline boards.
+
+Session hooks record every deal create, move, update and delete at flush time
+and publish them as small diffs once the transaction commits (nothing is sent
+for rolled-back work). Diffs go to the owner's channel, ``deals:<user_id>``.
+Connected boards stream that channel over Server-Sent Events; see
+``GET /pipeline/events``.
+
+Delivery to subscribers is in-process. EVENTS_BACKEND picks how a published
+diff reaches the processes:
+
+- ``memory`` (default): a single process delivers to its own subscribers.
+- ``postgres``: sent with pg_notify and received by a LISTEN thread in every
+  worker, for multi-worker deployments.
+"""
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Optional
+from sqlalchemy import event, select as sql_select, inspect
+from sqlalchemy.orm import Session
+from app.database import engine
+from app.models import Deal, Contact
+
+logger = logging.getLogger(__name__)
+
+EVENTS_BACKEND = os.environ.get("EVENTS_BACKEND", "memory")
+SUBSCRIBER_QUEUE_SIZE = 100
+PG_CHANNEL = "crm_events"
+
+class Broker:
+    """Fans events out to the asyncio subscribers of this process."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[channel].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[channel].discard(queue)
+            if not self._subscribers[channel]:
+                del self._subscribers[channel]
+
+    def dispatch(self, channel: str, payload: dict):
+        """Thread-safe: hand an event to this process's subscribers."""
+        if self._loop is None or channel not in self._subscribers:
+            return
+        self._loop.call_soon_threadsafe(self._fan_out, channel, payload)
+
+    def _fan_out(self, channel: str, payload: dict):
+        for queue in list(self._subscribers.get(channel, ())):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # A stalled client: end its stream (None) so it reconnects and reloads the board
+                self._subscribers[channel].discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    def subscriber_count(self, channel: str = None) -> int:
+        if channel:
+            return len(self._subscribers.get(channel, ()))
+        return sum(len(queues) for queues in self._subscribers.values())
+
+broker = Broker()
+
+class MemoryBackend:
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def publish(self, channel: str, payload: dict):
+        broker.dispatch(channel, payload)
+
+class PostgresBackend:
+    """pg_notify on publish; a LISTEN thread per process feeds the local broker."""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="crm-events-listen", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def publish(self, channel: str, payload: dict):
+        message = json.dumps({"channel": channel, "payload": payload}, separators=(",", ":"))
+        with engine.begin() as connection:
+            connection.exec_driver_sql("SELECT pg_notify(%s, %s)", (PG_CHANNEL, message))
+
+    def _listen(self):
+        while not self._stop.is_set():
+            try:
+                connection = engine.raw_connection()
+                try:
+                    dbapi_connection = connection.driver_connection
+                    dbapi_connection.autocommit = True
+                    dbapi_connection.cursor().execute(f"LISTEN {PG_CHANNEL}")
+                    while not self._stop.is_set():
+                        if select.select([dbapi_connection], [], [], 1.0) == ([], [], []):
+                            continue
+                        dbapi_connection.poll()
+                        while dbapi_connection.notifies:
+                            message = json.loads(dbapi_connection.notifies.pop(0).payload)
+                            broker.dispatch(message["channel"], message["payload"])
+                finally:
+                    connection.invalidate()
+            except Exception:
+                logger.exception("event listener failed, reconnecting")
+                self._stop.wait(2)
+
+BACKENDS = {"memory": MemoryBackend, "postgres": PostgresBackend}
+backend = BACKENDS[EVENTS_BACKEND]()
+
+async def start():
+    broker.bind(asyncio.get_running_loop())
+    backend.start()
+
+async def stop():
+    backend.stop()
+
+def publish(channel: str, payload: dict):
+    try:
+        backend.publish(channel, payload)
+    except Exception:
+        # Live updates are best effort; the write itself has already committed
+        logger.exception("failed to publish %s event", channel)
+
+def subscribe(channel: str):
+    return broker.subscribe(channel)
+
+def deals_channel(user_id: str) -> str:
+    return f"deals:{user_id}"
+
+# Deal diffs
+
+def _deal_payload(session: Session, deal: Deal, change: str, from_stage: str = None) -> dict:
+    payload = {"type": change, "id": deal.id, "stage": deal.stage, "from_stage": from_stage}
+    if change == "deleted":
+        return payload
+    contact = session.identity_map.get(inspect(Contact).identity_key_from_primary_key((deal.contact_id,)))
+    if contact is not None:
+        contact_name = contact.name
+    else:
+        contact_name = session.connection().execute(
+            sql_select(Contact.name).where(Contact.id == deal.contact_id)
+        ).scalar()
+    payload.update({
+        "title": deal.title,
+        "value": deal.value,
+        "probability": deal.probability,
+        "expected_close": deal.expected_close.isoformat() if deal.expected_close else None,
+        "contact_name": contact_name
+    })
+    return payload
+
+@event.listens_for(Session, "after_flush")
+def _collect_deal_changes(session, flush_context):
+    pending = []
+    for obj in session.new:
+        if isinstance(obj, Deal):
+            pending.append((obj.user_id, _deal_payload(session, obj, "created")))
+    for obj in session.dirty:
+        if isinstance(obj, Deal) and session.is_modified(obj, include_collections=False):
+            history = inspect(obj).attrs.stage.history
+            if history.has_changes() and history.deleted:
+                pending.append((obj.user_id, _deal_payload(session, obj, "moved", history.deleted[0])))
+            else:
+                pending.append((obj.user_id, _deal_payload(session, obj, "updated")))
+    for obj in session.deleted:
+        if isinstance(obj, Deal):
+            pending.append((obj.user_id, _deal_payload(session, obj, "deleted")))
+    if pending:
+        session.info.setdefault("deal_events", []).extend(pending)
+
+@event.listens_for(Session, "after_commit")
+def _publish_deal_changes(session):
+    for user_id, payload in session.info.pop("deal_events", []):
+        publish(deals_channel(user_id), payload)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_deal_changes(session):
+    session.info.pop("deal_events", None)
@@ -0,0 +1,187 @@
+"""Streaming export of contacts, deals and activities as CSV, JSON Lines or Parquet.
+
+Rows are read from a server-side cursor in fixed-size partitions and encoded
+partition by partition, so memory use does not grow with the table. Parquet
+needs the optional ``pyarrow`` package.
+"""
+import csv
+import inspect
+import io
+import json
+import zlib
+from datetime import date, datetime
+from typing import Iterator
+from sqlalchemy import select, Integer, Float, Boolean, Date, DateTime
+from app.database import ReadSessionLocal
+from app.models import Contact, Deal, Activity
+from app.tenancy import scope_session
+
+CHUNK_ROWS = 2000
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet")
+}
+
+class ExportError(ValueError):
+    pass
+
+def _filter_contacts(query, status=None, source=None, assigned_to=None, q=None):
+    from app.routes.contacts import filter_contacts
+    return filter_contacts(query, status=status, source=source, assigned_to=assigned_to, q=q)
+
+def _filter_deals(query, stage=None, contact_id=None):
+    if stage:
+        query = query.where(Deal.stage == stage)
+    if contact_id:
+        query = query.where(Deal.contact_id == contact_id)
+    return query
+
+def _filter_activities(query, type=None, completed=None, contact_id=None, deal_id=None):
+    if type:
+        query = query.where(Activity.type == type)
+    if completed is not None:
+        query = query.where(Activity.completed == completed)
+    if contact_id:
+        query = query.where(Activity.contact_id == contact_id)
+    if deal_id:
+        query = query.where(Activity.deal_id == deal_id)
+    return query
+
+# entity -> (model, filter function)
+ENTITIES = {
+    "contacts": (Contact, _filter_contacts),
+    "deals": (Deal, _filter_deals),
+    "activities": (Activity, _filter_activities)
+}
+
+def export_query(entity: str, **filters):
+    """Select every column of the entity's table, filtered like its list view, in id order."""
+    if entity not in ENTITIES:
+        raise ExportError(f"Unknown export: {entity}")
+    model, apply_filters = ENTITIES[entity]
+    filters = {k: v for k, v in filters.items() if v is not None and v != ""}
+    unknown = set(filters) - set(inspect.signature(apply_filters).parameters)
+    if unknown:
+        raise ExportError(f"{entity} cannot be filtered by {', '.join(sorted(unknown))}")
+    columns = [getattr(model, column.key) for column in model.__table__.columns]
+    return apply_filters(select(*columns), **filters).order_by(model.id)
+
+def _partitions(query, chunk_rows: int, user_id: str = None):
+    # A session rather than a bare connection so app.tenancy scopes the export to its owner;
+    # bulk reads go to the replica when one is configured
+    with ReadSessionLocal() as db:
+        if user_id is not None:
+            scope_session(db, user_id)
+        result = db.execute(query, execution_options={"yield_per": chunk_rows})
+        for rows in result.partitions():
+            yield rows
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+def _encode_csv(columns, partitions) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in partitions:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def _encode_jsonl(columns, partitions) -> Iterator[bytes]:
+    for rows in partitions:
+        yield "".join(
+            json.dumps({c: _iso(v) for c, v in zip(columns, row)}, separators=(",", ":")) + "\n" for row in rows
+        ).encode("utf-8")
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+def _arrow_type(pa, column):
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us", tz="UTC")
+    if isinstance(column.type, Date):
+        return pa.date32()
+    return pa.string()
+
+def _encode_parquet(table, partitions) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([(c.name, _arrow_type(pa, c)) for c in table.columns])
+    sink = _Sink()
+    # One row group per partition keeps the writer's buffer at a single chunk
+    with pq.ParquetWriter(sink, schema, compression="snappy") as writer:
+        for rows in partitions:
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(schema)], schema=schema
+            ))
+            yield sink.drain()
+    yield sink.drain()
+
+def _gzip(chunks) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def check_format(fmt: str):
+    if fmt not in FORMATS:
+        raise ExportError(f"Unsupported format: {fmt}, expected one of {', '.join(FORMATS)}")
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ExportError("Parquet export needs the pyarrow package")
+
+def export_rows(entity: str, fmt: str = "csv", gzip: bool = False, chunk_rows: int = CHUNK_ROWS,
+                user_id: str = None, **filters) -> Iterator[bytes]:
+    """Encoded export as a stream of byte chunks. Validates arguments before the first read."""
+    check_format(fmt)
+    query = export_query(entity, **filters)
+    table = ENTITIES[entity][0].__table__
+    partitions = _partitions(query, chunk_rows, user_id)
+    if fmt == "csv":
+        chunks = _encode_csv([c.name for c in table.columns], partitions)
+    elif fmt == "jsonl":
+        chunks = _encode_jsonl([c.name for c in table.columns], partitions)
+    else:
+        chunks = _encode_parquet(table, partitions)
+    return _gzip(chunks) if gzip else chunks
+
+def export_filename(entity: str, fmt: str, gzip: bool = False) -> str:
+    return f"{entity}.{FORMATS[fmt][1]}" + (".gz" if gzip else "")
+
+def export_media_type(fmt: str, gzip: bool = False) -> str:
+    return "application/gzip" if gzip else FORMATS[fmt][0]
@@ -0,0 +1,120 @@
+"""Gemini access for company intel.
+
+Calls go through the SDK's async client (``client.aio``) so a slow generation
+never blocks the event loop that is serving other requests.
+
+Set GEMINI_BACKEND=fake to use a local stand-in that needs no API key or
+network: it waits GEMINI_FAKE_LATENCY seconds, fails with probability
+GEMINI_FAKE_FAILURE_RATE, and otherwise returns a canned report.
+
+``stream`` yields the report as the model produces it; the fake backend
+spreads its latency over the words of the canned report. Closing the
+generator (e.g. when the browser goes away) closes the upstream request.
+
+Every call's latency and token usage go to app.metrics; the fake backend
+reports word counts as tokens.
+
+The google-genai SDK is imported on the first real call, not at import time,
+so workers (and the fake backend) start without paying for it.
+"""
+import asyncio
+import os
+import random
+import time
+from contextlib import aclosing
+from typing import AsyncIterator
+from app import metrics
+
+BACKEND = os.environ.get("GEMINI_BACKEND", "google")
+MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash") if BACKEND != "fake" else "fake-gemini"
+FAKE_LATENCY = float(os.environ.get("GEMINI_FAKE_LATENCY", "1.0"))
+FAKE_FAILURE_RATE = float(os.environ.get("GEMINI_FAKE_FAILURE_RATE", "0"))
+
+_client = None
+
+class GeminiNotConfigured(Exception):
+    pass
+
+def get_client():
+    global _client
+    if _client is None:
+        api_key = os.environ.get("GOOGLE_API_KEY")
+        if not api_key:
+            raise GeminiNotConfigured("Google API Key not set")
+        from google import genai
+        _client = genai.Client(api_key=api_key)
+    return _client
+
+ANALYSIS_TYPES = ("swot", "competitor", "market")
+
+def analysis_prompt(company_name: str, analysis_type: str) -> str:
+    return f"Analyze the company '{company_name}' using a {analysis_type.upper()} analysis. Provide a structured and detailed report."
+
+def _fake_report(prompt: str) -> str:
+    return (
+        f"[{MODEL}] Report generated offline.\n\n"
+        f"PROMPT: {prompt}\n\n"
+        "STRENGTHS: Established customer base. WEAKNESSES: Limited international presence. "
+        "OPPORTUNITIES: Adjacent markets. THREATS: New entrants competing on price."
+    )
+
+async def _fake_generate(prompt: str) -> str:
+    await asyncio.sleep(FAKE_LATENCY)
+    if random.random() < FAKE_FAILURE_RATE:
+        raise RuntimeError("Fake Gemini backend: simulated upstream error")
+    return _fake_report(prompt)
+
+async def _fake_stream(prompt: str) -> AsyncIterator[str]:
+    words = _fake_report(prompt).split(" ")
+    fail_at = random.randrange(len(words)) if random.random() < FAKE_FAILURE_RATE else None
+    for i, word in enumerate(words):
+        await asyncio.sleep(FAKE_LATENCY / len(words))
+        if i == fail_at:
+            raise RuntimeError("Fake Gemini backend: simulated upstream error")
+        yield word if i == 0 else " " + word
+
+async def generate(prompt: str) -> str:
+    start = time.perf_counter()
+    try:
+        if BACKEND == "fake":
+            text = await _fake_generate(prompt)
+            prompt_tokens, output_tokens = len(prompt.split()), len(text.split())
+        else:
+            response = await get_client().aio.models.generate_content(model=MODEL, contents=prompt)
+            text = response.text
+            usage = response.usage_metadata
+            prompt_tokens = usage.prompt_token_count if usage else None
+            output_tokens = usage.candidates_token_count if usage else None
+    except Exception:
+        metrics.observe_gemini(MODEL, time.perf_counter() - start, "error")
+        raise
+    metrics.observe_gemini(MODEL, time.perf_counter() - start, "ok", prompt_tokens, output_tokens)
+    return text
+
+async def stream(prompt: str) -> AsyncIterator[str]:
+    """Text chunks of the generation as they arrive."""
+    start = time.perf_counter()
+    prompt_tokens = output_tokens = None
+    outcome = "error"
+    try:
+        if BACKEND == "fake":
+            words = 0
+            async for chunk in _fake_stream(prompt):
+                words += len(chunk.split())
+                yield chunk
+            prompt_tokens, output_tokens = len(prompt.split()), words
+        else:
+            chunks = await get_client().aio.models.generate_content_stream(model=MODEL, contents=prompt)
+            async with aclosing(chunks):
+                async for chunk in chunks:
+                    usage = chunk.usage_metadata
+                    if usage:
+                        prompt_tokens, output_tokens = usage.prompt_token_count, usage.candidates_token_count
+                    if chunk.text:
+                        yield chunk.text
+        outcome = "ok"
+    except (asyncio.CancelledError, GeneratorExit):
+        outcome = "cancelled"
+        raise
+    finally:
+        metrics.observe_gemini(MODEL, time.perf_counter() - start, outcome, prompt_tokens, output_tokens)
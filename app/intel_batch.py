@@ -0,0 +1,293 @@
+"""Company intel for a whole contact book.
+
+``create_run`` collects the distinct companies of an owner's contacts (one
+GROUP BY on the owner + lower(company) index) and stores one IntelBatchItem
+per company. ``run_batch`` then works through the pending items with
+BATCH_CONCURRENCY workers, each taking a token from a bucket refilled at
+BATCH_RATE generations per second (burst BATCH_BURST) before calling Gemini.
+Companies with a report fresher than INTEL_CACHE_TTL_SECONDS (app.intel_cache)
+are marked skipped instead.
+
+Item statuses are the checkpoint: each finished item is written as it
+completes, so a run that was interrupted (the process crashed or was stopped)
+is resumed by calling ``run_batch`` again, which only picks up pending items
+and re-checks them for fresh reports. A report saved just before a crash is
+therefore not generated twice. While it runs, the run's ``updated_at`` is a
+heartbeat; a "running" run without one for STALE_SECONDS may be claimed by
+another process.
+
+    python -m app.cli intel-batch --user-id <owner> --analysis-type swot
+    python -m app.cli intel-batch --resume <run id>
+
+With GEMINI_BACKEND=fake (see app.gemini) runs need no API key or network.
+"""
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+from sqlalchemy import func, insert, or_, select, update
+from starlette.concurrency import run_in_threadpool
+from app import gemini, intel_cache
+from app.database import engine
+from app.jobs import save_intel, MAX_ATTEMPTS, RETRY_BACKOFF
+from app.models import CompanyIntel, Contact, IntelBatchItem, IntelBatchRun
+
+BATCH_CONCURRENCY = int(os.environ.get("INTEL_BATCH_CONCURRENCY", "4"))
+BATCH_RATE = float(os.environ.get("INTEL_BATCH_RATE", "1.0"))
+BATCH_BURST = int(os.environ.get("INTEL_BATCH_BURST", "4"))
+STALE_SECONDS = 300
+INSERT_BATCH = 1000
+
+_items = IntelBatchItem.__table__
+_runs = IntelBatchRun.__table__
+
+class RunNotFound(Exception):
+    pass
+
+class RunBusy(Exception):
+    pass
+
+class TokenBucket:
+    """``rate`` tokens per second, at most ``capacity`` saved up."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+@dataclass
+class BatchProgress:
+    run_id: int
+    status: str
+    total: int = 0
+    pending: int = 0
+    done: int = 0
+    skipped: int = 0
+    failed: int = 0
+    # Generations finished by this process, for throughput
+    generated: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    @property
+    def per_minute(self) -> float:
+        return self.generated / self.elapsed * 60 if self.elapsed else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "run_id": self.run_id, "status": self.status, "total": self.total, "pending": self.pending,
+            "done": self.done, "skipped": self.skipped, "failed": self.failed
+        }
+
+def distinct_companies(connection, user_id: str) -> list:
+    """Display names of the owner's companies, one per case-insensitive name."""
+    rows = connection.execute(
+        select(func.min(Contact.company))
+        .where(Contact.user_id == user_id, Contact.company.is_not(None))
+        .group_by(func.lower(Contact.company))
+    ).scalars()
+    companies = {}
+    for company in rows:
+        name = intel_cache.normalize_company(company)
+        if name:
+            companies.setdefault(name.lower(), name)
+    return sorted(companies.values(), key=str.lower)
+
+def create_run(user_id: str, analysis_type: str, requested_by: str = None) -> int:
+    if analysis_type.lower() not in gemini.ANALYSIS_TYPES:
+        raise ValueError(f"Unknown analysis type: {analysis_type}")
+    with engine.begin() as connection:
+        run_id = connection.execute(insert(_runs).values(
+            user_id=str(user_id), analysis_type=analysis_type.lower(), status="pending", requested_by=requested_by
+        )).inserted_primary_key[0]
+        companies = distinct_companies(connection, str(user_id))
+        for start in range(0, len(companies), INSERT_BATCH):
+            connection.execute(insert(_items), [
+                {"run_id": run_id, "company_name": company, "status": "pending", "attempts": 0}
+                for company in companies[start:start + INSERT_BATCH]
+            ])
+    return run_id
+
+def progress(run_id: int, user_id: str = None) -> BatchProgress:
+    """Counts per item status; with user_id, only if the run belongs to that owner."""
+    with engine.connect() as connection:
+        query = select(_runs.c.status).where(_runs.c.id == run_id)
+        if user_id is not None:
+            query = query.where(_runs.c.user_id == str(user_id))
+        status = connection.execute(query).scalar()
+        if status is None:
+            raise RunNotFound(f"Batch run {run_id} not found")
+        report = BatchProgress(run_id=run_id, status=status)
+        for item_status, count in connection.execute(
+            select(_items.c.status, func.count()).where(_items.c.run_id == run_id).group_by(_items.c.status)
+        ):
+            setattr(report, item_status, count)
+    report.total = report.pending + report.done + report.skipped + report.failed
+    return report
+
+def _claim(run_id: int) -> tuple:
+    """Mark the run running unless another live process has it. Returns (user_id, analysis_type, requested_by)."""
+    stale = datetime.now(timezone.utc) - timedelta(seconds=STALE_SECONDS)
+    with engine.begin() as connection:
+        run = connection.execute(select(_runs).where(_runs.c.id == run_id)).first()
+        if run is None:
+            raise RunNotFound(f"Batch run {run_id} not found")
+        claimed = connection.execute(
+            update(_runs)
+            .where(_runs.c.id == run_id, or_(_runs.c.status != "running", _runs.c.updated_at < stale))
+            .values(status="running", updated_at=func.now(), finished_at=None)
+        ).rowcount
+        if not claimed:
+            raise RunBusy(f"Batch run {run_id} is already running")
+        # Failed items get another go on resume
+        connection.execute(update(_items).where(_items.c.run_id == run_id, _items.c.status == "failed")
+                           .values(status="pending", attempts=0))
+    return run.user_id, run.analysis_type, run.requested_by
+
+def _skip_fresh(run_id: int, user_id: str, analysis_type: str) -> int:
+    """Mark pending items whose company already has a fresh report as skipped."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=intel_cache.TTL_SECONDS)
+    with engine.begin() as connection:
+        fresh = {
+            name.lower(): intel_id for name, intel_id in connection.execute(
+                select(func.lower(CompanyIntel.company_name), func.max(CompanyIntel.id))
+                .where(CompanyIntel.user_id == user_id, CompanyIntel.analysis_type == analysis_type,
+                       CompanyIntel.model_used == gemini.MODEL, CompanyIntel.generated_at >= cutoff)
+                .group_by(func.lower(CompanyIntel.company_name))
+            )
+        } if intel_cache.TTL_SECONDS > 0 else {}
+        pending = connection.execute(
+            select(_items.c.company_name).where(_items.c.run_id == run_id, _items.c.status == "pending")
+        ).scalars().all()
+        skipped = [(company, fresh[company.lower()]) for company in pending if company.lower() in fresh]
+        for company, intel_id in skipped:
+            connection.execute(update(_items).where(_items.c.run_id == run_id, _items.c.company_name == company)
+                               .values(status="skipped", intel_id=intel_id))
+    return len(skipped)
+
+def _checkpoint(run_id: int, company: str, **values):
+    with engine.begin() as connection:
+        connection.execute(update(_items).where(_items.c.run_id == run_id, _items.c.company_name == company)
+                           .values(**values))
+        connection.execute(update(_runs).where(_runs.c.id == run_id).values(updated_at=func.now()))
+
+def _finish(run_id: int):
+    with engine.begin() as connection:
+        connection.execute(update(_runs).where(_runs.c.id == run_id)
+                           .values(status="done", finished_at=func.now(), updated_at=func.now()))
+
+def _release(run_id: int):
+    # Stopped before the end: leave it resumable right away instead of after STALE_SECONDS
+    with engine.begin() as connection:
+        connection.execute(update(_runs).where(_runs.c.id == run_id, _runs.c.status == "running")
+                           .values(status="pending"))
+
+def _pending_companies(run_id: int) -> list:
+    with engine.connect() as connection:
+        return connection.execute(
+            select(_items.c.company_name).where(_items.c.run_id == run_id, _items.c.status == "pending")
+            .order_by(_items.c.company_name)
+        ).scalars().all()
+
+async def run_batch(run_id: int, concurrency: int = BATCH_CONCURRENCY, rate: float = BATCH_RATE,
+                    burst: int = BATCH_BURST,
+                    on_progress: Optional[Callable[[BatchProgress], None]] = None) -> BatchProgress:
+    """Generate the run's pending items; also resumes an interrupted run."""
+    user_id, analysis_type, requested_by = await run_in_threadpool(_claim, run_id)
+    try:
+        await run_in_threadpool(_skip_fresh, run_id, user_id, analysis_type)
+        report = await run_in_threadpool(progress, run_id)
+        report.started_at = time.perf_counter()
+        if on_progress:
+            on_progress(report)
+        pending = await run_in_threadpool(_pending_companies, run_id)
+        queue = asyncio.Queue()
+        for company in pending:
+            queue.put_nowait(company)
+        bucket = TokenBucket(rate, burst)
+
+        async def generate(company: str):
+            prompt = gemini.analysis_prompt(company, analysis_type)
+            attempts = 0
+            while True:
+                attempts += 1
+                await bucket.acquire()
+                try:
+                    content = await gemini.generate(prompt)
+                    intel_id = await run_in_threadpool(save_intel, user_id, company, analysis_type, requested_by, content)
+                    await run_in_threadpool(_checkpoint, run_id, company, status="done", attempts=attempts,
+                                            intel_id=intel_id, error=None)
+                    return "done"
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if isinstance(e, gemini.GeminiNotConfigured) or attempts >= MAX_ATTEMPTS:
+                        await run_in_threadpool(_checkpoint, run_id, company, status="failed", attempts=attempts,
+                                                error=str(e)[:500])
+                        return "failed"
+                    delay = RETRY_BACKOFF * (2 ** (attempts - 1))
+                    await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+        async def worker():
+            while not queue.empty():
+                company = queue.get_nowait()
+                outcome = await generate(company)
+                report.pending -= 1
+                setattr(report, outcome, getattr(report, outcome) + 1)
+                if outcome == "done":
+                    report.generated += 1
+                if on_progress:
+                    on_progress(report)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        await run_in_threadpool(_finish, run_id)
+        report.status = "done"
+        return report
+    except BaseException:
+        await asyncio.shield(run_in_threadpool(_release, run_id))
+        raise
+
+# Runs started through the API, per process
+_tasks = {}
+
+def start_in_background(run_id: int) -> bool:
+    """Run (or resume) a batch on the event loop. False if this process is already running it."""
+    task = _tasks.get(run_id)
+    if task and not task.done():
+        return False
+
+    async def run():
+        try:
+            await run_batch(run_id)
+        except RunBusy:
+            pass
+        finally:
+            _tasks.pop(run_id, None)
+
+    _tasks[run_id] = asyncio.create_task(run())
+    return True
+
+async def stop():
+    for task in list(_tasks.values()):
+        task.cancel()
+    await asyncio.gather(*_tasks.values(), return_exceptions=True)
+    _tasks.clear()
@@ -0,0 +1,45 @@
+"""Reuse of recent CompanyIntel reports.
+
+A report is addressed by (normalized company name, analysis type, model). If a
+row with that address was generated within INTEL_CACHE_TTL_SECONDS it is served
+instead of calling Gemini again; identical requests that miss while a
+generation is in flight are coalesced onto that job by the intel job queue.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import desc, func
+from sqlalchemy.orm import Session
+from app import gemini
+from app.models import CompanyIntel
+
+TTL_SECONDS = int(os.environ.get("INTEL_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+stats = {"hits": 0, "misses": 0, "coalesced": 0, "forced": 0}
+
+def normalize_company(company_name: str) -> str:
+    """Display form stored on CompanyIntel: surrounding and repeated whitespace removed."""
+    return " ".join(company_name.split())
+
+def cache_key(company_name: str, analysis_type: str, model: str = None) -> tuple:
+    return (normalize_company(company_name).lower(), analysis_type.lower(), model or gemini.MODEL)
+
+def fresh_query(db: Session, company_name: str, analysis_type: str, model: str = None, ttl_seconds: int = None):
+    company_key, analysis_type, model = cache_key(company_name, analysis_type, model)
+    ttl_seconds = TTL_SECONDS if ttl_seconds is None else ttl_seconds
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl_seconds)
+    return db.query(CompanyIntel).filter(
+        func.lower(CompanyIntel.company_name) == company_key,
+        CompanyIntel.analysis_type == analysis_type,
+        CompanyIntel.model_used == model,
+        CompanyIntel.generated_at >= cutoff
+    ).order_by(desc(CompanyIntel.generated_at))
+
+def find_fresh(db: Session, company_name: str, analysis_type: str, model: str = None, ttl_seconds: int = None) -> Optional[CompanyIntel]:
+    if (TTL_SECONDS if ttl_seconds is None else ttl_seconds) <= 0:
+        return None
+    return fresh_query(db, company_name, analysis_type, model, ttl_seconds).first()
+
+def snapshot() -> dict:
+    lookups = stats["hits"] + stats["misses"]
+    return dict(stats, hit_ratio=round(stats["hits"] / lookups, 4) if lookups else 0.0, ttl_seconds=TTL_SECONDS)
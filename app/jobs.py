@@ -0,0 +1,235 @@
+"""Background queue for company-intel generation.
+
+POST /api/intel/analyze only enqueues a job and returns its id; a fixed pool of
+asyncio workers calls Gemini with retry and exponential backoff, then writes
+the CompanyIntel row. A request for a company/analysis type that is already
+queued or running for the same owner returns the existing job instead of paying for a second
+generation. Jobs live in process memory, so each uvicorn worker has its own
+queue.
+
+Workers stream the report from Gemini into the job, so GET /api/intel/stream
+can ``follow`` a job and relay the text as it arrives. Every client asking for
+the same company/type follows the same job. A job started by the stream is
+cancelled, closing the Gemini stream, once its last follower disconnects; jobs
+that someone polls for (POST /api/intel/analyze) always run to the end.
+"""
+import asyncio
+import os
+import random
+import time
+import uuid
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from app import gemini, intel_cache
+from app.database import SessionLocal
+from app.models import CompanyIntel
+from app.tenancy import scope_session
+
+WORKERS = int(os.environ.get("INTEL_WORKERS", "4"))
+MAX_QUEUED = int(os.environ.get("INTEL_MAX_QUEUED", "100"))
+MAX_ATTEMPTS = int(os.environ.get("INTEL_MAX_ATTEMPTS", "3"))
+RETRY_BACKOFF = float(os.environ.get("INTEL_RETRY_BACKOFF", "2.0"))
+FINISHED_JOB_TTL = 3600
+
+ACTIVE_STATUSES = ("queued", "running", "retrying")
+
+class QueueFull(Exception):
+    pass
+
+@dataclass
+class IntelJob:
+    company_name: str
+    analysis_type: str
+    requested_by: str
+    user_id: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"
+    attempts: int = 0
+    intel_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    # Text of the current attempt so far; replaced by a new list when an attempt is retried
+    chunks: List[str] = field(default_factory=list, repr=False)
+    # False while only stream followers want the report: it is cancelled when the last one leaves
+    keep: bool = True
+    followers: int = 0
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, init=False, repr=False)
+    _task: Optional[asyncio.Task] = field(default=None, init=False, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def notify(self):
+        # Wake every follower; later waits use a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def cancel(self):
+        """Stop the job, closing its Gemini stream if it is running."""
+        if self.finished:
+            return
+        self.status = "cancelled"
+        self.error = "Cancelled: nobody is waiting for the report"
+        self.finished_at = time.time()
+        if self._task:
+            self._task.cancel()
+        self.notify()
+
+    async def follow(self) -> AsyncIterator[Tuple[str, Optional[str]]]:
+        """Yield ("chunk", text) as the report is written and ("reset", None) when an attempt is retried,
+        until the job finishes."""
+        self.followers += 1
+        try:
+            chunks, sent = self.chunks, 0
+            while True:
+                changed = self._changed
+                if chunks is not self.chunks:
+                    chunks, sent = self.chunks, 0
+                    yield "reset", None
+                while sent < len(chunks):
+                    sent += 1
+                    yield "chunk", chunks[sent - 1]
+                if self.finished:
+                    return
+                await changed.wait()
+        finally:
+            self.followers -= 1
+            if not self.followers and not self.keep:
+                self.cancel()
+
+    @property
+    def key(self):
+        return (self.user_id,) + intel_cache.cache_key(self.company_name, self.analysis_type)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "company_name": self.company_name,
+            "analysis_type": self.analysis_type,
+            "attempts": self.attempts,
+            "intel_id": self.intel_id,
+            "error": self.error
+        }
+
+def save_intel(user_id: str, company_name: str, analysis_type: str, requested_by: str, content: str) -> int:
+    db = scope_session(SessionLocal(), user_id)
+    try:
+        intel = CompanyIntel(
+            company_name=intel_cache.normalize_company(company_name),
+            analysis_type=analysis_type.lower(),
+            content=content,
+            model_used=gemini.MODEL,
+            requested_by=requested_by
+        )
+        db.add(intel)
+        db.commit()
+        return intel.id
+    finally:
+        db.close()
+
+class IntelJobQueue:
+    def __init__(self, workers: int = WORKERS, max_queued: int = MAX_QUEUED):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.jobs: Dict[str, IntelJob] = {}
+        self._active: Dict[tuple, IntelJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, company_name: str, analysis_type: str, requested_by: str, user_id: str, followed: bool = False):
+        """Queue a generation, or return the owner's job already handling the same company/type.
+
+        ``followed`` jobs are only wanted by their stream followers (see IntelJob.follow).
+        Returns (job, created).
+        """
+        job = IntelJob(company_name=company_name, analysis_type=analysis_type, requested_by=requested_by,
+                       user_id=str(user_id), keep=not followed)
+        existing = self._active.get(job.key)
+        if existing and not existing.finished:
+            existing.keep = existing.keep or not followed
+            return existing, False
+        if self._queue is None:
+            raise RuntimeError("Intel job queue is not running")
+        if self._queue.qsize() >= self.max_queued:
+            raise QueueFull("Too many analyses queued, try again shortly")
+        self._prune()
+        self.jobs[job.id] = job
+        self._active[job.key] = job
+        self._queue.put_nowait(job)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[IntelJob]:
+        return self.jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_JOB_TTL
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at and job.finished_at < cutoff:
+                del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                # Skipped if every follower left while it was queued
+                if not job.finished:
+                    # Its own task, so cancelling the job leaves the worker running
+                    job._task = asyncio.create_task(self._run(job))
+                    await asyncio.wait([job._task])
+            finally:
+                if job._task:
+                    job._task.cancel()
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+                self._queue.task_done()
+
+    async def _run(self, job: IntelJob):
+        prompt = gemini.analysis_prompt(job.company_name, job.analysis_type)
+        while True:
+            job.attempts += 1
+            job.status = "running"
+            if job.chunks:
+                job.chunks = []
+            job.notify()
+            try:
+                async with aclosing(gemini.stream(prompt)) as chunks:
+                    async for text in chunks:
+                        job.chunks.append(text)
+                        job.notify()
+                job.intel_id = await run_in_threadpool(
+                    save_intel, job.user_id, job.company_name, job.analysis_type, job.requested_by, "".join(job.chunks)
+                )
+                job.status = "done"
+                job.error = None
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.error = str(e)[:500]
+                if isinstance(e, gemini.GeminiNotConfigured) or job.attempts >= MAX_ATTEMPTS:
+                    job.status = "failed"
+                    break
+                job.status = "retrying"
+                job.notify()
+                # Exponential backoff with jitter so retries from several workers spread out
+                delay = RETRY_BACKOFF * (2 ** (job.attempts - 1))
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+        job.finished_at = time.time()
+        job.notify()
+
+intel_jobs = IntelJobQueue()
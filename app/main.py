@@ -1,32 +1,38 @@
-from fastapi import FastAPI, Depends, Request
+import os
+import anyio
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
-from app.database import engine, Base, get_db, SessionLocal
+from fastapi.responses import RedirectResponse, Response
+from app.database import engine, read_engine, pin_reads_after_write
 import app.routes as routes_module
-from app.routes import dashboard, contacts, pipeline, activities, intel, billing
-from app.seed import seed_crm_data
-# Start imports for viv-auth and viv-pay
-from viv_auth import init_auth
-from viv_pay import init_pay
+from app.routes import dashboard, contacts, pipeline, activities, intel, billing, search, export, forecast, analytics
+from app.bootstrap import init_vendors, on_startup
+from app.jobs import intel_jobs
+from app import auth_cache, events, intel_batch, forecast as forecast_model, intel_cache, metrics, page_cache
 
 app = FastAPI(title="CRM Pro")
 
+# Route handlers that use the synchronous SQLAlchemy session are plain `def`
+# functions, which FastAPI runs on this threadpool instead of the event loop.
+THREADPOOL_SIZE = int(os.environ.get("THREADPOOL_SIZE", "40"))
+
 # Health check (must be first)
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
-# Initialize Auth
-User, require_auth = init_auth(app, engine, Base, get_db, app_name="CRM Pro")
+# Initialize Auth and Pay (app.bootstrap, which also needs their models for `app.cli init`)
+User, require_auth, create_checkout, get_customer, require_subscription = init_vendors(app)
 
-# Initialize Pay
-create_checkout, get_customer, require_subscription = init_pay(app, engine, Base, get_db, app_name="CRM Pro")
+# Resolved users and subscriptions are reused per session for a few seconds (see app.auth_cache)
+async def current_user(request: Request):
+    return await auth_cache.cached_user(request, require_auth)
 
 # Wrapper: chain auth -> subscription check so require_subscription gets user_id
 # viv-auth uses encrypted session cookie (viv_session), not a user_id cookie,
 # so require_subscription can't find user_id on its own.
-async def require_active_subscription(request: Request, user=Depends(require_auth)):
-    return await require_subscription(request, user_id=user.id)
+async def require_active_subscription(request: Request, user=Depends(current_user)):
+    return await auth_cache.cached_subscription(request, lambda: require_subscription(request, user_id=user.id))
 
 # Inject dependencies into routes module
 routes_module.User = User
@@ -36,9 +42,32 @@ routes_module.create_checkout = create_checkout
 routes_module.get_customer = get_customer
 
 # Override dependency getters
-app.dependency_overrides[routes_module.get_current_user] = require_auth
+app.dependency_overrides[routes_module.get_current_user] = current_user
 app.dependency_overrides[routes_module.get_active_subscription] = require_active_subscription
 
+# Read-your-writes when GET handlers are served from a replica
+if read_engine is not engine:
+    app.middleware("http")(pin_reads_after_write)
+
+# Billing webhooks and logout drop cached sessions
+app.middleware("http")(auth_cache.clear_on_billing_change)
+
+# Request timing, SQL counts and Server-Timing; exported with cache counters at /metrics (needs METRICS_TOKEN)
+app.middleware("http")(metrics.record_request)
+metrics.register_collector("crm_page_cache", page_cache.snapshot)
+metrics.register_collector("crm_intel_cache", intel_cache.snapshot)
+metrics.register_collector("crm_forecast_cache", forecast_model.snapshot)
+metrics.register_collector("crm_auth_cache", auth_cache.snapshot)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(request: Request):
+    allowed = metrics.scrape_allowed(request)
+    if allowed is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not allowed:
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
@@ -48,18 +77,35 @@ app.include_router(contacts.router)
 app.include_router(pipeline.router)
 app.include_router(activities.router)
 app.include_router(intel.router)
+app.include_router(search.router)
+app.include_router(export.router)
+app.include_router(forecast.router)
+app.include_router(analytics.router)
 app.include_router(billing.router)
 
-# Startup event
+# Startup event: schema and seed data come from `python -m app.cli init` (see app.bootstrap)
 @app.on_event("startup")
 def startup_event():
-    # Ensure all tables are created
-    import app.models
-    Base.metadata.create_all(bind=engine)
-    
-    # Seed data
-    db = SessionLocal()
-    try:
-        seed_crm_data(db)
-    finally:
-        db.close()
+    on_startup()
+
+@app.on_event("startup")
+async def configure_threadpool():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+@app.on_event("startup")
+async def start_intel_workers():
+    await intel_jobs.start()
+
+@app.on_event("shutdown")
+async def stop_intel_workers():
+    await intel_jobs.stop()
+    # Interrupted batch runs stay resumable (POST /api/intel/batch/{id}/resume)
+    await intel_batch.stop()
+
+@app.on_event("startup")
+async def start_events():
+    await events.start()
+
+@app.on_event("shutdown")
+async def stop_events():
+    await events.stop()
@@ -0,0 +1,241 @@
+"""Request instrumentation and Prometheus metrics.
+
+``record_request`` (HTTP middleware) times every request and labels it with
+its route template. Within a request, SQL statements (engine events on the
+primary and read engines), template rendering (app.templating) and Gemini
+calls (app.gemini) add to a per-request tally held in a context variable,
+which also feeds:
+
+- a ``Server-Timing`` header (``app``, ``db``, ``tpl``, ``gemini`` and
+  ``auth`` durations, shown in the browser's network panel), and
+- a warning on the ``app.metrics`` logger for requests slower than
+  SLOW_REQUEST_MS, listing the slowest statements.
+
+``render`` returns every metric in the Prometheus text format for
+``GET /metrics``. For streamed responses (SSE, exports) the request time is
+the time to the first byte.
+
+The metrics name every route with its traffic and latency, and the app is
+public, so ``GET /metrics`` is off unless METRICS_TOKEN is set; the scraper
+then sends ``Authorization: Bearer <METRICS_TOKEN>`` (see ``scrape_allowed``).
+"""
+import hmac
+import logging
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional
+from fastapi import Request
+from sqlalchemy import event
+from app.database import engine, read_engine
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "500"))
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+SLOW_REQUEST_QUERIES = 5
+# Statements kept per request for the slow-request log
+MAX_RECORDED_STATEMENTS = 200
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+GEMINI_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name, self.help, self.label_names = name, help_text, labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names, self.buckets = name, help_text, labels, buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, count, total) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    le = f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {bucket_count}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {count}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total:g}")
+        return lines
+
+http_requests = Histogram("crm_http_request_duration_seconds", "Request latency by route", ("method", "route", "status"))
+http_request_statements = Histogram("crm_http_request_sql_statements", "SQL statements per request", ("route",), COUNT_BUCKETS)
+sql_statements = Counter("crm_sql_statements_total", "SQL statements executed", ("engine",))
+sql_seconds = Histogram("crm_sql_statement_duration_seconds", "SQL statement latency", ("engine",))
+template_seconds = Histogram("crm_template_render_seconds", "Jinja2 render time", ("template",))
+gemini_seconds = Histogram("crm_gemini_request_duration_seconds", "Gemini call latency", ("model", "outcome"), GEMINI_BUCKETS)
+gemini_tokens = Counter("crm_gemini_tokens_total", "Gemini tokens used", ("model", "kind"))
+auth_seconds = Histogram("crm_auth_resolve_duration_seconds", "Session user and subscription resolution time", ("outcome",))
+slow_requests = Counter("crm_slow_requests_total", "Requests slower than SLOW_REQUEST_MS", ("route",))
+
+METRICS = [http_requests, http_request_statements, sql_statements, sql_seconds, template_seconds,
+           gemini_seconds, gemini_tokens, auth_seconds, slow_requests]
+
+# Extra "name value" sources read at scrape time, e.g. cache hit counters
+_collectors = []
+
+def register_collector(prefix: str, snapshot: Callable[[], dict]):
+    """Export the numeric values of snapshot() as ``<prefix>_<key>`` gauges."""
+    _collectors.append((prefix, snapshot))
+
+def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for prefix, snapshot in _collectors:
+        for key, value in snapshot().items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{key}")
+                lines += [f"# TYPE {name} gauge", f"{name} {value:g}"]
+    return "\n".join(lines) + "\n"
+
+def scrape_allowed(request: Request) -> Optional[bool]:
+    """None when the endpoint is off (no METRICS_TOKEN), else whether the request carries the token."""
+    if not METRICS_TOKEN:
+        return None
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), METRICS_TOKEN.encode())
+
+# Per-request tally
+
+class RequestStats:
+    __slots__ = ("sql_count", "sql_seconds", "statements", "template_seconds", "gemini_seconds", "auth_seconds", "auth_outcome")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.statements = []
+        self.template_seconds = 0.0
+        self.gemini_seconds = 0.0
+        self.auth_seconds = 0.0
+        self.auth_outcome = None
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("crm_request_stats", default=None)
+
+def current() -> Optional[RequestStats]:
+    return _current.get()
+
+def _engine_label(conn) -> str:
+    return "read" if conn.engine is read_engine and read_engine is not engine else "primary"
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._crm_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._crm_started
+    label = _engine_label(conn)
+    sql_statements.inc(label)
+    sql_seconds.observe(elapsed, label)
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_seconds += elapsed
+        if len(stats.statements) < MAX_RECORDED_STATEMENTS:
+            stats.statements.append((elapsed, statement))
+
+for _engine in {engine, read_engine}:
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+
+def observe_template(name: str, seconds: float):
+    template_seconds.observe(seconds, name)
+    stats = _current.get()
+    if stats is not None:
+        stats.template_seconds += seconds
+
+def observe_gemini(model: str, seconds: float, outcome: str, prompt_tokens: int = None, output_tokens: int = None):
+    gemini_seconds.observe(seconds, model, outcome)
+    if prompt_tokens:
+        gemini_tokens.inc(model, "prompt", amount=prompt_tokens)
+    if output_tokens:
+        gemini_tokens.inc(model, "output", amount=output_tokens)
+    stats = _current.get()
+    if stats is not None:
+        stats.gemini_seconds += seconds
+
+def observe_auth(seconds: float, outcome: str):
+    auth_seconds.observe(seconds, outcome)
+    stats = _current.get()
+    if stats is not None:
+        stats.auth_seconds += seconds
+        # A miss on either lookup makes the request a miss
+        stats.auth_outcome = "miss" if "miss" in (stats.auth_outcome, outcome) else outcome
+
+def server_timing(total: float, stats: RequestStats) -> str:
+    parts = [f"app;dur={total * 1000:.1f}", f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.sql_count} queries"']
+    if stats.template_seconds:
+        parts.append(f"tpl;dur={stats.template_seconds * 1000:.1f}")
+    if stats.gemini_seconds:
+        parts.append(f"gemini;dur={stats.gemini_seconds * 1000:.1f}")
+    if stats.auth_outcome:
+        parts.append(f'auth;dur={stats.auth_seconds * 1000:.1f};desc="{stats.auth_outcome}"')
+    return ", ".join(parts)
+
+def _log_slow(request: Request, route: str, total: float, stats: RequestStats):
+    slow_requests.inc(route)
+    slowest = sorted(stats.statements, key=lambda s: s[0], reverse=True)[:SLOW_REQUEST_QUERIES]
+    logger.warning(
+        "slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, templates %.0f ms%s",
+        request.method, request.url.path, route, total * 1000, stats.sql_count, stats.sql_seconds * 1000,
+        stats.template_seconds * 1000,
+        "".join(f"\n    {elapsed * 1000:7.1f} ms  {' '.join(statement.split())[:500]}" for elapsed, statement in slowest)
+    )
+
+async def record_request(request: Request, call_next):
+    stats = RequestStats()
+    token = _current.set(stats)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+    total = time.perf_counter() - start
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    http_requests.observe(total, request.method, route, response.status_code)
+    http_request_statements.observe(stats.sql_count, route)
+    response.headers["Server-Timing"] = server_timing(total, stats)
+    if total * 1000 >= SLOW_REQUEST_MS:
+        _log_slow(request, route, total, stats)
+    return response
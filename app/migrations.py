@@ -0,0 +1,218 @@
+"""Schema migrations.
+
+``Base.metadata.create_all`` creates missing tables but never changes existing
+ones, so indexes and columns added later would never reach a database created
+by an older release. Each change is therefore also written here as a numbered
+step that runs once per database; applied versions are recorded in
+``schema_migrations``.
+
+A brand-new database gets the current schema from ``create_all`` and is
+stamped with the latest version without replaying the steps. Steps are written
+in plain SQL against the schema as it was at that point, not against the
+current models, so they keep working as the models change.
+
+Company intel reports whose owner cannot be worked out (step 3) are given the
+owner ORPHANED_INTEL_OWNER, so they are counted and can be reassigned with
+``UPDATE company_intel SET user_id = '<id>' WHERE user_id = 'unclaimed'``
+instead of silently disappearing behind tenant scoping.
+"""
+import logging
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, inspect, select, insert, update, text, cast, table, column
+from sqlalchemy.sql import func
+from app.database import Base
+
+logger = logging.getLogger(__name__)
+
+ORPHANED_INTEL_OWNER = "unclaimed"
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now())
+)
+
+MIGRATIONS = []
+
+def migration(version: int, description: str):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+def _execute_all(connection, statements):
+    for statement in statements:
+        connection.execute(text(statement))
+
+@migration(1, "Indexes for list filters, sorts and foreign keys")
+def _hot_column_indexes(connection):
+    _execute_all(connection, [
+        "CREATE INDEX IF NOT EXISTS ix_contacts_user_id ON contacts (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_contacts_status_id ON contacts (status, id)",
+        "CREATE INDEX IF NOT EXISTS ix_contacts_source_id ON contacts (source, id)",
+        "CREATE INDEX IF NOT EXISTS ix_contacts_assigned_to_id ON contacts (assigned_to, id)",
+        "CREATE INDEX IF NOT EXISTS ix_contacts_name_lower ON contacts (lower(name))",
+        "CREATE INDEX IF NOT EXISTS ix_contacts_email_lower ON contacts (lower(email))",
+        "CREATE INDEX IF NOT EXISTS ix_contacts_company_lower ON contacts (lower(company))",
+        "CREATE INDEX IF NOT EXISTS ix_deals_contact_id ON deals (contact_id)",
+        "CREATE INDEX IF NOT EXISTS ix_deals_stage_value ON deals (stage, value)",
+        "CREATE INDEX IF NOT EXISTS ix_activities_contact_id_date ON activities (contact_id, date)",
+        "CREATE INDEX IF NOT EXISTS ix_activities_deal_id ON activities (deal_id)",
+        "CREATE INDEX IF NOT EXISTS ix_activities_completed_date ON activities (completed, date)",
+        "CREATE INDEX IF NOT EXISTS ix_activities_created_at ON activities (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_company_intel_generated_at ON company_intel (generated_at)",
+        "CREATE INDEX IF NOT EXISTS ix_company_intel_lookup ON company_intel (lower(company_name), analysis_type, generated_at)",
+    ])
+
+@migration(2, "Owner + normalized email index for import deduplication")
+def _owner_email_index(connection):
+    # Leads with user_id, so it also replaces the single-column owner index
+    _execute_all(connection, [
+        "CREATE INDEX IF NOT EXISTS ix_contacts_user_id_email_lower ON contacts (user_id, lower(email))",
+        "DROP INDEX IF EXISTS ix_contacts_user_id",
+    ])
+
+def _intel_owners(connection):
+    # requested_by is the requester's email: take the owner from viv-auth's user with that email
+    from app.bootstrap import register_vendor_models
+    users = register_vendor_models().__table__
+    intel = table("company_intel", column("user_id"), column("requested_by"))
+    if inspect(connection).has_table(users.name):
+        owner = (
+            select(cast(users.c.id, String))
+            .where(func.lower(users.c.email) == func.lower(intel.c.requested_by))
+            .limit(1).scalar_subquery()
+        )
+        connection.execute(update(intel).where(intel.c.user_id.is_(None)).values(user_id=owner))
+    orphaned = connection.execute(select(func.count()).select_from(intel).where(intel.c.user_id.is_(None))).scalar()
+    if orphaned:
+        connection.execute(update(intel).where(intel.c.user_id.is_(None)).values(user_id=ORPHANED_INTEL_OWNER))
+        logger.warning("%d company intel reports match no user; their owner is now '%s'", orphaned, ORPHANED_INTEL_OWNER)
+
+@migration(3, "Owner column on deals, activities and intel; owner-leading indexes")
+def _tenant_ownership(connection):
+    _execute_all(connection, [
+        "ALTER TABLE deals ADD COLUMN user_id VARCHAR",
+        "ALTER TABLE activities ADD COLUMN user_id VARCHAR",
+        "ALTER TABLE company_intel ADD COLUMN user_id VARCHAR",
+        "UPDATE deals SET user_id = (SELECT contacts.user_id FROM contacts WHERE contacts.id = deals.contact_id)",
+        "UPDATE activities SET user_id = (SELECT contacts.user_id FROM contacts WHERE contacts.id = activities.contact_id)",
+        # Seeded reports; the others are matched to their requester's account below
+        "UPDATE company_intel SET user_id = 'system' WHERE requested_by = 'system'",
+
+        "CREATE INDEX IF NOT EXISTS ix_contacts_user_id_id ON contacts (user_id, id)",
+        "CREATE INDEX IF NOT EXISTS ix_contacts_user_id_status_id ON contacts (user_id, status, id)",
+        "CREATE INDEX IF NOT EXISTS ix_contacts_user_id_source_id ON contacts (user_id, source, id)",
+        "CREATE INDEX IF NOT EXISTS ix_contacts_user_id_assigned_to_id ON contacts (user_id, assigned_to, id)",
+        "CREATE INDEX IF NOT EXISTS ix_contacts_user_id_name_lower ON contacts (user_id, lower(name))",
+        "CREATE INDEX IF NOT EXISTS ix_contacts_user_id_company_lower ON contacts (user_id, lower(company))",
+        "CREATE INDEX IF NOT EXISTS ix_deals_user_id_stage_value ON deals (user_id, stage, value)",
+        "CREATE INDEX IF NOT EXISTS ix_activities_user_id_completed_date ON activities (user_id, completed, date)",
+        "CREATE INDEX IF NOT EXISTS ix_activities_user_id_created_at ON activities (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_company_intel_user_id_generated_at ON company_intel (user_id, generated_at)",
+        "CREATE INDEX IF NOT EXISTS ix_company_intel_user_id_lookup ON company_intel (user_id, lower(company_name), analysis_type, generated_at)",
+        "DROP INDEX IF EXISTS ix_contacts_status_id",
+        "DROP INDEX IF EXISTS ix_contacts_source_id",
+        "DROP INDEX IF EXISTS ix_contacts_assigned_to_id",
+        "DROP INDEX IF EXISTS ix_contacts_name_lower",
+        "DROP INDEX IF EXISTS ix_contacts_email_lower",
+        "DROP INDEX IF EXISTS ix_contacts_company_lower",
+        "DROP INDEX IF EXISTS ix_deals_stage_value",
+        "DROP INDEX IF EXISTS ix_activities_completed_date",
+        "DROP INDEX IF EXISTS ix_activities_created_at",
+        "DROP INDEX IF EXISTS ix_company_intel_generated_at",
+        "DROP INDEX IF EXISTS ix_company_intel_lookup",
+
+        # Derived data is keyed by owner now; both are rebuilt on startup when empty
+        "DROP TABLE IF EXISTS dashboard_stats",
+        "CREATE TABLE dashboard_stats ("
+        " user_id VARCHAR NOT NULL, name VARCHAR NOT NULL,"
+        " count INTEGER NOT NULL, total FLOAT NOT NULL,"
+        " PRIMARY KEY (user_id, name))",
+        "DROP TABLE IF EXISTS search_index",
+        "DROP TABLE IF EXISTS search_documents",
+    ])
+    _intel_owners(connection)
+
+@migration(4, "Per-stage pipeline column indexes")
+def _pipeline_stage_indexes(connection):
+    _execute_all(connection, [
+        "CREATE INDEX IF NOT EXISTS ix_deals_user_id_stage_value_id ON deals (user_id, stage, value, id)",
+        "CREATE INDEX IF NOT EXISTS ix_deals_user_id_stage_close_id ON deals (user_id, stage, coalesce(expected_close, '9999-12-31'), id)",
+        "CREATE INDEX IF NOT EXISTS ix_deals_user_id_stage_updated_at ON deals (user_id, stage, updated_at)",
+        "DROP INDEX IF EXISTS ix_deals_user_id_stage_value",
+    ])
+
+@migration(5, "Backfill deal stage history")
+def _deal_stage_history(connection):
+    # deal_stage_events is created by create_all; history before this release is
+    # unknown, so each deal starts with one event at its current stage
+    _execute_all(connection, [
+        "INSERT INTO deal_stage_events (user_id, deal_id, from_stage, to_stage, changed_at)"
+        " SELECT user_id, id, NULL, stage, COALESCE(created_at, CURRENT_TIMESTAMP) FROM deals"
+        " WHERE NOT EXISTS (SELECT 1 FROM deal_stage_events WHERE deal_stage_events.user_id = deals.user_id AND deal_stage_events.deal_id = deals.id)",
+    ])
+
+@migration(6, "Company intel batch runs")
+def _intel_batch_runs(connection):
+    # New tables only; recorded as a step so workers refuse to start until `app.cli init` has created them
+    from app.models import IntelBatchRun, IntelBatchItem
+    IntelBatchRun.__table__.create(connection, checkfirst=True)
+    IntelBatchItem.__table__.create(connection, checkfirst=True)
+
+@migration(7, "Contact duplicate detection")
+def _contact_duplicates(connection):
+    # Empty until `app.cli dedup-scan` builds the keys of existing contacts
+    from app.models import ContactMatchKey, ContactDuplicate
+    ContactMatchKey.__table__.create(connection, checkfirst=True)
+    ContactDuplicate.__table__.create(connection, checkfirst=True)
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+def applied_versions(connection) -> set:
+    return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+def upgrade(engine) -> list:
+    """Run pending steps in order, each in its own transaction. Returns the versions applied."""
+    _metadata.create_all(bind=engine)
+    with engine.connect() as connection:
+        done = applied_versions(connection)
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as connection:
+            fn(connection)
+            connection.execute(insert(schema_migrations).values(version=version, description=description))
+        applied.append(version)
+    return applied
+
+def stamp(engine):
+    """Mark every step as applied, for a database created from the current models."""
+    _metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        done = applied_versions(connection)
+        rows = [{"version": v, "description": d} for v, d, _ in MIGRATIONS if v not in done]
+        if rows:
+            connection.execute(insert(schema_migrations), rows)
+
+def pending_versions(engine) -> list:
+    """Versions not yet applied; every version when the database has no schema at all."""
+    if not inspect(engine).has_table(schema_migrations.name):
+        return [version for version, _, _ in MIGRATIONS]
+    with engine.connect() as connection:
+        done = applied_versions(connection)
+    return [version for version, _, _ in MIGRATIONS if version not in done]
+
+def init_schema(engine) -> list:
+    """Create missing tables, then bring an existing database up to date."""
+    import app.models
+    fresh = not inspect(engine).has_table("contacts")
+    Base.metadata.create_all(bind=engine)
+    if fresh:
+        stamp(engine)
+        return []
+    return upgrade(engine)
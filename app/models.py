@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean, Date
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, Boolean, Date, Index, JSON, literal_column
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -23,10 +23,23 @@ class Contact(Base):
     deals = relationship("Deal", back_populates="contact", cascade="all, delete-orphan")
     activities = relationship("Activity", back_populates="contact", cascade="all, delete-orphan")
 
+    # Index changes on existing databases are applied by app.migrations
+    __table_args__ = (
+        # Every query is scoped to one owner (app.tenancy), so indexes lead with user_id
+        Index("ix_contacts_user_id_id", "user_id", "id"),
+        Index("ix_contacts_user_id_email_lower", "user_id", func.lower(email)),
+        Index("ix_contacts_user_id_status_id", "user_id", "status", "id"),
+        Index("ix_contacts_user_id_source_id", "user_id", "source", "id"),
+        Index("ix_contacts_user_id_assigned_to_id", "user_id", "assigned_to", "id"),
+        Index("ix_contacts_user_id_name_lower", "user_id", func.lower(name)),
+        Index("ix_contacts_user_id_company_lower", "user_id", func.lower(company)),
+    )
+
 class Deal(Base):
     __tablename__ = "deals"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, nullable=False) # owner, same as the contact's
     contact_id = Column(Integer, ForeignKey("contacts.id"), nullable=False)
     title = Column(String(200), nullable=False)
     value = Column(Float, nullable=False)
@@ -41,10 +54,19 @@ class Deal(Base):
     contact = relationship("Contact", back_populates="deals")
     activities = relationship("Activity", back_populates="deal", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_deals_contact_id", "contact_id"),
+        # Per-stage board columns (app.routes.pipeline): keyset by value or by expected close date
+        Index("ix_deals_user_id_stage_value_id", "user_id", "stage", "value", "id"),
+        Index("ix_deals_user_id_stage_close_id", "user_id", "stage", func.coalesce(expected_close, literal_column("'9999-12-31'")), "id"),
+        Index("ix_deals_user_id_stage_updated_at", "user_id", "stage", "updated_at"),
+    )
+
 class Activity(Base):
     __tablename__ = "activities"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, nullable=False) # owner, same as the contact's
     contact_id = Column(Integer, ForeignKey("contacts.id"), nullable=False)
     deal_id = Column(Integer, ForeignKey("deals.id"), nullable=True)
     type = Column(String, nullable=False) # "call", "email", "meeting", "note", "task"
@@ -57,13 +79,131 @@ class Activity(Base):
     contact = relationship("Contact", back_populates="activities")
     deal = relationship("Deal", back_populates="activities")
 
+    __table_args__ = (
+        Index("ix_activities_contact_id_date", "contact_id", "date"),
+        Index("ix_activities_deal_id", "deal_id"),
+        Index("ix_activities_user_id_completed_date", "user_id", "completed", "date"),
+        Index("ix_activities_user_id_created_at", "user_id", "created_at"),
+    )
+
 class CompanyIntel(Base):
     __tablename__ = "company_intel"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, nullable=True) # owner; NULL for reports generated before ownership was tracked
     company_name = Column(String(200), nullable=False)
     analysis_type = Column(String, nullable=False) # "swot", "competitor", "market"
     content = Column(Text, nullable=False)
     model_used = Column(String, nullable=True)
     generated_at = Column(DateTime(timezone=True), server_default=func.now())
     requested_by = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_company_intel_user_id_generated_at", "user_id", "generated_at"),
+        # Cache lookups in app.intel_cache
+        Index("ix_company_intel_user_id_lookup", "user_id", func.lower(company_name), "analysis_type", "generated_at"),
+    )
+
+class DashboardStat(Base):
+    __tablename__ = "dashboard_stats"
+
+    user_id = Column(String, primary_key=True)
+    # "contacts", "activities", "activities:open", "deals:<stage>" or "version:<name>"; maintained by app.stats
+    name = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    total = Column(Float, nullable=False, default=0.0)
+
+class DealStageEvent(Base):
+    """Append-only stage history; one row per deal create and stage change (see app.analytics)."""
+    __tablename__ = "deal_stage_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, nullable=False)
+    deal_id = Column(Integer, nullable=False) # no foreign key: history outlives deleted deals
+    from_stage = Column(String, nullable=True) # NULL when the deal was created
+    to_stage = Column(String, nullable=False)
+    changed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_deal_stage_events_user_id_deal_id_changed_at", "user_id", "deal_id", "changed_at"),
+        Index("ix_deal_stage_events_user_id_changed_at", "user_id", "changed_at"),
+    )
+
+class DealStageRollup(Base):
+    """Per-owner monthly stage analytics for completed months (see app.analytics)."""
+    __tablename__ = "deal_stage_rollups"
+
+    user_id = Column(String, primary_key=True)
+    month = Column(Date, primary_key=True) # first day of the month
+    stage = Column(String, primary_key=True)
+    entered = Column(Integer, nullable=False, default=0) # stage changes into the stage
+    reached = Column(Integer, nullable=False, default=0) # deals reaching the stage (or a later one) for the first time
+    exited = Column(Integer, nullable=False, default=0) # stage changes out of the stage
+    days_total = Column(Float, nullable=False, default=0.0) # time in stage of the exits
+    days_histogram = Column(JSON, nullable=False) # exits per app.analytics.DAY_BUCKETS bucket
+
+class IntelBatchRun(Base):
+    """Company intel for every distinct company in an owner's contacts (see app.intel_batch)."""
+    __tablename__ = "intel_batch_runs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, nullable=False)
+    analysis_type = Column(String, nullable=False) # "swot", "competitor", "market"
+    status = Column(String, nullable=False, default="pending") # "pending", "running", "done"
+    requested_by = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Heartbeat while running; a "running" run that stops beating was interrupted and can be resumed
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    items = relationship("IntelBatchItem", back_populates="run", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_intel_batch_runs_user_id_created_at", "user_id", "created_at"),
+    )
+
+class IntelBatchItem(Base):
+    """One company of a batch run; its status is the run's checkpoint."""
+    __tablename__ = "intel_batch_items"
+
+    run_id = Column(Integer, ForeignKey("intel_batch_runs.id"), primary_key=True)
+    company_name = Column(String(200), primary_key=True)
+    status = Column(String, nullable=False, default="pending") # "pending", "done", "skipped", "failed"
+    attempts = Column(Integer, nullable=False, default=0)
+    intel_id = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+
+    run = relationship("IntelBatchRun", back_populates="items")
+
+    __table_args__ = (
+        Index("ix_intel_batch_items_run_id_status", "run_id", "status"),
+    )
+
+class ContactMatchKey(Base):
+    """A blocking key of a contact; contacts sharing a key are compared for duplicates (see app.dedup)."""
+    __tablename__ = "contact_match_keys"
+
+    user_id = Column(String, primary_key=True)
+    key = Column(String, primary_key=True) # "e:<email>", "n:<domain>:<name phonetic>", "p:<phone digits>"
+    contact_id = Column(Integer, primary_key=True)
+
+    __table_args__ = (
+        Index("ix_contact_match_keys_contact_id", "contact_id"),
+    )
+
+class ContactDuplicate(Base):
+    """A scored pair of contacts that may be the same person; contact_id is the lower id."""
+    __tablename__ = "contact_duplicates"
+
+    contact_id = Column(Integer, primary_key=True)
+    duplicate_id = Column(Integer, primary_key=True)
+    user_id = Column(String, nullable=False)
+    score = Column(Float, nullable=False)
+    reasons = Column(String, nullable=True) # comma-separated: "email", "phone", "name", "company", "domain"
+    status = Column(String, nullable=False, default="open") # "open", "dismissed"
+    detected_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_contact_duplicates_user_id_status_score", "user_id", "status", "score"),
+        Index("ix_contact_duplicates_duplicate_id", "duplicate_id"),
+    )
@@ -0,0 +1,289 @@
+"""Rendered-page cache with write-driven invalidation.
+
+GET handlers decorated with ``cached_page(*tables)`` are served from a cache
+keyed by owner, path and query string. Each entry records the version of
+every ``<table>:<owner>`` tag it was rendered from; a session hook bumps the
+tags of the rows a transaction inserted, changed or deleted once it commits,
+so the next request for an affected page renders it again. Writes that bypass
+the ORM (Core bulk inserts) call ``invalidate`` themselves, and entries also
+expire after PAGE_CACHE_TTL_SECONDS as a backstop.
+
+Responses carry a strong ETag; a request whose If-None-Match matches the
+current entry gets 304 without a body.
+
+PAGE_CACHE_BACKEND picks where entries and tag versions live:
+
+- ``memory`` (default): an in-process LRU of PAGE_CACHE_SIZE entries. Tag
+  versions are per process too, so use it with a single worker.
+- ``redis``: the LRU stays as a first tier, and Redis (PAGE_CACHE_REDIS_URL,
+  needs the ``redis`` package) holds shared entries and the tag versions, so
+  a write in one worker invalidates pages in all of them.
+- ``off``: handlers always render.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_BACKEND = os.environ.get("PAGE_CACHE_BACKEND", "memory")
+PAGE_CACHE_REDIS_URL = os.environ.get("PAGE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", "1000"))
+PAGE_CACHE_TTL_SECONDS = int(os.environ.get("PAGE_CACHE_TTL_SECONDS", "300"))
+REDIS_PREFIX = "crm:page:"
+
+stats = {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0}
+
+class Entry:
+    __slots__ = ("versions", "etag", "body", "media_type", "expires_at")
+
+    def __init__(self, versions: list, etag: str, body: bytes, media_type: str, expires_at: float):
+        self.versions = versions
+        self.etag = etag
+        self.body = body
+        self.media_type = media_type
+        self.expires_at = expires_at
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "versions": self.versions, "etag": self.etag, "body": self.body.decode(),
+            "media_type": self.media_type, "expires_at": self.expires_at
+        })
+
+    @classmethod
+    def from_json(cls, data: str) -> "Entry":
+        fields = json.loads(data)
+        return cls(fields["versions"], fields["etag"], fields["body"].encode(), fields["media_type"], fields["expires_at"])
+
+class MemoryTier:
+    """LRU of rendered pages plus tag versions, for this process."""
+
+    def __init__(self, size: int):
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._size = size
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: Entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+    def versions(self, tags: list) -> list:
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags: set):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def __len__(self):
+        return len(self._entries)
+
+class RedisTier:
+    """Shared entries and tag versions in Redis."""
+
+    def __init__(self, url: str):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Entry]:
+        data = self._redis.get(REDIS_PREFIX + key)
+        return Entry.from_json(data) if data is not None else None
+
+    def set(self, key: str, entry: Entry):
+        self._redis.set(REDIS_PREFIX + key, entry.to_json(), ex=PAGE_CACHE_TTL_SECONDS)
+
+    def versions(self, tags: list) -> list:
+        return [int(v or 0) for v in self._redis.mget([REDIS_PREFIX + "tag:" + tag for tag in tags])]
+
+    def bump(self, tags: set):
+        with self._redis.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.incr(REDIS_PREFIX + "tag:" + tag)
+            pipe.execute()
+
+class PageCache:
+    def __init__(self, local: MemoryTier, shared: RedisTier = None):
+        self.local = local
+        self.shared = shared
+
+    def versions(self, tags: list) -> list:
+        return (self.shared or self.local).versions(tags)
+
+    def get(self, key: str, versions: list) -> Optional[Entry]:
+        """The entry for key if it was rendered from these tag versions and has not expired."""
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.local.set(key, entry)
+        if entry is None or entry.versions != versions or entry.expires_at < time.time():
+            return None
+        return entry
+
+    def set(self, key: str, entry: Entry):
+        self.local.set(key, entry)
+        if self.shared is not None:
+            self.shared.set(key, entry)
+
+    def bump(self, tags: set):
+        (self.shared or self.local).bump(tags)
+
+def _create_cache() -> Optional[PageCache]:
+    if PAGE_CACHE_BACKEND == "off":
+        return None
+    if PAGE_CACHE_BACKEND == "redis":
+        return PageCache(MemoryTier(PAGE_CACHE_SIZE), RedisTier(PAGE_CACHE_REDIS_URL))
+    if PAGE_CACHE_BACKEND != "memory":
+        raise ValueError(f"unknown PAGE_CACHE_BACKEND '{PAGE_CACHE_BACKEND}'")
+    return PageCache(MemoryTier(PAGE_CACHE_SIZE))
+
+cache = _create_cache()
+
+def tag(table: str, user_id) -> str:
+    return f"{table}:{user_id}"
+
+def invalidate(user_id, *tables: str):
+    """Drop the owner's cached pages that were rendered from any of these tables."""
+    if cache is None or not tables:
+        return
+    try:
+        cache.bump({tag(table, user_id) for table in tables})
+        stats["invalidations"] += 1
+    except Exception:
+        # Entries still expire after PAGE_CACHE_TTL_SECONDS
+        logger.exception("page cache invalidation failed")
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    return header is not None and etag in [value.strip() for value in header.split(",")]
+
+def _respond(request: Request, entry: Entry) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if _not_modified(request, entry.etag):
+        stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type=entry.media_type, headers=headers)
+
+def _key(request: Request, user) -> str:
+    query = "&".join(sorted(request.url.query.split("&"))) if request.url.query else ""
+    return f"{user.id}:{request.url.path}?{query}"
+
+def cached_page(*tables: str):
+    """Serve a GET handler from the page cache; it must take ``request`` and ``user`` arguments.
+
+    ``tables`` are the tables the page is rendered from; a committed write to
+    any of them by the same owner invalidates it.
+    """
+    def decorate(endpoint):
+        def before(kwargs) -> tuple:
+            request, user = kwargs["request"], kwargs["user"]
+            tags = [tag(table, user.id) for table in tables]
+            try:
+                key = _key(request, user)
+                versions = cache.versions(tags)
+                entry = cache.get(key, versions)
+            except Exception:
+                logger.exception("page cache lookup failed")
+                return request, None, None, None
+            if entry is not None:
+                stats["hits"] += 1
+                return request, None, None, _respond(request, entry)
+            stats["misses"] += 1
+            # Versions are read before rendering: a write that commits meanwhile makes this entry stale at once
+            return request, key, versions, None
+
+        def after(request: Request, key: str, versions: list, response):
+            if key is None or getattr(response, "status_code", None) != 200 or not hasattr(response, "body"):
+                return response
+            entry = Entry(versions, _etag(response.body), response.body, response.media_type,
+                          time.time() + PAGE_CACHE_TTL_SECONDS)
+            try:
+                cache.set(key, entry)
+            except Exception:
+                logger.exception("page cache store failed")
+            response.headers["ETag"] = entry.etag
+            response.headers["Cache-Control"] = "private, no-cache"
+            if _not_modified(request, entry.etag):
+                return _respond(request, entry)
+            return response
+
+        if inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def wrapper(*args, **kwargs):
+                if cache is None:
+                    return await endpoint(*args, **kwargs)
+                request, key, versions, cached = before(kwargs)
+                if cached is not None:
+                    return cached
+                return after(request, key, versions, await endpoint(*args, **kwargs))
+        else:
+            @functools.wraps(endpoint)
+            def wrapper(*args, **kwargs):
+                if cache is None:
+                    return endpoint(*args, **kwargs)
+                request, key, versions, cached = before(kwargs)
+                if cached is not None:
+                    return cached
+                return after(request, key, versions, endpoint(*args, **kwargs))
+        return wrapper
+    return decorate
+
+def snapshot() -> dict:
+    lookups = stats["hits"] + stats["misses"]
+    return dict(stats, hit_ratio=round(stats["hits"] / lookups, 4) if lookups else 0.0,
+                backend=PAGE_CACHE_BACKEND, entries=len(cache.local) if cache else 0)
+
+# Write-driven invalidation
+
+def _owned_table(obj) -> Optional[tuple]:
+    user_id = getattr(obj, "user_id", None)
+    return (user_id, obj.__tablename__) if user_id is not None and hasattr(obj, "__tablename__") else None
+
+@event.listens_for(Session, "after_flush")
+def _collect_tags(session, flush_context):
+    changed = list(session.new) + list(session.deleted)
+    changed += [obj for obj in session.dirty if session.is_modified(obj, include_collections=False)]
+    touched = {owned for owned in map(_owned_table, changed) if owned}
+    if touched:
+        session.info.setdefault("page_cache_tags", set()).update(touched)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    touched = session.info.pop("page_cache_tags", None)
+    if not touched or cache is None:
+        return
+    by_owner = {}
+    for user_id, table in touched:
+        by_owner.setdefault(user_id, set()).add(table)
+    for user_id, tables in by_owner.items():
+        invalidate(user_id, *tables)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_tags(session):
+    session.info.pop("page_cache_tags", None)
@@ -1,26 +1,30 @@
 from fastapi import APIRouter, Depends, Request, Form, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from app.templating import Templates
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import desc
-from app.database import get_db
+from app.tenancy import get_tenant_db, get_tenant_read_db
 from app.models import Activity, Contact, Deal
 import app.routes as routes_module
 from datetime import datetime
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
+templates = Templates(directory="app/templates")
 
 @router.get("/activities", response_class=HTMLResponse)
-async def list_activities(
+def list_activities(
     request: Request,
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_read_db)
 ):
-    activities = db.query(Activity).order_by(desc(Activity.created_at)).all()
-    contacts = db.query(Contact).all()
-    deals = db.query(Deal).all()
+    # Contact and deal names are joined in; the form dropdowns only need id/label columns
+    activities = db.query(Activity).options(
+        joinedload(Activity.contact).load_only(Contact.id, Contact.name),
+        joinedload(Activity.deal).load_only(Deal.id, Deal.title)
+    ).order_by(desc(Activity.created_at)).all()
+    contacts = db.query(Contact.id, Contact.name).order_by(Contact.name).all()
+    deals = db.query(Deal.id, Deal.title).order_by(Deal.title).all()
     return templates.TemplateResponse("activities/list.html", {
         "request": request,
         "activities": activities,
@@ -30,7 +34,7 @@ async def list_activities(
     })
 
 @router.post("/activities")
-async def create_activity(
+def create_activity(
     request: Request,
     contact_id: int = Form(...),
     deal_id: int = Form(None),
@@ -40,7 +44,7 @@ async def create_activity(
     date_str: str = Form(...), # expecting YYYY-MM-DDTHH:MM
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     try:
         activity_date = datetime.fromisoformat(date_str)
@@ -48,6 +52,12 @@ async def create_activity(
         # handle different format if needed, but HTML datetime-local uses ISO
         activity_date = datetime.now()
 
+    # Scoped session: another owner's contact or deal is not found
+    if not db.query(Contact.id).filter(Contact.id == contact_id).first():
+        raise HTTPException(status_code=404, detail="Contact not found")
+    if deal_id and not db.query(Deal.id).filter(Deal.id == deal_id).first():
+        raise HTTPException(status_code=404, detail="Deal not found")
+
     activity = Activity(
         contact_id=contact_id,
         deal_id=deal_id,
@@ -61,12 +71,12 @@ async def create_activity(
     return RedirectResponse(url="/activities", status_code=303)
 
 @router.post("/activities/{id}/complete")
-async def complete_activity(
+def complete_activity(
     request: Request,
     id: int,
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     activity = db.query(Activity).filter(Activity.id == id).first()
     if not activity:
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, Request, Query
+from fastapi.responses import HTMLResponse, JSONResponse
+from app.templating import Templates
+from sqlalchemy.orm import Session
+from app.tenancy import get_tenant_db
+from app import analytics
+import app.routes as routes_module
+
+router = APIRouter()
+templates = Templates(directory="app/templates")
+
+MAX_MONTHS = 36
+
+# Primary session: the first request after a month ends writes its rollup
+
+@router.get("/analytics", response_class=HTMLResponse)
+def analytics_page(
+    request: Request,
+    months: int = Query(12, ge=1, le=MAX_MONTHS),
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription),
+    db: Session = Depends(get_tenant_db)
+):
+    return templates.TemplateResponse("analytics.html", {
+        "request": request,
+        "user": user,
+        "report": analytics.get_report(db, months)
+    })
+
+@router.get("/api/analytics")
+def api_analytics(
+    months: int = Query(12, ge=1, le=MAX_MONTHS),
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription),
+    db: Session = Depends(get_tenant_db)
+):
+    return JSONResponse(analytics.get_report(db, months))
@@ -1,13 +1,14 @@
 from fastapi import APIRouter, Depends, Request, status, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from app.templating import Templates
 import app.routes as routes_module
+from app import auth_cache
 from app.routes import get_current_user
 from typing import Any
 import os
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
+templates = Templates(directory="app/templates")
 
 @router.get("/pricing", response_class=HTMLResponse)
 async def pricing_page(request: Request):
@@ -32,7 +33,7 @@ async def pricing_page(request: Request):
     return templates.TemplateResponse("billing/pricing.html", {"request": request, "user": None})
 
 @router.post("/subscribe")
-async def subscribe(request: Request, user: Any = Depends(get_current_user)):
+def subscribe(request: Request, user: Any = Depends(get_current_user)):
     if not routes_module.create_checkout:
         raise HTTPException(status_code=500, detail="Billing not configured")
 
@@ -40,6 +41,8 @@ async def subscribe(request: Request, user: Any = Depends(get_current_user)):
     if not price_id:
         raise HTTPException(status_code=500, detail="STRIPE_PRICE_ID not set")
 
+    # The subscription changes once checkout completes; don't serve the old one until then
+    auth_cache.invalidate_user(user.id)
     try:
         url = routes_module.create_checkout(user_id=user.id, email=user.email, price_id=price_id)
         return RedirectResponse(url=url, status_code=status.HTTP_303_SEE_OTHER)
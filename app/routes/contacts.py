@@ -1,24 +1,132 @@
-from fastapi import APIRouter, Depends, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, Depends, Request, Form, HTTPException, Query, UploadFile, File
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from app.templating import Templates
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from app.database import get_db
+from sqlalchemy import desc, func, and_, select, union
+from app.tenancy import get_tenant_db, get_tenant_read_db
 from app.models import Contact, Deal, Activity
+from app.importer import detect_format, ImportFormatError
+from app.page_cache import cached_page
+from app import dedup, importer, page_cache, timeline
 import app.routes as routes_module
+from typing import Optional
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
+templates = Templates(directory="app/templates")
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+DUPLICATES_PAGE_SIZE = 100
+# Possible duplicates shown on a contact's page
+DETAIL_DUPLICATES = 5
+
+def _prefix_range(column, prefix: str):
+    # Prefix match as a range on lower(column) so an index on the expression can be used
+    prefix = prefix.lower()
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(func.lower(column) >= prefix, func.lower(column) < upper)
+
+def filter_contacts(query, status: str = None, source: str = None, assigned_to: str = None, q: str = None):
+    if status:
+        query = query.filter(Contact.status == status)
+    if source:
+        query = query.filter(Contact.source == source)
+    if assigned_to:
+        query = query.filter(Contact.assigned_to == assigned_to)
+    q = (q or "").strip()
+    if q:
+        # A UNION of three index range scans; with an OR here the planner can fall back to a table scan
+        matches = union(
+            select(Contact.id).where(_prefix_range(Contact.name, q)),
+            select(Contact.id).where(_prefix_range(Contact.email, q)),
+            select(Contact.id).where(_prefix_range(Contact.company, q))
+        )
+        query = query.filter(Contact.id.in_(matches))
+    return query
+
+def contacts_page_query(db: Session, cursor: int = None, limit: int = PAGE_SIZE, **filters):
+    query = filter_contacts(db.query(Contact), **filters)
+    if cursor:
+        query = query.filter(Contact.id < cursor)
+    # One extra row tells us whether there is a next page
+    return query.order_by(desc(Contact.id)).limit(limit + 1)
+
+def get_contacts_page(db: Session, cursor: int = None, limit: int = PAGE_SIZE, **filters):
+    """Return one page of contacts, newest first, and the cursor for the next page (or None)."""
+    rows = contacts_page_query(db, cursor, limit, **filters).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def contact_to_dict(contact: Contact) -> dict:
+    return {
+        "id": contact.id,
+        "name": contact.name,
+        "email": contact.email,
+        "phone": contact.phone,
+        "company": contact.company,
+        "title": contact.title,
+        "status": contact.status,
+        "source": contact.source,
+        "assigned_to": contact.assigned_to,
+        "created_at": contact.created_at.isoformat() if contact.created_at else None
+    }
 
 @router.get("/contacts", response_class=HTMLResponse)
-async def list_contacts(
+def list_contacts(
     request: Request,
+    status: Optional[str] = None,
+    source: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    q: Optional[str] = None,
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription),
+    db: Session = Depends(get_tenant_read_db)
+):
+    filters = {"status": status, "source": source, "assigned_to": assigned_to, "q": q}
+    contacts, next_cursor = get_contacts_page(db, **filters)
+    return templates.TemplateResponse("contacts/list.html", {
+        "request": request,
+        "contacts": contacts,
+        "next_cursor": next_cursor,
+        "filters": filters,
+        "user": user
+    })
+
+@router.get("/contacts/rows", response_class=HTMLResponse)
+def list_contact_rows(
+    request: Request,
+    cursor: Optional[int] = None,
+    status: Optional[str] = None,
+    source: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    q: Optional[str] = None,
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription),
+    db: Session = Depends(get_tenant_read_db)
+):
+    # Table-body fragment used by the list page for filtering and "load more"
+    contacts, next_cursor = get_contacts_page(db, cursor=cursor, status=status, source=source, assigned_to=assigned_to, q=q)
+    response = templates.TemplateResponse("contacts/_rows.html", {"request": request, "contacts": contacts})
+    response.headers["X-Next-Cursor"] = str(next_cursor or "")
+    return response
+
+@router.get("/api/contacts")
+def api_list_contacts(
+    cursor: Optional[int] = None,
+    limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    status: Optional[str] = None,
+    source: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    q: Optional[str] = None,
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_read_db)
 ):
-    contacts = db.query(Contact).all()
-    return templates.TemplateResponse("contacts/list.html", {"request": request, "contacts": contacts, "user": user})
+    contacts, next_cursor = get_contacts_page(db, cursor=cursor, limit=limit, status=status, source=source, assigned_to=assigned_to, q=q)
+    return JSONResponse({
+        "items": [contact_to_dict(c) for c in contacts],
+        "next_cursor": next_cursor
+    })
 
 @router.get("/contacts/new", response_class=HTMLResponse)
 async def new_contact(
@@ -29,7 +137,7 @@ async def new_contact(
     return templates.TemplateResponse("contacts/form.html", {"request": request, "user": user, "contact": None})
 
 @router.post("/contacts/new")
-async def create_contact(
+def create_contact(
     request: Request,
     name: str = Form(...),
     email: str = Form(...),
@@ -42,7 +150,7 @@ async def create_contact(
     assigned_to: str = Form(None),
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     contact = Contact(
         user_id=str(user.id),
@@ -61,33 +169,130 @@ async def create_contact(
     db.refresh(contact)
     return RedirectResponse(url=f"/contacts/{contact.id}", status_code=303)
 
+@router.post("/contacts/import")
+async def import_contacts_upload(
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None),
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription)
+):
+    """Start an import; poll the returned job for progress."""
+    # The upload is parsed as a stream and written in batches in the background; see app.importer
+    try:
+        job = await importer.start_in_background(file.file, format or detect_format(file.filename), user_id=str(user.id))
+    except ImportFormatError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return JSONResponse(status_code=202, content=job.to_dict())
+
+@router.get("/contacts/import/{job_id}")
+async def import_contacts_progress(
+    job_id: str,
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription)
+):
+    job = importer.get_job(job_id)
+    if not job or job.user_id != str(user.id):
+        raise HTTPException(status_code=404, detail="Import not found")
+    return JSONResponse(job.to_dict())
+
+@router.get("/contacts/duplicates", response_class=HTMLResponse)
+def list_duplicates(
+    request: Request,
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription),
+    db: Session = Depends(get_tenant_read_db)
+):
+    # Pairs are found on write and by `app.cli dedup-scan`; see app.dedup
+    return templates.TemplateResponse("contacts/duplicates.html", {
+        "request": request,
+        "pairs": dedup.list_duplicates(db, limit=DUPLICATES_PAGE_SIZE),
+        "user": user
+    })
+
+@router.post("/contacts/duplicates/merge")
+def merge_duplicates(
+    request: Request,
+    survivor_id: int = Form(...),
+    duplicate_id: int = Form(...),
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription),
+    db: Session = Depends(get_tenant_db)
+):
+    try:
+        dedup.merge_contacts(db, survivor_id, [duplicate_id])
+    except dedup.MergeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return RedirectResponse(url=f"/contacts/{survivor_id}", status_code=303)
+
+@router.post("/contacts/duplicates/dismiss")
+def dismiss_duplicate(
+    request: Request,
+    contact_id: int = Form(...),
+    duplicate_id: int = Form(...),
+    return_to: Optional[int] = Form(None),
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription),
+    db: Session = Depends(get_tenant_db)
+):
+    if dedup.dismiss(db, contact_id, duplicate_id):
+        # Contact pages list their open pairs
+        page_cache.invalidate(user.id, "contacts")
+    return RedirectResponse(url=f"/contacts/{return_to}" if return_to else "/contacts/duplicates", status_code=303)
+
 @router.get("/contacts/{id}", response_class=HTMLResponse)
-async def view_contact(
+@cached_page("contacts", "deals", "activities", "company_intel")
+def view_contact(
     request: Request,
     id: int,
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_read_db)
 ):
     contact = db.query(Contact).filter(Contact.id == id).first()
     if not contact:
         raise HTTPException(status_code=404, detail="Contact not found")
-    
+
+    # Counts come from SQL and history from the first timeline page; older entries scroll in
+    items, next_cursor = timeline.get_timeline_page(db, user.id, contact)
     return templates.TemplateResponse("contacts/detail.html", {
         "request": request, 
         "contact": contact, 
         "user": user,
-        "deals": contact.deals,
-        "activities": contact.activities
+        "summary": timeline.contact_summary(db, user.id, contact),
+        "deals": timeline.recent_deals(db, contact),
+        "duplicates": dedup.list_duplicates(db, contact_id=contact.id, limit=DETAIL_DUPLICATES),
+        "items": items,
+        "next_cursor": next_cursor
     })
 
+@router.get("/contacts/{id}/timeline", response_class=HTMLResponse)
+def contact_timeline(
+    request: Request,
+    id: int,
+    cursor: Optional[str] = None,
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription),
+    db: Session = Depends(get_tenant_read_db)
+):
+    # Timeline fragment for infinite scroll on the detail page
+    contact = db.query(Contact).filter(Contact.id == id).first()
+    if not contact:
+        raise HTTPException(status_code=404, detail="Contact not found")
+    try:
+        items, next_cursor = timeline.get_timeline_page(db, user.id, contact, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    response = templates.TemplateResponse("contacts/_timeline.html", {"request": request, "items": items})
+    response.headers["X-Next-Cursor"] = next_cursor or ""
+    return response
+
 @router.get("/contacts/{id}/edit", response_class=HTMLResponse)
-async def edit_contact(
+def edit_contact(
     request: Request,
     id: int,
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_read_db)
 ):
     contact = db.query(Contact).filter(Contact.id == id).first()
     if not contact:
@@ -96,7 +301,7 @@ async def edit_contact(
     return templates.TemplateResponse("contacts/form.html", {"request": request, "user": user, "contact": contact})
 
 @router.post("/contacts/{id}/edit")
-async def update_contact(
+def update_contact(
     request: Request,
     id: int,
     name: str = Form(...),
@@ -110,7 +315,7 @@ async def update_contact(
     assigned_to: str = Form(None),
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     contact = db.query(Contact).filter(Contact.id == id).first()
     if not contact:
@@ -130,12 +335,12 @@ async def update_contact(
     return RedirectResponse(url=f"/contacts/{id}", status_code=303)
 
 @router.post("/contacts/{id}/delete")
-async def delete_contact(
+def delete_contact(
     request: Request,
     id: int,
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     contact = db.query(Contact).filter(Contact.id == id).first()
     if contact:
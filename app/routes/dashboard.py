@@ -1,44 +1,43 @@
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from app.templating import Templates
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from app.database import get_db
-from app.models import Contact, Deal, Activity
+from sqlalchemy import desc
+from app.tenancy import get_tenant_read_db
+from app.models import Activity
+from app.stats import read_stats, STAGES, CLOSED_STAGES
 import app.routes as routes_module
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
+templates = Templates(directory="app/templates")
 
 @router.get("/", response_class=HTMLResponse)
-async def dashboard(
+def dashboard(
     request: Request,
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_read_db)
 ):
-    # Quick stats
-    total_contacts = db.query(Contact).count()
-    open_deals_count = db.query(Deal).filter(Deal.stage.notin_(["closed_won", "closed_lost"])).count()
-    total_pipeline_value = db.query(func.sum(Deal.value)).filter(Deal.stage.notin_(["closed_won", "closed_lost"])).scalar() or 0.0
-    
-    won_deals = db.query(Deal).filter(Deal.stage == "closed_won").count()
-    lost_deals = db.query(Deal).filter(Deal.stage == "closed_lost").count()
+    # Aggregates are maintained incrementally by app.stats; one query reads them all
+    stats = read_stats(db)
+    deal_stats = {name.split(":", 1)[1]: value for name, value in stats.items() if name.startswith("deals:")}
+    open_deals = [value for stage, value in deal_stats.items() if stage not in CLOSED_STAGES]
+
+    total_contacts = stats.get("contacts", (0, 0.0))[0]
+    open_deals_count = sum(count for count, _ in open_deals)
+    total_pipeline_value = sum(total for _, total in open_deals)
+
+    won_deals = deal_stats.get("closed_won", (0, 0.0))[0]
+    lost_deals = deal_stats.get("closed_lost", (0, 0.0))[0]
     total_closed = won_deals + lost_deals
     win_rate = int((won_deals / total_closed) * 100) if total_closed > 0 else 0
 
-    # Pipeline summary
-    pipeline_summary = db.query(
-        Deal.stage, 
-        func.count(Deal.id).label("count"), 
-        func.sum(Deal.value).label("value")
-    ).group_by(Deal.stage).all()
-    
     # Format summary for template
-    summary_dict = {stage: {"count": 0, "value": 0} for stage in ["qualified", "proposal", "negotiation", "closed_won", "closed_lost"]}
-    for stage, count, value in pipeline_summary:
+    summary_dict = {stage: {"count": 0, "value": 0} for stage in STAGES}
+    for stage, (count, value) in deal_stats.items():
         if stage in summary_dict:
             summary_dict[stage] = {"count": count, "value": value or 0}
+    open_tasks_count = stats.get("activities:open", (0, 0.0))[0]
 
     # Recent activities (last 10)
     recent_activities = db.query(Activity).order_by(desc(Activity.created_at)).limit(10).all()
@@ -54,6 +53,7 @@ async def dashboard(
         "total_pipeline_value": total_pipeline_value,
         "win_rate": win_rate,
         "pipeline_summary": summary_dict,
+        "open_tasks_count": open_tasks_count,
         "recent_activities": recent_activities,
         "upcoming_tasks": upcoming_tasks
     })
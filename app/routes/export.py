@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse, JSONResponse
+from app import exporter
+import app.routes as routes_module
+from typing import Optional
+
+router = APIRouter()
+
+def _export(entity: str, user, format: str, gzip: bool, **filters):
+    try:
+        chunks = exporter.export_rows(entity, format, gzip=gzip, user_id=str(user.id), **filters)
+    except exporter.ExportError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    # The generator opens its own connection: request-scoped sessions are closed before the body is sent
+    return StreamingResponse(chunks, media_type=exporter.export_media_type(format, gzip), headers={
+        "Content-Disposition": f'attachment; filename="{exporter.export_filename(entity, format, gzip)}"'
+    })
+
+@router.get("/export/contacts")
+def export_contacts(
+    format: str = "csv",
+    gzip: bool = False,
+    status: Optional[str] = None,
+    source: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    q: Optional[str] = None,
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription)
+):
+    return _export("contacts", user, format, gzip, status=status, source=source, assigned_to=assigned_to, q=q)
+
+@router.get("/export/deals")
+def export_deals(
+    format: str = "csv",
+    gzip: bool = False,
+    stage: Optional[str] = None,
+    contact_id: Optional[int] = None,
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription)
+):
+    return _export("deals", user, format, gzip, stage=stage, contact_id=contact_id)
+
+@router.get("/export/activities")
+def export_activities(
+    format: str = "csv",
+    gzip: bool = False,
+    type: Optional[str] = None,
+    completed: Optional[bool] = None,
+    contact_id: Optional[int] = None,
+    deal_id: Optional[int] = None,
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription)
+):
+    return _export("activities", user, format, gzip, type=type, completed=completed, contact_id=contact_id, deal_id=deal_id)
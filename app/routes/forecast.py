@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, Request, Query
+from fastapi.responses import HTMLResponse, JSONResponse
+from app.templating import Templates
+from sqlalchemy.orm import Session
+from app.tenancy import get_tenant_read_db
+from app import forecast
+import app.routes as routes_module
+
+router = APIRouter()
+templates = Templates(directory="app/templates")
+
+MAX_MONTHS = 36
+MAX_SIMULATIONS = 10000
+
+@router.get("/forecast", response_class=HTMLResponse)
+def forecast_page(
+    request: Request,
+    months: int = Query(forecast.HORIZON_MONTHS, ge=1, le=MAX_MONTHS),
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription),
+    db: Session = Depends(get_tenant_read_db)
+):
+    return templates.TemplateResponse("forecast.html", {
+        "request": request,
+        "user": user,
+        "forecast": forecast.get_forecast(db, months=months)
+    })
+
+@router.get("/api/forecast")
+def api_forecast(
+    months: int = Query(forecast.HORIZON_MONTHS, ge=1, le=MAX_MONTHS),
+    simulations: int = Query(forecast.SIMULATIONS, ge=100, le=MAX_SIMULATIONS),
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription),
+    db: Session = Depends(get_tenant_read_db)
+):
+    return JSONResponse(forecast.get_forecast(db, months=months, simulations=simulations))
+
+@router.get("/api/forecast/cache/stats")
+async def forecast_cache_stats(
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription)
+):
+    return JSONResponse(forecast.snapshot())
@@ -1,28 +1,41 @@
-from fastapi import APIRouter, Depends, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.templating import Jinja2Templates
+import json
+from fastapi import APIRouter, Depends, Request, Form, HTTPException, Query
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from app.templating import Templates
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
-from app.database import get_db
+from app.tenancy import get_tenant_db, get_tenant_read_db
 from app.models import CompanyIntel
 import app.routes as routes_module
-import os
+from app import gemini, intel_batch, intel_cache
+from app.page_cache import cached_page
+from app.jobs import intel_jobs, QueueFull
 from pydantic import BaseModel
-from google import genai
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
+templates = Templates(directory="app/templates")
 
 class IntelRequest(BaseModel):
     company_name: str
     analysis_type: str
+    force_refresh: bool = False
+
+class IntelBatchRequest(BaseModel):
+    analysis_type: str
+
+def _check_analysis_type(analysis_type: str):
+    # Every accepted request can cost a Gemini generation (one per company for a batch)
+    if analysis_type.lower() not in gemini.ANALYSIS_TYPES:
+        raise HTTPException(status_code=400, detail=f"analysis_type must be one of: {', '.join(gemini.ANALYSIS_TYPES)}")
 
 @router.get("/intel", response_class=HTMLResponse)
-async def intel_dashboard(
+@cached_page("company_intel")
+def intel_dashboard(
     request: Request,
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_read_db)
 ):
     analyses = db.query(CompanyIntel).order_by(desc(CompanyIntel.generated_at)).all()
     return templates.TemplateResponse("intel/dashboard.html", {
@@ -32,12 +45,13 @@ async def intel_dashboard(
     })
 
 @router.get("/intel/{id}", response_class=HTMLResponse)
-async def view_analysis(
+@cached_page("company_intel")
+def view_analysis(
     request: Request,
     id: int,
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_read_db)
 ):
     analysis = db.query(CompanyIntel).filter(CompanyIntel.id == id).first()
     if not analysis:
@@ -55,31 +69,138 @@ async def analyze_company(
     data: IntelRequest,
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
+):
+    _check_analysis_type(data.analysis_type)
+    if data.force_refresh:
+        intel_cache.stats["forced"] += 1
+    else:
+        cached = await run_in_threadpool(intel_cache.find_fresh, db, data.company_name, data.analysis_type)
+        if cached:
+            intel_cache.stats["hits"] += 1
+            return JSONResponse({"job_id": None, "status": "done", "intel_id": cached.id, "cached": True})
+        intel_cache.stats["misses"] += 1
+
+    try:
+        job, created = intel_jobs.submit(data.company_name, data.analysis_type, requested_by=str(user.email), user_id=user.id)
+    except QueueFull as e:
+        return JSONResponse(status_code=429, content={"error": str(e)})
+    if not created:
+        intel_cache.stats["coalesced"] += 1
+    return JSONResponse(status_code=202, content=dict(job.to_dict(), cached=False))
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/api/intel/stream")
+async def stream_analysis(
+    request: Request,
+    company_name: str = Query(..., min_length=1),
+    analysis_type: str = Query(...),
+    force_refresh: bool = False,
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription),
+    db: Session = Depends(get_tenant_read_db)
+):
+    """Server-Sent Events: ``chunk`` events with the report text as Gemini writes it, then
+    ``done`` (or ``failed``). ``reset`` means a failed attempt is being retried: drop the text so far.
+
+    The generation runs as an intel job (app.jobs), so identical requests share
+    one generation, the worker pool bounds concurrent Gemini calls and a full
+    queue answers 429. When the last browser following the job disconnects, the
+    generation is cancelled, unless the job was also requested with
+    POST /api/intel/analyze.
+    """
+    _check_analysis_type(analysis_type)
+    cached = None
+    if force_refresh:
+        intel_cache.stats["forced"] += 1
+    else:
+        intel = await run_in_threadpool(intel_cache.find_fresh, db, company_name, analysis_type)
+        intel_cache.stats["hits" if intel else "misses"] += 1
+        # Read now: the session is closed by the time the body is sent
+        cached = (intel.id, intel.content) if intel else None
+
+    job = None
+    if not cached:
+        try:
+            job, created = intel_jobs.submit(company_name, analysis_type, requested_by=str(user.email), user_id=user.id,
+                                            followed=True)
+        except QueueFull as e:
+            return JSONResponse(status_code=429, content={"error": str(e)})
+        if not created:
+            intel_cache.stats["coalesced"] += 1
+
+    async def stream():
+        if cached:
+            yield _sse("chunk", {"text": cached[1]})
+            yield _sse("done", {"intel_id": cached[0], "cached": True})
+            return
+        async for event, text in job.follow():
+            yield _sse(event, {"text": text} if text is not None else {})
+        if job.status == "done":
+            yield _sse("done", {"intel_id": job.intel_id, "cached": False})
+        else:
+            yield _sse("failed", {"error": job.error or "Unknown error"})
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@router.get("/api/intel/cache/stats")
+async def intel_cache_stats(
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription)
+):
+    return JSONResponse(intel_cache.snapshot())
+
+@router.get("/api/intel/jobs/{job_id}")
+async def get_analysis_job(
+    job_id: str,
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription)
+):
+    job = intel_jobs.get(job_id)
+    if not job or job.user_id != str(user.id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(job.to_dict())
+
+@router.post("/api/intel/batch")
+async def start_intel_batch(
+    data: IntelBatchRequest,
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription)
+):
+    """Queue intel for every distinct company in the user's contacts; poll the returned run for progress."""
+    _check_analysis_type(data.analysis_type)
+    run_id = await run_in_threadpool(intel_batch.create_run, user.id, data.analysis_type, str(user.email))
+    intel_batch.start_in_background(run_id)
+    report = await run_in_threadpool(intel_batch.progress, run_id, user.id)
+    return JSONResponse(status_code=202, content=report.to_dict())
+
+@router.get("/api/intel/batch/{run_id}")
+async def get_intel_batch(
+    run_id: int,
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription)
+):
+    try:
+        report = await run_in_threadpool(intel_batch.progress, run_id, user.id)
+    except intel_batch.RunNotFound:
+        raise HTTPException(status_code=404, detail="Batch run not found")
+    return JSONResponse(report.to_dict())
+
+@router.post("/api/intel/batch/{run_id}/resume")
+async def resume_intel_batch(
+    run_id: int,
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription)
 ):
-    api_key = os.environ.get("GOOGLE_API_KEY")
-    if not api_key:
-        return JSONResponse(status_code=500, content={"error": "Google API Key not set"})
-        
-    client = genai.Client(api_key=api_key)
-    
-    prompt = f"Analyze the company '{data.company_name}' using a {data.analysis_type.upper()} analysis. Provide a structured and detailed report."
-    
     try:
-        response = client.models.generate_content(model="gemini-2.5-flash", contents=prompt)
-        content = response.text
-        
-        intel = CompanyIntel(
-            company_name=data.company_name,
-            analysis_type=data.analysis_type,
-            content=content,
-            model_used="gemini-2.5-flash",
-            requested_by=str(user.email)
-        )
-        db.add(intel)
-        db.commit()
-        db.refresh(intel)
-        
-        return JSONResponse({"id": intel.id, "status": "success"})
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        report = await run_in_threadpool(intel_batch.progress, run_id, user.id)
+    except intel_batch.RunNotFound:
+        raise HTTPException(status_code=404, detail="Batch run not found")
+    if report.status != "done":
+        intel_batch.start_in_background(run_id)
+    return JSONResponse(status_code=202, content=report.to_dict())
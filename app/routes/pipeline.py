@@ -1,43 +1,131 @@
-from fastapi import APIRouter, Depends, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from app.database import get_db
+from fastapi import APIRouter, Depends, Request, Form, HTTPException, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
+from app.templating import Templates
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import desc, func, literal, literal_column, tuple_
+from app.tenancy import get_tenant_db, get_tenant_read_db
 from app.models import Deal, Contact
 import app.routes as routes_module
-from datetime import date
+from app import events
+from app.page_cache import cached_page
+from app.stats import read_stats, STAGES, CLOSED_STAGES
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from types import SimpleNamespace
+import asyncio
+import json
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
+templates = Templates(directory="app/templates")
+
+HEARTBEAT_SECONDS = 15
+
+STAGE_PAGE_SIZE = 20
+CLOSED_WINDOW_DAYS = 90
+SORTS = ("value", "expected_close")
+# Undated deals sort last; same expression as ix_deals_user_id_stage_close_id
+CLOSE_SORT_KEY = func.coalesce(Deal.expected_close, literal_column("'9999-12-31'"))
+
+def _closed_since(closed_days: int) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=closed_days)
+
+def stage_page_query(db: Session, stage: str, sort: str = "value", cursor: str = None,
+                     closed_days: int = CLOSED_WINDOW_DAYS, limit: int = STAGE_PAGE_SIZE):
+    """One board column: deals in a stage, keyset-paginated by value (desc) or expected close (asc)."""
+    query = db.query(Deal).options(joinedload(Deal.contact).load_only(Contact.id, Contact.name)).filter(Deal.stage == stage)
+    if stage in CLOSED_STAGES and closed_days:
+        # Closed columns show what changed recently instead of all history
+        query = query.filter(Deal.updated_at >= _closed_since(closed_days))
+    if sort == "expected_close":
+        if cursor:
+            key, last_id = cursor.rsplit(":", 1)
+            query = query.filter(tuple_(CLOSE_SORT_KEY, Deal.id) > tuple_(literal(date.fromisoformat(key)), literal(int(last_id))))
+        query = query.order_by(CLOSE_SORT_KEY, Deal.id)
+    else:
+        if cursor:
+            value, last_id = cursor.rsplit(":", 1)
+            query = query.filter(tuple_(Deal.value, Deal.id) < tuple_(literal(float(value)), literal(int(last_id))))
+        query = query.order_by(desc(Deal.value), desc(Deal.id))
+    # One extra row tells us whether there is a next page
+    return query.limit(limit + 1)
+
+def _cursor(deal: Deal, sort: str) -> str:
+    if sort == "expected_close":
+        return f"{deal.expected_close.isoformat() if deal.expected_close else '9999-12-31'}:{deal.id}"
+    return f"{deal.value!r}:{deal.id}"
+
+def closed_stage_totals_query(db: Session, closed_days: int = CLOSED_WINDOW_DAYS):
+    """Count and value per closed stage of the deals the windowed closed columns show."""
+    return (
+        db.query(Deal.stage, func.count(Deal.id), func.coalesce(func.sum(Deal.value), 0.0))
+        .filter(Deal.stage.in_(CLOSED_STAGES), Deal.updated_at >= _closed_since(closed_days))
+        .group_by(Deal.stage)
+    )
+
+def closed_stage_totals(db: Session, closed_days: int = CLOSED_WINDOW_DAYS) -> dict:
+    totals = {stage: (0, 0.0) for stage in CLOSED_STAGES}
+    totals.update({stage: (count, total) for stage, count, total in closed_stage_totals_query(db, closed_days)})
+    return totals
+
+def get_stage_page(db: Session, stage: str, sort: str = "value", cursor: str = None,
+                   closed_days: int = CLOSED_WINDOW_DAYS, limit: int = STAGE_PAGE_SIZE):
+    """Return one page of a column and the cursor for the next page (or None)."""
+    deals = stage_page_query(db, stage, sort, cursor, closed_days, limit).all()
+    next_cursor = _cursor(deals[limit - 1], sort) if len(deals) > limit else None
+    return deals[:limit], next_cursor
 
 @router.get("/pipeline", response_class=HTMLResponse)
-async def pipeline_board(
+@cached_page("deals", "contacts")
+def pipeline_board(
     request: Request,
+    sort: str = Query("value", pattern="^(value|expected_close)$"),
+    closed_days: int = Query(CLOSED_WINDOW_DAYS, ge=0),
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_read_db)
 ):
-    deals = db.query(Deal).all()
-    # Group deals by stage
-    stages = ["qualified", "proposal", "negotiation", "closed_won", "closed_lost"]
-    deals_by_stage = {stage: [] for stage in stages}
-    for deal in deals:
-        if deal.stage in deals_by_stage:
-            deals_by_stage[deal.stage].append(deal)
-        else:
-            # Fallback for unknown stages
-            deals_by_stage.setdefault("qualified", []).append(deal)
-            
+    # Each column is fetched on its own with a limit; totals come from the maintained counters
+    columns = {stage: get_stage_page(db, stage, sort, closed_days=closed_days) for stage in STAGES}
+    stage_stats = read_stats(db)
+    totals = {stage: stage_stats.get(f"deals:{stage}", (0, 0.0)) for stage in STAGES}
+    if closed_days:
+        # Windowed closed columns count the deals they show, not the all-time counters
+        totals.update(closed_stage_totals(db, closed_days))
     return templates.TemplateResponse("pipeline/board.html", {
         "request": request,
-        "deals_by_stage": deals_by_stage,
+        "columns": columns,
+        "totals": totals,
+        "sort": sort,
+        "closed_days": closed_days,
+        "closed_stages": CLOSED_STAGES,
         "user": user,
-        "stages": stages
+        "stages": STAGES
     })
 
+@router.get("/pipeline/stages/{stage}", response_class=HTMLResponse)
+def pipeline_stage_cards(
+    request: Request,
+    stage: str,
+    cursor: Optional[str] = None,
+    sort: str = Query("value", pattern="^(value|expected_close)$"),
+    closed_days: int = Query(CLOSED_WINDOW_DAYS, ge=0),
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription),
+    db: Session = Depends(get_tenant_read_db)
+):
+    # Card fragment used by a column's "load more"
+    if stage not in STAGES:
+        raise HTTPException(status_code=404, detail="Unknown stage")
+    try:
+        deals, next_cursor = get_stage_page(db, stage, sort, cursor, closed_days)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    response = templates.TemplateResponse("pipeline/_deal_cards.html", {"request": request, "deals": deals})
+    response.headers["X-Next-Cursor"] = next_cursor or ""
+    return response
+
 @router.post("/pipeline/deals")
-async def create_deal(
+def create_deal(
     request: Request,
     title: str = Form(...),
     value: float = Form(...),
@@ -48,7 +136,7 @@ async def create_deal(
     notes: str = Form(None),
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     # Parse date if provided
     close_date = None
@@ -58,6 +146,10 @@ async def create_deal(
         except ValueError:
             pass # Handle error or default to None
 
+    # Scoped session: another owner's contact is not found
+    if not db.query(Contact.id).filter(Contact.id == contact_id).first():
+        raise HTTPException(status_code=404, detail="Contact not found")
+
     deal = Deal(
         title=title,
         value=value,
@@ -72,13 +164,13 @@ async def create_deal(
     return RedirectResponse(url="/pipeline", status_code=303)
 
 @router.post("/pipeline/deals/{id}/move")
-async def move_deal(
+def move_deal(
     request: Request,
     id: int,
     stage: str = Form(...),
     user=Depends(routes_module.get_current_user),
     subscription=Depends(routes_module.get_active_subscription),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     deal = db.query(Deal).filter(Deal.id == id).first()
     if not deal:
@@ -92,3 +184,39 @@ async def move_deal(
     # Given typical "board" interactions, I'll return JSON if it looks like an API call, or redirect if form submit.
     # Actually, let's just return a simple JSON response as it's likely consumed by JS.
     return JSONResponse({"status": "success", "new_stage": stage})
+
+def _render_diff(diff: dict) -> dict:
+    """Attach the rendered card so boards can swap it in without their own card markup."""
+    if diff["type"] == "deleted":
+        return diff
+    deal = SimpleNamespace(
+        id=diff["id"], title=diff["title"], value=diff["value"], probability=diff["probability"] or 0,
+        expected_close=date.fromisoformat(diff["expected_close"]) if diff["expected_close"] else None,
+        contact=SimpleNamespace(name=diff["contact_name"])
+    )
+    return dict(diff, html=templates.get_template("pipeline/_deal_card.html").render(deal=deal))
+
+@router.get("/pipeline/events")
+async def pipeline_events(
+    request: Request,
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription)
+):
+    """Server-Sent Events stream of deal diffs for the user's board (see app.events)."""
+    async def stream():
+        async with events.subscribe(events.deals_channel(user.id)) as queue:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    diff = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if diff is None:
+                    return
+                yield f"event: deal\ndata: {json.dumps(_render_diff(diff))}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
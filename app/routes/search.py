@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, Request, Query
+from fastapi.responses import HTMLResponse, JSONResponse
+from app.templating import Templates
+from sqlalchemy.orm import Session
+from app.tenancy import get_tenant_read_db
+from app import search as search_index
+import app.routes as routes_module
+from typing import List, Optional
+
+router = APIRouter()
+templates = Templates(directory="app/templates")
+
+@router.get("/search", response_class=HTMLResponse)
+def search_page(
+    request: Request,
+    q: str = "",
+    type: Optional[List[str]] = Query(None),
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription),
+    db: Session = Depends(get_tenant_read_db)
+):
+    results = search_index.search(db, q, entity_types=type, limit=50)
+    return templates.TemplateResponse("search/results.html", {
+        "request": request,
+        "q": q,
+        "types": type or [],
+        "results": results,
+        "user": user
+    })
+
+@router.get("/api/search")
+def api_search(
+    q: str,
+    type: Optional[List[str]] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    user=Depends(routes_module.get_current_user),
+    subscription=Depends(routes_module.get_active_subscription),
+    db: Session = Depends(get_tenant_read_db)
+):
+    return JSONResponse({"results": search_index.search(db, q, entity_types=type, limit=limit)})
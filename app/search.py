@@ -0,0 +1,231 @@
+"""Full-text search index over contacts, deals, activities and company intel.
+
+SQLite gets an FTS5 virtual table, Postgres a documents table with a stored
+tsvector column and a GIN index. Both are kept current by mapper write hooks,
+and each indexed document is built in SQL from the row itself, so the hooks and
+a full rebuild always produce the same text. Documents carry their owner's
+user_id and a scoped session (see app.tenancy) only finds its own.
+"""
+import html
+import re
+from sqlalchemy import Table, Column, Integer, String, Text, MetaData, event, select, delete, literal, func, text, cast
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.database import engine
+from app.models import Contact, Deal, Activity, CompanyIntel
+
+IS_POSTGRES = engine.dialect.name == "postgresql"
+
+# Snippet highlight markers; swapped for <mark> after HTML-escaping the snippet
+_MARK_START, _MARK_END = "\x02", "\x03"
+
+_metadata = MetaData()
+
+if IS_POSTGRES:
+    search_index = Table(
+        "search_documents", _metadata,
+        Column("entity_type", String, primary_key=True),
+        Column("entity_id", Integer, primary_key=True),
+        Column("title", Text),
+        Column("body", Text),
+        Column("url", String),
+        Column("user_id", String)
+    )
+else:
+    # FTS5 rowid packs (entity_id, entity type) so single documents can be replaced by rowid
+    search_index = Table(
+        "search_index", _metadata,
+        Column("rowid", Integer, primary_key=True),
+        Column("title", Text),
+        Column("body", Text),
+        Column("entity_type", String),
+        Column("entity_id", Integer),
+        Column("url", String),
+        Column("user_id", String)
+    )
+
+def _text(*columns):
+    expr = func.coalesce(columns[0], "")
+    for column in columns[1:]:
+        expr = expr + " " + func.coalesce(column, "")
+    return expr
+
+# entity_type -> (model, type code, title, body, url)
+SOURCES = {
+    "contact": (
+        Contact, 0,
+        Contact.name,
+        _text(Contact.email, Contact.company, Contact.title, Contact.notes),
+        "/contacts/" + cast(Contact.id, String)
+    ),
+    "deal": (
+        Deal, 1,
+        Deal.title,
+        _text(Deal.stage, Deal.notes),
+        "/contacts/" + cast(Deal.contact_id, String)
+    ),
+    "activity": (
+        Activity, 2,
+        Activity.subject,
+        _text(Activity.type, Activity.description),
+        "/contacts/" + cast(Activity.contact_id, String)
+    ),
+    "intel": (
+        CompanyIntel, 3,
+        CompanyIntel.company_name + " " + func.upper(CompanyIntel.analysis_type),
+        CompanyIntel.content,
+        "/intel/" + cast(CompanyIntel.id, String)
+    )
+}
+_TYPE_CODES = len(SOURCES) + 1
+_ENTITY_BY_MODEL = {source[0]: entity_type for entity_type, source in SOURCES.items()}
+
+def _document_select(entity_type: str):
+    model, code, title, body, url = SOURCES[entity_type]
+    if IS_POSTGRES:
+        columns = [literal(entity_type), model.id, title, body, url, model.user_id]
+    else:
+        columns = [model.id * _TYPE_CODES + code, title, body, literal(entity_type), model.id, url, model.user_id]
+    return select(*columns)
+
+def _insert_documents(connection, entity_type: str, where=None):
+    query = _document_select(entity_type)
+    if where is not None:
+        query = query.where(where)
+    if IS_POSTGRES:
+        stmt = pg_insert(search_index).from_select(["entity_type", "entity_id", "title", "body", "url", "user_id"], query)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["entity_type", "entity_id"],
+            set_={"title": stmt.excluded.title, "body": stmt.excluded.body, "url": stmt.excluded.url, "user_id": stmt.excluded.user_id}
+        )
+    else:
+        stmt = search_index.insert().from_select(["rowid", "title", "body", "entity_type", "entity_id", "url", "user_id"], query)
+    connection.execute(stmt)
+
+def _delete_documents(connection, entity_type: str, ids):
+    if IS_POSTGRES:
+        stmt = delete(search_index).where(search_index.c.entity_type == entity_type, search_index.c.entity_id.in_(ids))
+    else:
+        code = SOURCES[entity_type][1]
+        stmt = delete(search_index).where(search_index.c.rowid.in_([i * _TYPE_CODES + code for i in ids]))
+    connection.execute(stmt)
+
+def index_entities(connection, entity_type: str, ids, new: bool = False):
+    """(Re)index specific rows, e.g. after a bulk insert that bypassed the ORM.
+
+    Pass new=True for rows that were just inserted and cannot be indexed yet.
+    """
+    ids = sorted(ids)
+    if not ids:
+        return
+    model = SOURCES[entity_type][0]
+    if not IS_POSTGRES and not new:
+        _delete_documents(connection, entity_type, ids)
+    if ids[-1] - ids[0] + 1 == len(ids):
+        # A contiguous block, as produced by a bulk insert: a range avoids binding every id
+        _insert_documents(connection, entity_type, model.id.between(ids[0], ids[-1]))
+    else:
+        _insert_documents(connection, entity_type, model.id.in_(ids))
+
+def rebuild_search_index(connection):
+    connection.execute(delete(search_index))
+    for entity_type in SOURCES:
+        _insert_documents(connection, entity_type)
+
+def init_search_index():
+    """Create the index structures if missing and backfill them when empty."""
+    with engine.begin() as connection:
+        if IS_POSTGRES:
+            connection.execute(text(
+                "CREATE TABLE IF NOT EXISTS search_documents ("
+                " entity_type VARCHAR NOT NULL,"
+                " entity_id INTEGER NOT NULL,"
+                " title TEXT,"
+                " body TEXT,"
+                " url VARCHAR,"
+                " user_id VARCHAR,"
+                " document tsvector GENERATED ALWAYS AS ("
+                "  setweight(to_tsvector('english', coalesce(title, '')), 'A') ||"
+                "  setweight(to_tsvector('english', coalesce(body, '')), 'B')"
+                " ) STORED,"
+                " PRIMARY KEY (entity_type, entity_id))"
+            ))
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_search_documents_document ON search_documents USING GIN (document)"
+            ))
+        else:
+            connection.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+                " title, body, entity_type UNINDEXED, entity_id UNINDEXED, url UNINDEXED, user_id UNINDEXED,"
+                " tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            ))
+        if connection.execute(select(search_index.c.entity_id).limit(1)).first() is None:
+            rebuild_search_index(connection)
+
+def _terms(query: str):
+    return re.findall(r"\w+", query.lower())[:16]
+
+def _render_snippet(snippet: str) -> str:
+    return html.escape(snippet or "").replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+def search(db, query: str, entity_types=None, limit: int = 20):
+    """Ranked matches as dicts with an HTML-safe snippet; the last term is matched as a prefix."""
+    terms = _terms(query)
+    if not terms:
+        return []
+    entity_types = [t for t in (entity_types or []) if t in SOURCES]
+    user_id = db.info.get("user_id")
+    owner_filter = "AND user_id = :user_id" if user_id is not None else ""
+
+    if IS_POSTGRES:
+        tsquery = " & ".join(terms[:-1] + [terms[-1] + ":*"])
+        type_filter = "AND entity_type = ANY(:types)" if entity_types else ""
+        sql = text(
+            "SELECT entity_type, entity_id, title, url,"
+            f" ts_headline('english', coalesce(body, ''), q, 'StartSel={_MARK_START}, StopSel={_MARK_END}, MaxWords=24, MinWords=8') AS snippet,"
+            " rank"
+            " FROM ("
+            "  SELECT entity_type, entity_id, title, body, url, q, ts_rank_cd(document, q) AS rank"
+            "  FROM search_documents, to_tsquery('english', :tsquery) AS q"
+            f"  WHERE document @@ q {type_filter} {owner_filter}"
+            "  ORDER BY rank DESC LIMIT :limit"
+            " ) AS hits ORDER BY rank DESC"
+        )
+        params = {"tsquery": tsquery, "limit": limit, "types": entity_types, "user_id": user_id}
+    else:
+        match = " ".join(f'"{t}"' for t in terms[:-1]) + f' "{terms[-1]}"*'
+        type_filter = ""
+        params = {"match": match.strip(), "limit": limit, "user_id": user_id}
+        if entity_types:
+            type_filter = "AND entity_type IN (" + ", ".join(f":type_{i}" for i in range(len(entity_types))) + ")"
+            params.update({f"type_{i}": t for i, t in enumerate(entity_types)})
+        sql = text(
+            "SELECT entity_type, entity_id, title, url,"
+            f" snippet(search_index, -1, '{_MARK_START}', '{_MARK_END}', '…', 16) AS snippet,"
+            " bm25(search_index, 10.0, 1.0) AS rank"
+            " FROM search_index"
+            f" WHERE search_index MATCH :match {type_filter} {owner_filter}"
+            " ORDER BY rank LIMIT :limit"
+        )
+
+    return [
+        {
+            "type": row.entity_type,
+            "id": row.entity_id,
+            "title": row.title,
+            "url": row.url,
+            "snippet": _render_snippet(row.snippet),
+            "rank": float(row.rank)
+        }
+        for row in db.execute(sql, params)
+    ]
+
+def _after_write(mapper, connection, target):
+    index_entities(connection, _ENTITY_BY_MODEL[mapper.class_], [target.id])
+
+def _after_delete(mapper, connection, target):
+    _delete_documents(connection, _ENTITY_BY_MODEL[mapper.class_], [target.id])
+
+for _model in _ENTITY_BY_MODEL:
+    event.listen(_model, "after_insert", _after_write)
+    event.listen(_model, "after_update", _after_write)
+    event.listen(_model, "after_delete", _after_delete)
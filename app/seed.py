@@ -1,8 +1,11 @@
 from sqlalchemy.orm import Session
 from app.models import Contact, Deal, Activity, CompanyIntel
+from app.tenancy import scope_session
 from datetime import datetime, date
 
 def seed_crm_data(db: Session):
+    # Demo data belongs to the "system" owner; app.tenancy stamps it on every new row
+    scope_session(db, "system")
     # Check if data exists
     if db.query(Contact).count() > 0:
         return
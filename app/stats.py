@@ -0,0 +1,135 @@
+"""Incrementally maintained dashboard aggregates.
+
+Mapper hooks on Contact, Deal and Activity apply +/- deltas to the owner's
+counter rows in ``dashboard_stats`` inside the writing transaction, so the
+dashboard reads every aggregate with a single query. ``rebuild_stats``
+recomputes them from scratch.
+
+Rows named ``version:<name>`` are change counters rather than aggregates:
+they only count up, so a reader can tell whether data it derived earlier is
+still current (see app.forecast). ``rebuild_stats`` leaves them alone.
+"""
+from sqlalchemy import event, inspect, select, insert, delete, func, literal
+from sqlalchemy.dialects import postgresql, sqlite
+from app.database import engine
+from app.models import Contact, Deal, Activity, DashboardStat
+
+STAGES = ["qualified", "proposal", "negotiation", "closed_won", "closed_lost"]
+CLOSED_STAGES = ["closed_won", "closed_lost"]
+FORECAST_VERSION = "version:forecast"
+# Deal columns the forecast is computed from
+FORECAST_COLUMNS = ("stage", "value", "probability", "expected_close", "contact_id")
+
+_stats = DashboardStat.__table__
+
+def apply_delta(connection, user_id: str, name: str, count: int = 0, total: float = 0.0):
+    if not count and not total:
+        return
+    # One upsert on the (user_id, name) key: an UPDATE-then-INSERT would let two
+    # concurrent first writes both insert, failing (and rolling back) one of them
+    dialect = postgresql if connection.dialect.name == "postgresql" else sqlite
+    upsert = dialect.insert(_stats).values(user_id=user_id, name=name, count=count, total=total)
+    connection.execute(upsert.on_conflict_do_update(
+        index_elements=[_stats.c.user_id, _stats.c.name],
+        set_={"count": _stats.c.count + upsert.excluded.count, "total": _stats.c.total + upsert.excluded.total}
+    ))
+
+def rebuild_stats(connection):
+    connection.execute(delete(_stats).where(_stats.c.name.not_like("version:%")))
+    counts = [
+        ("contacts", select(Contact.user_id, func.count(Contact.id), literal(0.0)).group_by(Contact.user_id)),
+        ("activities", select(Activity.user_id, func.count(Activity.id), literal(0.0)).group_by(Activity.user_id)),
+        ("activities:open", select(Activity.user_id, func.count(Activity.id), literal(0.0))
+            .where(Activity.completed == False).group_by(Activity.user_id))
+    ]
+    rows = [
+        {"user_id": user_id, "name": name, "count": count, "total": total}
+        for name, query in counts for user_id, count, total in connection.execute(query)
+    ]
+    deal_totals = connection.execute(
+        select(Deal.user_id, Deal.stage, func.count(Deal.id), func.coalesce(func.sum(Deal.value), 0.0))
+        .group_by(Deal.user_id, Deal.stage)
+    )
+    rows += [
+        {"user_id": user_id, "name": f"deals:{stage}", "count": count, "total": total}
+        for user_id, stage, count, total in deal_totals
+    ]
+    if rows:
+        connection.execute(insert(_stats), rows)
+
+def init_stats():
+    """Build the counters on first start; afterwards the write hooks keep them current."""
+    with engine.begin() as connection:
+        if connection.execute(select(_stats.c.name).limit(1)).first() is None:
+            rebuild_stats(connection)
+
+def read_stats(db) -> dict:
+    """All counters visible to the session (see app.tenancy) as {name: (count, total)} in one query."""
+    return {row.name: (row.count, row.total) for row in db.query(DashboardStat).all()}
+
+def _changed(target, attributes) -> bool:
+    state = inspect(target)
+    return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+def _old_value(target, attribute):
+    history = inspect(target).attrs[attribute].history
+    values = history.deleted or history.unchanged
+    return values[0] if values else getattr(target, attribute)
+
+# Contacts
+
+@event.listens_for(Contact, "after_insert")
+def _contact_inserted(mapper, connection, target):
+    apply_delta(connection, target.user_id, "contacts", 1)
+
+@event.listens_for(Contact, "after_update")
+def _contact_updated(mapper, connection, target):
+    # The forecast groups deals by their contact's assignee
+    if _changed(target, ("assigned_to",)):
+        apply_delta(connection, target.user_id, FORECAST_VERSION, 1)
+
+@event.listens_for(Contact, "after_delete")
+def _contact_deleted(mapper, connection, target):
+    apply_delta(connection, target.user_id, "contacts", -1)
+
+# Deals
+
+@event.listens_for(Deal, "after_insert")
+def _deal_inserted(mapper, connection, target):
+    apply_delta(connection, target.user_id, f"deals:{target.stage}", 1, target.value or 0.0)
+    apply_delta(connection, target.user_id, FORECAST_VERSION, 1)
+
+@event.listens_for(Deal, "after_update")
+def _deal_updated(mapper, connection, target):
+    if _changed(target, FORECAST_COLUMNS):
+        apply_delta(connection, target.user_id, FORECAST_VERSION, 1)
+    old_stage, old_value = _old_value(target, "stage"), _old_value(target, "value")
+    if old_stage == target.stage and old_value == target.value:
+        return
+    apply_delta(connection, target.user_id, f"deals:{old_stage}", -1, -(old_value or 0.0))
+    apply_delta(connection, target.user_id, f"deals:{target.stage}", 1, target.value or 0.0)
+
+@event.listens_for(Deal, "after_delete")
+def _deal_deleted(mapper, connection, target):
+    apply_delta(connection, target.user_id, f"deals:{_old_value(target, 'stage')}", -1, -(_old_value(target, "value") or 0.0))
+    apply_delta(connection, target.user_id, FORECAST_VERSION, 1)
+
+# Activities
+
+@event.listens_for(Activity, "after_insert")
+def _activity_inserted(mapper, connection, target):
+    apply_delta(connection, target.user_id, "activities", 1)
+    if not target.completed:
+        apply_delta(connection, target.user_id, "activities:open", 1)
+
+@event.listens_for(Activity, "after_update")
+def _activity_updated(mapper, connection, target):
+    was_completed = bool(_old_value(target, "completed"))
+    if was_completed != bool(target.completed):
+        apply_delta(connection, target.user_id, "activities:open", 1 if was_completed else -1)
+
+@event.listens_for(Activity, "after_delete")
+def _activity_deleted(mapper, connection, target):
+    apply_delta(connection, target.user_id, "activities", -1)
+    if not _old_value(target, "completed"):
+        apply_delta(connection, target.user_id, "activities:open", -1)
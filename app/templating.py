@@ -0,0 +1,13 @@
+"""Shared Jinja2 setup for the routers."""
+import time
+from fastapi.templating import Jinja2Templates
+from app import metrics
+
+class Templates(Jinja2Templates):
+    """Jinja2Templates that reports each page's render time to app.metrics."""
+
+    def TemplateResponse(self, *args, **kwargs):
+        start = time.perf_counter()
+        response = super().TemplateResponse(*args, **kwargs)
+        metrics.observe_template(response.template.name, time.perf_counter() - start)
+        return response
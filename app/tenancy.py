@@ -0,0 +1,60 @@
+"""Per-owner data scoping.
+
+Every CRM table carries the owning user's id in ``user_id``. A session whose
+``info["user_id"]`` is set only ever sees that owner's rows: a
+``do_orm_execute`` hook adds the owner criteria to every ORM SELECT
+(including joined and lazy loads), and new objects without an owner are
+stamped with it on flush. Sessions without an owner (CLI, startup tasks) see
+everything. Core statements and raw SQL are not affected and have to filter
+on ``user_id`` themselves.
+"""
+from typing import Optional
+from fastapi import Depends
+from sqlalchemy import event
+from sqlalchemy.orm import Session, with_loader_criteria
+from app.database import get_db, get_read_db
+from app.models import (
+    Contact, Deal, Activity, CompanyIntel, DashboardStat, DealStageEvent, DealStageRollup, IntelBatchRun
+)
+import app.routes as routes_module
+
+TENANT_MODELS = (Contact, Deal, Activity, CompanyIntel, DashboardStat, DealStageEvent, DealStageRollup, IntelBatchRun)
+
+def current_user_id(session: Session) -> Optional[str]:
+    return session.info.get("user_id")
+
+def scope_session(session: Session, user_id: str) -> Session:
+    session.info["user_id"] = str(user_id)
+    return session
+
+def get_tenant_db(user=Depends(routes_module.get_current_user), db: Session = Depends(get_db)):
+    """Request session scoped to the signed-in user's data."""
+    return scope_session(db, user.id)
+
+def get_tenant_read_db(user=Depends(routes_module.get_current_user), db: Session = Depends(get_read_db)):
+    """Like get_tenant_db, for read-only handlers that may be served by a replica."""
+    return scope_session(db, user.id)
+
+def owner_criteria(user_id: str) -> list:
+    """Loader options limiting every tenant model in a statement to one owner."""
+    # Lambda criteria are cached per model; user_id is extracted as a bound parameter
+    return [
+        with_loader_criteria(model, lambda cls: cls.user_id == user_id, include_aliases=True)
+        for model in TENANT_MODELS
+    ]
+
+@event.listens_for(Session, "do_orm_execute")
+def _scope_to_owner(state):
+    user_id = state.session.info.get("user_id")
+    if user_id is None or not state.is_select or state.is_column_load or state.is_relationship_load:
+        return
+    state.statement = state.statement.options(*owner_criteria(user_id))
+
+@event.listens_for(Session, "before_flush")
+def _stamp_owner(session, flush_context, instances):
+    user_id = session.info.get("user_id")
+    if user_id is None:
+        return
+    for obj in session.new:
+        if isinstance(obj, TENANT_MODELS) and obj.user_id is None:
+            obj.user_id = user_id
@@ -0,0 +1,114 @@
+"""A contact's history as one time-ordered feed.
+
+``get_timeline_page`` merges the contact's activities (by ``date``), the stage
+events of its deals (app.analytics) and the intel reports on its company into
+one newest-first list with a single UNION ALL. Each branch is filtered,
+ordered and limited on its own index (activities by contact and date, stage
+events by owner and deal, intel by owner and lower(company)), so a page reads
+at most one page of rows per branch however long the history is.
+
+Pages are keyset-paginated on (time, kind, id). The time in the cursor is the
+column value as the database returns it without conversion: SQLite stores
+timestamps as text in two formats (with microseconds when the app writes
+them, without when the server default does), and comparing the stored text
+with the stored text is what keeps the cursor consistent with ORDER BY.
+
+``contact_summary`` computes the header figures in one statement of scalar
+subqueries instead of loading the contact's collections.
+"""
+from sqlalchemy import String, and_, case, func, literal, literal_column, or_, select, tuple_, type_coerce, union_all
+from sqlalchemy.orm import Session
+from app.models import Activity, CompanyIntel, Contact, Deal, DealStageEvent
+from app.stats import CLOSED_STAGES
+
+PAGE_SIZE = 25
+# Deals listed in full on the detail page; the rest are counted in the summary
+RECENT_DEALS = 10
+
+# Kinds sort descending after the time, so a deal event and an activity at the same instant have a stable order
+KINDS = ("activity", "deal", "intel")
+
+def _branch(kind: str, at, ident, columns: list, where: list, cursor: tuple, limit: int):
+    query = select(
+        literal(kind).label("kind"), ident.label("id"), type_coerce(at, String).label("sort_at"), at.label("at"),
+        *columns
+    ).where(*where)
+    if cursor:
+        cursor_at, cursor_kind, cursor_id = cursor
+        cursor_at = literal(cursor_at, String)
+        if kind < cursor_kind:
+            query = query.where(at <= cursor_at)
+        elif kind > cursor_kind:
+            query = query.where(at < cursor_at)
+        else:
+            query = query.where(tuple_(at, ident) < tuple_(cursor_at, literal(cursor_id)))
+    # Subquery so each branch keeps its own ORDER BY / LIMIT inside the UNION
+    return select(query.order_by(at.desc(), ident.desc()).limit(limit).subquery())
+
+def timeline_query(user_id: str, contact: Contact, cursor: tuple = None, limit: int = PAGE_SIZE):
+    fetch = limit + 1
+    branches = [
+        _branch("activity", Activity.date, Activity.id, [
+            Activity.type.label("label"), Activity.subject.label("title"), Activity.description.label("detail"),
+            Activity.completed.label("completed"), literal(None, type_=Deal.id.type).label("ref_id"),
+        ], [Activity.user_id == user_id, Activity.contact_id == contact.id], cursor, fetch),
+        _branch("deal", DealStageEvent.changed_at, DealStageEvent.id, [
+            DealStageEvent.to_stage.label("label"), Deal.title.label("title"), DealStageEvent.from_stage.label("detail"),
+            literal(None, type_=Activity.completed.type).label("completed"), Deal.id.label("ref_id"),
+        ], [DealStageEvent.user_id == user_id, Deal.user_id == user_id, Deal.id == DealStageEvent.deal_id,
+            Deal.contact_id == contact.id], cursor, fetch),
+    ]
+    if contact.company:
+        branches.append(_branch("intel", CompanyIntel.generated_at, CompanyIntel.id, [
+            CompanyIntel.analysis_type.label("label"), CompanyIntel.company_name.label("title"),
+            CompanyIntel.model_used.label("detail"), literal(None, type_=Activity.completed.type).label("completed"),
+            literal(None, type_=Deal.id.type).label("ref_id"),
+        ], [CompanyIntel.user_id == user_id, func.lower(CompanyIntel.company_name) == contact.company.strip().lower()],
+            cursor, fetch))
+    merged = union_all(*branches).subquery()
+    return select(merged).order_by(merged.c.sort_at.desc(), merged.c.kind.desc(), merged.c.id.desc()).limit(fetch)
+
+def encode_cursor(row) -> str:
+    return f"{row.sort_at}|{row.kind}|{row.id}"
+
+def decode_cursor(cursor: str) -> tuple:
+    at, kind, ident = cursor.rsplit("|", 2)
+    if kind not in KINDS:
+        raise ValueError(f"unknown timeline kind: {kind}")
+    return at, kind, int(ident)
+
+def get_timeline_page(db: Session, user_id: str, contact: Contact, cursor: str = None, limit: int = PAGE_SIZE):
+    """Return one page of timeline rows, newest first, and the cursor for the next page (or None)."""
+    rows = db.execute(timeline_query(str(user_id), contact, decode_cursor(cursor) if cursor else None, limit)).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def contact_summary(db: Session, user_id: str, contact: Contact) -> dict:
+    user_id = str(user_id)
+    deals = and_(Deal.user_id == user_id, Deal.contact_id == contact.id)
+    activities = and_(Activity.user_id == user_id, Activity.contact_id == contact.id)
+    is_open = Deal.stage.not_in(CLOSED_STAGES)
+    columns = [
+        select(func.count()).where(activities).scalar_subquery().label("activities"),
+        select(func.count()).where(activities, or_(Activity.completed.is_(False), Activity.completed.is_(None)))
+        .scalar_subquery().label("open_activities"),
+        select(func.max(Activity.date)).where(activities).scalar_subquery().label("last_activity"),
+        select(func.count()).where(deals).scalar_subquery().label("deals"),
+        select(func.count()).where(deals, is_open).scalar_subquery().label("open_deals"),
+        select(func.coalesce(func.sum(Deal.value), 0)).where(deals, is_open).scalar_subquery().label("open_value"),
+        select(func.coalesce(func.sum(Deal.value), 0)).where(deals, Deal.stage == "closed_won")
+        .scalar_subquery().label("won_value"),
+    ]
+    if contact.company:
+        columns.append(select(func.count()).where(
+            CompanyIntel.user_id == user_id, func.lower(CompanyIntel.company_name) == contact.company.strip().lower()
+        ).scalar_subquery().label("intel_reports"))
+    else:
+        columns.append(literal_column("0").label("intel_reports"))
+    return dict(db.execute(select(*columns)).one()._mapping)
+
+def recent_deals(db: Session, contact: Contact, limit: int = RECENT_DEALS) -> list:
+    """The contact's open deals first, then the most recently changed."""
+    return db.query(Deal).filter(Deal.contact_id == contact.id).order_by(
+        case((Deal.stage.in_(CLOSED_STAGES), 1), else_=0), Deal.updated_at.desc(), Deal.id.desc()
+    ).limit(limit).all()
@@ -0,0 +1,86 @@
+"""Session auth through app.main's cached dependencies.
+
+Imports the real app.main with stand-ins for viv-auth and viv-pay (the
+packages are not needed) and requests a protected endpoint, so
+``current_user`` and ``require_active_subscription`` run as they do in
+production: the first request resolves ``require_auth`` (with a sub-dependency
+that yields a session, like get_db) and the subscription, the second is served
+from app.auth_cache, and a request without a session cookie is rejected.
+Exits 1 on any mismatch.
+
+    python -m bench.auth_check
+"""
+import os
+import sys
+import tempfile
+import types
+
+if __name__ == "__main__" and "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='crm-auth-')}/auth.db"
+
+from fastapi import Depends, HTTPException, Request
+
+PROTECTED_PATH = "/api/intel/cache/stats"
+
+calls = {"require_auth": 0, "require_subscription": 0, "sessions_opened": 0, "sessions_closed": 0}
+
+class StubUser:
+    def __init__(self, id, email):
+        self.id = id
+        self.email = email
+
+def _stub_session():
+    calls["sessions_opened"] += 1
+    try:
+        yield object()
+    finally:
+        calls["sessions_closed"] += 1
+
+def init_auth(app, engine, Base, get_db, app_name=None):
+    def require_auth(request: Request, session=Depends(_stub_session)):
+        calls["require_auth"] += 1
+        if not request.cookies.get("viv_session"):
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        return StubUser(id="check-user", email="check@example.com")
+    return StubUser, require_auth
+
+def init_pay(app, engine, Base, get_db, app_name=None):
+    async def require_subscription(request: Request, user_id=None):
+        calls["require_subscription"] += 1
+        return {"user_id": user_id, "status": "active"}
+    return (lambda *args, **kwargs: None), (lambda *args, **kwargs: None), require_subscription
+
+def install_stub_vendors():
+    sys.modules["viv_auth"] = types.SimpleNamespace(init_auth=init_auth)
+    sys.modules["viv_pay"] = types.SimpleNamespace(init_pay=init_pay)
+
+def main() -> int:
+    install_stub_vendors()
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    failures = []
+
+    def expect(label, response, status, **counts):
+        got = {name: calls[name] for name in counts}
+        ok = response.status_code == status and got == counts
+        print(f"{'ok  ' if ok else 'FAIL'} {label}: HTTP {response.status_code}, {got}")
+        if not ok:
+            failures.append(label)
+
+    client.cookies.set("viv_session", "session-one")
+    expect("first request resolves auth and subscription", client.get(PROTECTED_PATH), 200,
+           require_auth=1, require_subscription=1)
+    expect("second request is served from the cache", client.get(PROTECTED_PATH), 200,
+           require_auth=1, require_subscription=1)
+    client.cookies.clear()
+    expect("request without a session is rejected", client.get(PROTECTED_PATH), 401,
+           require_auth=2, require_subscription=1)
+    if calls["sessions_opened"] != calls["sessions_closed"]:
+        print(f"FAIL sessions left open: {calls['sessions_opened']} opened, {calls['sessions_closed']} closed")
+        failures.append("sessions")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
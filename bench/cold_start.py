@@ -0,0 +1,109 @@
+"""Cold start profile and time-to-first-/health.
+
+Prints the slowest top-level imports of the app module (from ``python -X
+importtime``), then starts the Dockerfile's CMD --runs times, with --app and
+--port swapped in, and measures the time from process start to the first
+successful GET /health. Exits 1 when the median is above --target.
+
+    python -m bench.cold_start --runs 5 --target 1.5
+    python -m bench.cold_start --app app.main:app   # needs viv-auth / viv-pay
+
+The database is set up once with ``python -m app.cli init`` beforehand, like
+the deploy's release step. Anything else the container command runs on start
+is part of every measurement, as it is for every new container.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+import httpx
+
+# Median seconds from process start to the first 200 from /health
+TARGET_SECONDS = 1.5
+DOCKERFILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Dockerfile")
+
+def import_profile(module: str, env: dict, top: int) -> list:
+    """(cumulative ms, package) of the slowest top-level packages imported by module."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               env=env, capture_output=True, text=True)
+    if completed.returncode:
+        raise SystemExit(f"importing {module} failed:\n{completed.stderr[-2000:]}")
+    cumulative = defaultdict(int)
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, total, name = line.split("|")
+        if not total.strip().isdigit() or name.startswith("  "):
+            continue
+        # Direct imports only (no extra indentation): their cumulative time includes their children
+        cumulative[name.strip().split(".")[0]] += int(total)
+    return sorted(((us / 1000, name) for name, us in cumulative.items()), reverse=True)[:top]
+
+def container_command(app: str, port: int) -> list:
+    """The Dockerfile's CMD (exec form), serving app on port."""
+    with open(DOCKERFILE) as dockerfile:
+        command = next(json.loads(line[len("CMD"):]) for line in dockerfile if line.startswith("CMD"))
+    swapped = []
+    for arg in command:
+        if swapped and swapped[-1] == "--port":
+            arg = str(port)
+        # Also covers a shell-form command wrapped in sh -c
+        swapped.append(re.sub(r"--port[ =]\d+", f"--port {port}", arg.replace("app.main:app", app)))
+    return swapped
+
+def time_to_health(command: list, env: dict, port: int, timeout: float) -> float:
+    started = time.perf_counter()
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1) as client:
+            while time.perf_counter() - started < timeout:
+                if server.poll() is not None:
+                    raise SystemExit(f"{' '.join(command)} exited with status {server.returncode} before serving /health")
+                try:
+                    if client.get("/health").status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+        raise SystemExit(f"{' '.join(command)} did not serve /health within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="bench.harness:app", help="uvicorn app to start")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target", type=float, default=TARGET_SECONDS, help="median seconds to the first /health")
+    parser.add_argument("--top", type=int, default=15, help="imports to list")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--port", type=int, default=8768)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm-cold-start-")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{workdir}/cold.db", GEMINI_BACKEND="fake")
+    subprocess.run([sys.executable, "-m", "app.cli", "init"], env=env, check=True, stdout=subprocess.DEVNULL)
+
+    module = args.app.split(":")[0]
+    print(f"slowest imports of {module} (cumulative):")
+    for ms, name in import_profile(module, env, args.top):
+        print(f"    {ms:8.1f}ms  {name}")
+
+    command = container_command(args.app, args.port)
+    print(f"container command: {' '.join(command)}")
+    samples = [time_to_health(command, env, args.port, args.timeout) for _ in range(args.runs)]
+    median = statistics.median(samples)
+    print(f"time to first /health over {args.runs} runs: median={median:.2f}s "
+          f"min={min(samples):.2f}s max={max(samples):.2f}s target={args.target:.2f}s")
+    if median > args.target:
+        print("ABOVE TARGET")
+    sys.exit(1 if median > args.target else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Mixed read/write concurrency benchmark for the database engine profile.
+
+Starts the stubbed app under uvicorn (optionally with several worker
+processes sharing one SQLite file), then runs concurrent clients that post
+new contacts and read list pages for a fixed time. Reports throughput,
+latency percentiles and failed requests per engine profile, so the stock
+SQLAlchemy settings (DB_PROFILE=default) can be compared with the tuned one.
+
+    python -m bench.concurrency --profile default --profile production --workers 4 --clients 32
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+import httpx
+from bench.loop_latency import percentile
+
+READ_PATHS = ["/", "/contacts", "/pipeline", "/activities"]
+
+def init_database(env):
+    # Schema and seed once, before several workers race to create them
+    subprocess.run([sys.executable, "-m", "app.cli", "init"], env=env, check=True, stdout=subprocess.DEVNULL)
+
+async def wait_healthy(client):
+    for _ in range(200):
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise SystemExit("server did not become healthy")
+
+async def run_clients(base_url, clients, duration, write_ratio):
+    latencies = {"read": [], "write": []}
+    statuses = Counter()
+    deadline = time.perf_counter() + duration
+
+    async def client_loop(n):
+        rng = random.Random(n)
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+            i = 0
+            while time.perf_counter() < deadline:
+                i += 1
+                kind = "write" if rng.random() < write_ratio else "read"
+                start = time.perf_counter()
+                try:
+                    if kind == "write":
+                        response = await client.post("/contacts/new", data={
+                            "name": f"Load {n}-{i}", "email": f"load{n}-{i}@example.com", "status": "lead"
+                        })
+                    else:
+                        response = await client.get(rng.choice(READ_PATHS))
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                    continue
+                latencies[kind].append((time.perf_counter() - start) * 1000)
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        await wait_healthy(client)
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop(n) for n in range(clients)))
+    return latencies, statuses, time.perf_counter() - started
+
+def run_profile(profile, args):
+    workdir = tempfile.mkdtemp(prefix="crm-concurrency-")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{workdir}/bench.db", DB_PROFILE=profile, GEMINI_BACKEND="fake")
+    init_database(env)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bench.harness:app", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "critical"],
+        env=env
+    )
+    try:
+        latencies, statuses, elapsed = asyncio.run(
+            run_clients(f"http://127.0.0.1:{args.port}", args.clients, args.duration, args.write_ratio)
+        )
+    finally:
+        server.terminate()
+        server.wait()
+
+    done = len(latencies["read"]) + len(latencies["write"])
+    failed = sum(n for status, n in statuses.items() if not (isinstance(status, int) and status < 400))
+    print(f"profile={profile:<10} workers={args.workers} clients={args.clients} "
+          f"throughput={done / elapsed:7.1f} req/s failed={failed}")
+    for kind, samples in latencies.items():
+        if samples:
+            print(f"    {kind:<5} n={len(samples):<6} p50={percentile(samples, 50):7.1f}ms "
+                  f"p95={percentile(samples, 95):7.1f}ms p99={percentile(samples, 99):7.1f}ms")
+    print(f"    statuses: {dict(statuses)}")
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", action="append", choices=["default", "production"],
+                        help="engine profile(s) to run; repeat to compare (default: both)")
+    parser.add_argument("--workers", type=int, default=4, help="uvicorn worker processes")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per profile")
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    failures = 0
+    for profile in args.profile or ["default", "production"]:
+        failures += run_profile(profile, args)
+    sys.exit(1 if failures and "production" in (args.profile or ["production"]) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Check that every route query shape is served by an index.
+
+Fills a scratch database with synthetic rows, runs ANALYZE, then asks the
+planner (EXPLAIN QUERY PLAN on SQLite, EXPLAIN on Postgres) how it would run
+each query and fails if the expected index is not in the plan.
+
+    python -m bench.explain_check --rows 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+if __name__ == "__main__" and "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='crm-explain-')}/explain.db"
+
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert, desc, select, text, func
+from app.database import engine, SessionLocal
+from app.migrations import init_schema
+from app.models import Contact, Deal, Activity, CompanyIntel
+from app.routes.contacts import contacts_page_query
+from app.routes.pipeline import stage_page_query, closed_stage_totals_query
+from app import intel_cache
+from app.tenancy import owner_criteria
+
+STATUSES = ["lead", "contacted", "proposal", "negotiation", "closed_won", "closed_lost"]
+SOURCES = ["website", "referral", "cold_call", "linkedin", "other"]
+STAGES = ["qualified", "proposal", "negotiation", "closed_won", "closed_lost"]
+
+def fill(rows: int, chunk: int = 50000):
+    rng = random.Random(8)
+    now = datetime(2026, 1, 1)
+    with engine.begin() as connection:
+        if connection.execute(select(Contact.id).limit(1)).first() is not None:
+            return
+        for start in range(0, rows, chunk):
+            ids = range(start + 1, min(rows, start + chunk) + 1)
+            connection.execute(insert(Contact), [{
+                "id": i, "user_id": f"user{i % 50}", "name": f"Contact {i}", "email": f"c{i}@example{i % 997}.com",
+                "company": f"Company {i % 20000}", "status": rng.choice(STATUSES), "source": rng.choice(SOURCES),
+                "assigned_to": f"Rep {i % 40}"
+            } for i in ids])
+            connection.execute(insert(Deal), [{
+                "id": i, "user_id": f"user{i % 50}", "contact_id": i, "title": f"Deal {i}", "value": rng.random() * 100000,
+                "stage": rng.choice(STAGES), "probability": rng.randint(0, 100)
+            } for i in ids])
+            connection.execute(insert(Activity), [{
+                "id": i, "user_id": f"user{i % 50}", "contact_id": i, "deal_id": i, "type": "call", "subject": f"Call {i}",
+                "date": now + timedelta(minutes=i), "completed": rng.random() < 0.8
+            } for i in ids])
+        connection.execute(insert(CompanyIntel), [{
+            "user_id": f"user{i % 50}", "company_name": f"Company {i}", "analysis_type": "swot", "content": "-", "model_used": "seed_data"
+        } for i in range(min(rows, 20000))])
+        connection.execute(text("ANALYZE"))
+
+OWNER = "user7"
+
+def checks(db):
+    """(label, statement, index that must appear in the plan)"""
+    return [
+        ("contacts list", contacts_page_query(db), "ix_contacts_user_id_id"),
+        ("contacts by status", contacts_page_query(db, cursor=10**9, status="lead"), "ix_contacts_user_id_status_id"),
+        ("contacts by source", contacts_page_query(db, source="referral"), "ix_contacts_user_id_source_id"),
+        ("contacts by assignee", contacts_page_query(db, assigned_to="Rep 7"), "ix_contacts_user_id_assigned_to_id"),
+        ("contacts by prefix", contacts_page_query(db, q="contact 12345"), "ix_contacts_user_id_name_lower"),
+        ("import dedup", db.query(Contact.id).filter(func.lower(Contact.email) == "c7@example7.com"), "ix_contacts_user_id_email_lower"),
+        ("deals of contact", db.query(Deal).filter(Deal.contact_id == 42), "ix_deals_contact_id"),
+        ("pipeline column by value", stage_page_query(db, "proposal"), "ix_deals_user_id_stage_value_id"),
+        ("pipeline next page", stage_page_query(db, "proposal", cursor="50000.0:123"), "ix_deals_user_id_stage_value_id"),
+        ("pipeline column by close", stage_page_query(db, "proposal", "expected_close"), "ix_deals_user_id_stage_close_id"),
+        ("pipeline closed column", stage_page_query(db, "closed_won"), "ix_deals_user_id_stage_"),
+        ("pipeline closed totals", closed_stage_totals_query(db), "ix_deals_user_id_stage_updated_at"),
+        ("activities of contact", db.query(Activity).filter(Activity.contact_id == 42), "ix_activities_contact_id_date"),
+        ("activities of deal", db.query(Activity).filter(Activity.deal_id == 42), "ix_activities_deal_id"),
+        ("upcoming tasks", db.query(Activity).filter(Activity.completed == False).order_by(Activity.date).limit(10), "ix_activities_user_id_completed_date"),
+        ("recent activities", db.query(Activity).order_by(desc(Activity.created_at)).limit(10), "ix_activities_user_id_created_at"),
+        ("intel list", db.query(CompanyIntel).order_by(desc(CompanyIntel.generated_at)), "ix_company_intel_user_id_generated_at"),
+        ("intel cache lookup", intel_cache.fresh_query(db, "Company 7", "swot", "seed_data"), "ix_company_intel_user_id_lookup"),
+    ]
+
+def explain(connection, query) -> str:
+    # Queries are explained as a scoped request session would run them (see app.tenancy)
+    compiled = query.options(*owner_criteria(OWNER)).statement.compile(
+        dialect=engine.dialect, compile_kwargs={"render_postcompile": True}
+    )
+    params = compiled.construct_params()
+    if engine.dialect.name == "sqlite":
+        rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), tuple(params[k] for k in compiled.positiontup))
+        return "\n".join(row[-1] for row in rows)
+    rows = connection.exec_driver_sql("EXPLAIN " + str(compiled), params)
+    return "\n".join(row[0] for row in rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="contacts, deals and activities to generate")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    init_schema(engine)
+    fill(args.rows)
+    failures = 0
+    db = SessionLocal()
+    try:
+        with engine.connect() as connection:
+            for label, query, index in checks(db):
+                plan = explain(connection, query)
+                ok = index in plan
+                failures += not ok
+                print(f"{'ok  ' if ok else 'FAIL'} {label:<24} {index}")
+                if args.verbose or not ok:
+                    print("       " + plan.replace("\n", "\n       "))
+    finally:
+        db.close()
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Stubbed CRM application for benchmarks.
+
+Mirrors app.main, but the viv-auth / viv-pay dependencies are replaced by a
+fixed user so the routers can be exercised without those services:
+
+    export DATABASE_URL=sqlite:////tmp/bench.db
+    python -m app.cli init && uvicorn bench.harness:app
+
+Combine with GEMINI_BACKEND=fake to run intel analyses offline.
+"""
+import os
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.responses import Response
+import anyio
+import app.routes as routes_module
+from app.database import engine, read_engine, pin_reads_after_write
+from app.routes import dashboard, contacts, pipeline, activities, intel, search, export, forecast, analytics
+from app.bootstrap import on_startup
+from app.jobs import intel_jobs
+from app import events, intel_batch, forecast as forecast_model, intel_cache, metrics, page_cache
+
+metrics.register_collector("crm_page_cache", page_cache.snapshot)
+metrics.register_collector("crm_intel_cache", intel_cache.snapshot)
+metrics.register_collector("crm_forecast_cache", forecast_model.snapshot)
+
+BENCH_USER = SimpleNamespace(id="system", email="bench@example.com")
+
+def create_app() -> FastAPI:
+    bench_app = FastAPI(title="CRM Pro (bench)")
+    bench_app.dependency_overrides[routes_module.get_current_user] = lambda: BENCH_USER
+    bench_app.dependency_overrides[routes_module.get_active_subscription] = lambda: True
+
+    @bench_app.get("/health")
+    def health_check():
+        return {"status": "ok"}
+
+    @bench_app.get("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+    for module in (dashboard, contacts, pipeline, activities, intel, search, export, forecast, analytics):
+        bench_app.include_router(module.router)
+    if read_engine is not engine:
+        bench_app.middleware("http")(pin_reads_after_write)
+    bench_app.middleware("http")(metrics.record_request)
+
+    @bench_app.on_event("startup")
+    async def startup():
+        anyio.to_thread.current_default_thread_limiter().total_tokens = int(os.environ.get("THREADPOOL_SIZE", "40"))
+        on_startup()
+        await intel_jobs.start()
+        await events.start()
+
+    @bench_app.on_event("shutdown")
+    async def shutdown():
+        await intel_jobs.stop()
+        await intel_batch.stop()
+        await events.stop()
+
+    return bench_app
+
+app = create_app()
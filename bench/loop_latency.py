@@ -0,0 +1,102 @@
+"""Event-loop responsiveness benchmark.
+
+Starts the stubbed app under uvicorn, measures latency of GET / on its own, then
+again while a batch of intel analyses (with a simulated slow Gemini) is in
+flight. Gemini is replaced by the offline fake backend. With handlers off the
+event loop, the two p99 figures should match.
+
+    python -m bench.loop_latency --requests 300 --analyses 8 --gemini-latency 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+async def measure(client, path, count, concurrency):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(count)))
+    return latencies
+
+def report(label, latencies):
+    print(f"{label:<28} n={len(latencies):<5} p50={percentile(latencies, 50):7.1f}ms "
+          f"p99={percentile(latencies, 99):7.1f}ms mean={statistics.mean(latencies):7.1f}ms")
+
+async def run(args, base_url):
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        for _ in range(100):
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+        else:
+            raise SystemExit("server did not become healthy")
+
+        await measure(client, "/", 20, args.concurrency)  # warm-up
+        idle = await measure(client, "/", args.requests, args.concurrency)
+
+        jobs = []
+        for i in range(args.analyses):
+            response = await client.post("/api/intel/analyze", json={"company_name": f"Bench Co {i}", "analysis_type": "swot"})
+            jobs.append(response.json()["job_id"])
+        busy = await measure(client, "/", args.requests, args.concurrency)
+
+        statuses = {}
+        while len(statuses) < len(jobs):
+            for job_id in jobs:
+                job = (await client.get(f"/api/intel/jobs/{job_id}")).json()
+                if job["status"] in ("done", "failed"):
+                    statuses[job_id] = job["status"]
+            await asyncio.sleep(0.5)
+
+    report("GET / (idle)", idle)
+    report(f"GET / ({args.analyses} analyses running)", busy)
+    done = sum(1 for status in statuses.values() if status == "done")
+    print(f"analyses completed: {done}/{len(jobs)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--analyses", type=int, default=8)
+    parser.add_argument("--gemini-latency", type=float, default=3.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="crm-bench-")
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{workdir}/bench.db",
+               GEMINI_BACKEND="fake",
+               GEMINI_FAKE_LATENCY=str(args.gemini_latency))
+    subprocess.run([sys.executable, "-m", "app.cli", "init"], env=env, check=True, stdout=subprocess.DEVNULL)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bench.harness:app", "--port", str(args.port), "--log-level", "warning"],
+        env=env
+    )
+    try:
+        asyncio.run(run(args, f"http://127.0.0.1:{args.port}"))
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""SQL statement budget per page.
+
+Seeds enough related rows that a lazy relationship load inside a template
+shows up as extra queries, requests each page through the stubbed app and
+fails (exit status 1) if any page issues more statements than its budget.
+
+    python -m bench.query_budget
+"""
+import os
+import sys
+import tempfile
+
+if __name__ == "__main__" and "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='crm-budget-')}/budget.db"
+
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+from app.database import engine, SessionLocal
+from app.bootstrap import initialize
+from app.tenancy import scope_session
+from app.models import Contact, Deal, Activity
+from bench.harness import app
+
+# path -> maximum number of SQL statements for one request
+BUDGETS = {
+    "/": 3,
+    "/contacts": 1,
+    "/contacts/rows?status=lead": 1,
+    "/api/contacts": 1,
+    "/contacts/1": 5,
+    "/contacts/duplicates": 1,
+    "/contacts/1/timeline": 2,
+    "/pipeline": 7,
+    "/pipeline/stages/qualified?cursor=1e9:0": 1,
+    "/forecast": 3,
+    "/api/forecast": 1,
+    "/analytics": 4,
+    "/api/analytics": 4,
+    "/activities": 3,
+    "/intel": 1,
+    "/intel/1": 1,
+    "/search?q=deal": 1
+}
+
+class StatementCounter:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+def seed_related_rows(contacts: int = 50, deals_per_contact: int = 2, activities_per_deal: int = 3):
+    db = scope_session(SessionLocal(), "system")
+    try:
+        now = datetime.now()
+        for i in range(contacts):
+            contact = Contact(name=f"Budget Contact {i}", email=f"budget{i}@example.com", status="lead")
+            for j in range(deals_per_contact):
+                deal = Deal(title=f"Budget Deal {i}-{j}", value=1000.0 * (j + 1), stage="qualified", contact=contact)
+                for k in range(activities_per_deal):
+                    Activity(type="call", subject=f"Budget call {k}", date=now + timedelta(days=k), contact=contact, deal=deal)
+            db.add(contact)
+        db.commit()
+    finally:
+        db.close()
+
+def main():
+    counter = StatementCounter()
+    failures = 0
+    initialize()
+    with TestClient(app) as client:
+        seed_related_rows()
+        event.listen(engine, "before_cursor_execute", counter)
+        try:
+            for path, budget in BUDGETS.items():
+                counter.statements.clear()
+                response = client.get(path)
+                used = len(counter.statements)
+                ok = response.status_code == 200 and used <= budget
+                failures += not ok
+                print(f"{'ok  ' if ok else 'FAIL'} {path:<30} status={response.status_code} queries={used:<4} budget={budget}")
+                if used > budget:
+                    for statement in counter.statements:
+                        print("       " + " ".join(statement.split())[:160])
+        finally:
+            event.remove(engine, "before_cursor_execute", counter)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Per-endpoint benchmark suite with a stored baseline.
+
+Starts the stubbed app (bench.harness) under uvicorn against a database filled
+by ``python -m app.cli generate-data``, warms it up, then runs concurrent
+clients over a weighted mix of ENDPOINTS for a fixed time. Reports overall
+throughput and, per endpoint, throughput and p50/p95/p99 latency.
+
+With --baseline the run is compared with a stored result: an endpoint whose
+p95 grew, or whose throughput fell, by more than --tolerance (and by more than
+NOISE_MS) is a regression and the exit status is 1. --save writes the run as
+the new baseline.
+
+    # scratch database with N contacts, 3N deals and 10N activities
+    python -m bench.suite --scale 10000 --baseline bench/baseline.json
+
+    # an existing database, e.g. 1M / 3M / 10M rows
+    DATABASE_URL=sqlite:////tmp/crm-1m.db python -m app.cli generate-data \\
+        --contacts 1000000 --deals 3000000 --activities 10000000
+    python -m bench.suite --database sqlite:////tmp/crm-1m.db --save /tmp/crm-1m-baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+import httpx
+from sqlalchemy import create_engine, text
+from bench.concurrency import wait_healthy
+from bench.loop_latency import percentile
+
+# name -> (method, path, weight); {contact_id} and {term} are filled per request.
+# Weight 0 endpoints only run when named with --endpoint: /activities renders
+# every activity of the owner and would dominate the mix at scale.
+ENDPOINTS = {
+    "dashboard": ("GET", "/", 10),
+    "contacts": ("GET", "/contacts", 8),
+    "contacts_rows": ("GET", "/contacts/rows?status=lead", 4),
+    "api_contacts": ("GET", "/api/contacts?status=lead", 4),
+    "contact_detail": ("GET", "/contacts/{contact_id}", 14),
+    "pipeline": ("GET", "/pipeline", 8),
+    "pipeline_stage": ("GET", "/pipeline/stages/qualified", 4),
+    "forecast": ("GET", "/api/forecast", 4),
+    "analytics": ("GET", "/api/analytics", 4),
+    "activities": ("GET", "/activities", 0),
+    "intel": ("GET", "/intel", 3),
+    "search": ("GET", "/search?q={term}", 8),
+    "create_contact": ("POST", "/contacts/new", 4),
+}
+SEARCH_TERMS = ["harbor", "summit", "chen", "garcia", "pilot", "migration", "demo", "logistics"]
+# Latency differences below this are noise, whatever the ratio
+NOISE_MS = 5.0
+OWNER = "system"
+
+def contact_ids(database_url: str) -> tuple:
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as connection:
+            return connection.execute(
+                text("SELECT min(id), max(id) FROM contacts WHERE user_id = :owner"), {"owner": OWNER}
+            ).one()
+    finally:
+        engine.dispose()
+
+def generate_database(scale: int, seed: int) -> str:
+    workdir = tempfile.mkdtemp(prefix="crm-suite-")
+    url = f"sqlite:///{workdir}/suite.db"
+    print(f"generating {scale} contacts, {3 * scale} deals, {10 * scale} activities in {url}")
+    subprocess.run([
+        sys.executable, "-m", "app.cli", "generate-data", "--contacts", str(scale), "--deals", str(3 * scale),
+        "--activities", str(10 * scale), "--seed", str(seed), "--as-of", "2026-01-01"
+    ], env=dict(os.environ, DATABASE_URL=url), check=True, stdout=subprocess.DEVNULL)
+    return url
+
+def request_args(name: str, rng: random.Random, ids: tuple, n: int) -> tuple:
+    method, path, _ = ENDPOINTS[name]
+    path = path.format(contact_id=rng.randint(*ids), term=rng.choice(SEARCH_TERMS))
+    data = None
+    if method == "POST":
+        data = {"name": f"Suite {n}", "email": f"suite{n}-{rng.random():.12f}@example.com", "status": "lead"}
+    return method, path, data
+
+async def run_clients(base_url, endpoints, ids, clients, duration, warmup, timeout):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    names = list(endpoints)
+    weights = [max(ENDPOINTS[name][2], 1) for name in names]
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def client_loop(n):
+        rng = random.Random(n)
+        async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+            i = 0
+            while time.perf_counter() < deadline:
+                i += 1
+                name = rng.choices(names, weights)[0]
+                method, path, data = request_args(name, rng, ids, n * 1000000 + i)
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, path, data=data)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if start < measure_from:
+                    continue
+                if ok:
+                    latencies[name].append((time.perf_counter() - start) * 1000)
+                else:
+                    errors[name] += 1
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        await wait_healthy(client)
+    await asyncio.gather(*(client_loop(n) for n in range(clients)))
+    return latencies, errors, time.perf_counter() - measure_from
+
+def summarize(latencies, errors, elapsed) -> dict:
+    endpoints = {}
+    for name in sorted(set(latencies) | set(errors)):
+        samples = latencies[name]
+        endpoints[name] = {
+            "requests": len(samples),
+            "errors": errors[name],
+            "rps": round(len(samples) / elapsed, 2),
+            "p50_ms": round(percentile(samples, 50), 2) if samples else None,
+            "p95_ms": round(percentile(samples, 95), 2) if samples else None,
+            "p99_ms": round(percentile(samples, 99), 2) if samples else None,
+        }
+    done = sum(len(samples) for samples in latencies.values())
+    return {"throughput_rps": round(done / elapsed, 2), "errors": sum(errors.values()), "endpoints": endpoints}
+
+def print_result(result: dict):
+    print(f"throughput={result['throughput_rps']:.1f} req/s errors={result['errors']}")
+    print(f"    {'endpoint':<16} {'n':>7} {'err':>5} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, row in result["endpoints"].items():
+        cells = [f"{row[k]:7.1f}ms" if row[k] is not None else f"{'-':>9}" for k in ("p50_ms", "p95_ms", "p99_ms")]
+        print(f"    {name:<16} {row['requests']:>7} {row['errors']:>5} {row['rps']:>8.1f} {' '.join(cells)}")
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of result against baseline, as printable lines."""
+    if baseline.get("config") != result["config"]:
+        print(f"note: baseline was recorded with {baseline.get('config')}")
+    regressions = []
+    print(f"\nagainst baseline of {baseline.get('recorded_at', '?')}:")
+    for name, row in result["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if not before or before["p95_ms"] is None or row["p95_ms"] is None:
+            continue
+        change = row["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        slower = change > tolerance and row["p95_ms"] - before["p95_ms"] > NOISE_MS
+        fewer = before["rps"] and row["rps"] < before["rps"] * (1 - tolerance)
+        flag = "REGRESSION" if slower or fewer else ""
+        print(f"    {name:<16} p95 {before['p95_ms']:8.1f} -> {row['p95_ms']:8.1f}ms ({change:+6.1%})  "
+              f"req/s {before['rps']:7.1f} -> {row['rps']:7.1f}  {flag}")
+        if flag:
+            regressions.append(name)
+    if baseline["throughput_rps"] and result["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        regressions.append("throughput")
+        print(f"    throughput {baseline['throughput_rps']:.1f} -> {result['throughput_rps']:.1f} req/s  REGRESSION")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=os.environ.get("DATABASE_URL"), help="database to run against (default: $DATABASE_URL)")
+    parser.add_argument("--scale", type=int, help="generate a scratch database with this many contacts instead")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--endpoint", action="append", choices=sorted(ENDPOINTS), help="only these endpoints (repeatable)")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before the run")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout; a timeout counts as an error")
+    parser.add_argument("--baseline", help="compare with this result file; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative p95 growth / throughput drop")
+    parser.add_argument("--save", help="write this run's result here, e.g. as the new baseline")
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    if args.scale:
+        database = generate_database(args.scale, args.seed)
+    elif args.database:
+        database = args.database
+    else:
+        parser.error("pass --database (or set DATABASE_URL) or --scale")
+    endpoints = args.endpoint or [name for name, (_, _, weight) in ENDPOINTS.items() if weight]
+    ids = contact_ids(database)
+    if ids[0] is None:
+        raise SystemExit(f"no contacts for owner '{OWNER}' in {database}; run app.cli generate-data first")
+
+    env = dict(os.environ, DATABASE_URL=database, GEMINI_BACKEND="fake")
+    # Keep app.metrics' slow-request log out of the report unless asked for
+    env.setdefault("SLOW_REQUEST_MS", "60000")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bench.harness:app", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "critical"],
+        env=env
+    )
+    try:
+        latencies, errors, elapsed = asyncio.run(run_clients(
+            f"http://127.0.0.1:{args.port}", endpoints, ids,
+            args.clients, args.duration, args.warmup, args.timeout
+        ))
+    finally:
+        server.terminate()
+        server.wait()
+
+    result = summarize(latencies, errors, elapsed)
+    result["config"] = {
+        "scale": args.scale, "seed": args.seed, "clients": args.clients,
+        "workers": args.workers, "duration": args.duration, "endpoints": sorted(endpoints)
+    }
+    result["recorded_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    result["machine"] = {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+    print_result(result)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+        print(f"saved {args.save}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()